@@ -5,26 +5,79 @@ import shutil
 import re
 import argparse
 import json
+import sys
+import mmap
+import struct
+import hashlib
+import codecs
+import io
+import locale
+import zipfile
+import signal
+import threading
+import multiprocessing
+import queue
+import gzip
+import lzma
+import bz2
+import cProfile
+import sqlite3
+import csv
+import heapq
+from array import array
 from pathlib import Path
 from collections import defaultdict, Counter
-from datetime import datetime
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, date
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
+from contextlib import contextmanager
 import time
 
+try:
+    import numpy as np  # optional: vectorized batch probability evaluation
+except ImportError:
+    np = None
+
+try:
+    import psutil  # optional: available memory for sizing the worker pool
+except ImportError:
+    psutil = None
+
+try:
+    import resource  # POSIX only: peak RSS for --profile
+except ImportError:
+    resource = None
+
+try:
+    import zstandard  # optional: .zst request logs
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow  # optional: --columnar summary export
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
 # Globals controlled by CLI 
 FORCE_REPROCESS = False
+KEY_MATCH_MODE = "index"  # index | column | substring ("automaton": deprecated alias of index)
+USE_PARSE_CACHE = False
+SPLIT_LOG_BYTES = 256 << 20  # logs at least this large are filtered in parallel byte ranges; 0 disables
+SPLIT_WORKERS = max(1, (os.cpu_count() or 1) - 1)
+LOG_READER = "text"  # text | mmap
+USE_PEER_ARCHIVE = False
+PROFILE = False
+COLUMNAR_FORMAT = None  # parquet | arrow: also write File<N>_summary.<format>
+FULL_LOG_HASH = False  # resume fingerprints hash whole logs instead of their first and last MiB
 
 # Constants matching Levine 2017 Whitepaper constants 
 RUN_MIN_REQUESTS = 20
 PROB_THRESHOLD = 0.98
 
-# Regexes for postprocessing 
-PASS_RUN_RE = re.compile(
-    r'^(\d+\.\d+\.\d+\.\d+:\d+)\s+had a run\. Requests: \d+, Duplicates: \d+, Inserts: \d+, Adj\. Requests: \d+, Passes Levine: Yes, Levine Downloader probability: ([\d\.]+)',
-    re.IGNORECASE
-)
-FP_LINE_RE = re.compile(r'Number of False Positive Runs:\s*(\d+)', re.IGNORECASE)
-
 # Numeric helpers (Levine method) 
 
 def log_binomial_pmf(k, n, p):
@@ -56,49 +109,432 @@ def calc_even_share_probability(g, T, r):
         return 0.0
     return numerator / denom
 
+# Batch evaluation: T and avg_peers are fixed per instance, so the log-factorial
+# terms and log(p) values are computed once for all peers. The pure-Python path
+# performs exactly the scalar path's float operations (bit-identical results);
+# the numpy path, used for large batches when numpy is installed, agrees to
+# within floating point rounding.
+
+NUMPY_BATCH_MIN = 4096
+
+@lru_cache(maxsize=64)
+def log_factorial_table(n):
+    return tuple(math.lgamma(i + 1) for i in range(n + 1))
+
+def calc_even_share_probabilities(g, T, rs, use_numpy=None):
+    rs = list(rs)
+    if g <= 0 or T < 0:
+        return [0.0] * len(rs)
+    inv_g = 1.0 / g
+    inv_g8 = 1.0 / (g * 8.0)
+    if not (0 < inv_g < 1 and 0 < inv_g8 < 1):
+        # Degenerate p (g <= 1): keep the scalar path's edge-case handling.
+        return [calc_even_share_probability(g, T, r) for r in rs]
+    if use_numpy is None:
+        use_numpy = np is not None and len(rs) >= NUMPY_BATCH_MIN
+    if use_numpy:
+        return _even_share_numpy(g, T, rs, inv_g, inv_g8)
+
+    lf = log_factorial_table(T)
+    log_p1, log_q1 = math.log(inv_g), math.log(1 - inv_g)
+    log_p8, log_q8 = math.log(inv_g8), math.log(1 - inv_g8)
+    w1 = 1.0 / (g + 1.0)
+    w8 = g / (g + 1.0)
+    out = []
+    for r in rs:
+        if r < 0 or r > T:
+            out.append(0.0)
+            continue
+        log_comb = lf[T] - lf[r] - lf[T - r]
+        numerator = w1 * math.exp(log_comb + r * log_p1 + (T - r) * log_q1)
+        alternate = w8 * math.exp(log_comb + r * log_p8 + (T - r) * log_q8)
+        denom = numerator + alternate
+        out.append(0.0 if denom == 0 else numerator / denom)
+    return out
+
+def _even_share_numpy(g, T, rs, inv_g, inv_g8):
+    lf = np.asarray(log_factorial_table(T))
+    r = np.asarray(rs, dtype=np.int64)
+    valid = (r >= 0) & (r <= T)
+    rv = np.where(valid, r, 0)
+    log_comb = lf[T] - lf[rv] - lf[T - rv]
+    numerator = (1.0 / (g + 1.0)) * np.exp(log_comb + rv * math.log(inv_g) + (T - rv) * math.log(1 - inv_g))
+    alternate = (g / (g + 1.0)) * np.exp(log_comb + rv * math.log(inv_g8) + (T - rv) * math.log(1 - inv_g8))
+    denom = numerator + alternate
+    with np.errstate(invalid='ignore', divide='ignore'):
+        prob = np.where(valid & (denom != 0), numerator / denom, 0.0)
+    return prob.tolist()
+
+# Key matching helpers 
+#
+# The legacy filter was any(k in line for k in keys), a substring scan of every
+# line against every manifest key. "index" (the default) keeps exactly those
+# semantics without the per-key scan (see KeySubstringIndex); "automaton" is its
+# former name and still accepted. "column" is a
+# stricter match, opt-in: it only looks the key field (column 2) up in a hash
+# set, so a manifest key that occurs elsewhere in a line, or only as part of
+# the key field, does not select the line. The parse cache and the mmap reader
+# index the key column and therefore require it.
+
+KEY_COLUMN = 2
+
+class KeyAutomaton:
+    """Aho-Corasick multi-pattern matcher over manifest keys.
+
+    search() answers "does any key occur in text"; labels() returns the union of
+    the labels attached to every key found, for routing one line to several
+    manifests.
+    """
+
+    def __init__(self, keys, labels=None):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [frozenset()]
+        for pos, key in enumerate(keys):
+            if not key:
+                continue
+            state = 0
+            for ch in key:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(frozenset())
+                state = nxt
+            label = labels[pos] if labels is not None else None
+            self.out[state] = self.out[state] | {label}
+
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                cand = self.goto[f].get(ch, 0)
+                self.fail[nxt] = cand if cand != nxt else 0
+                self.out[nxt] = self.out[nxt] | self.out[self.fail[nxt]]
+        self.terminal = [bool(o) for o in self.out]
+
+    def search(self, text) -> bool:
+        goto = self.goto
+        fail = self.fail
+        terminal = self.terminal
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if terminal[state]:
+                return True
+        return False
+
+    def labels(self, text) -> set:
+        goto = self.goto
+        fail = self.fail
+        out = self.out
+        found = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found |= out[state]
+        return found
+
+class KeySubstringIndex:
+    """Exact "does any key occur in the line" test without a per-key scan.
+
+    A key without a comma can only occur inside one comma-separated field, so
+    only fields at least as long as the shortest key are looked at: a field of
+    that length matches only if it is a key, and a longer field is checked one
+    window per key length. Only the key set is held, so it scales to manifests
+    whose Aho-Corasick trie would not fit in memory. Keys that do contain a
+    comma go through a KeyAutomaton over the whole line.
+    """
+
+    def __init__(self, keys, labels=None):
+        canonical = {}  # one frozenset per distinct label set
+        self.index = {}
+        spanning_keys, spanning_labels = [], []
+        for pos, key in enumerate(keys):
+            if not key:
+                continue
+            label = labels[pos] if labels is not None else None
+            if ',' in key:
+                spanning_keys.append(key)
+                spanning_labels.append(label)
+                continue
+            found = self.index.get(key)
+            found = frozenset((label,)) if found is None else found | {label}
+            self.index[key] = canonical.setdefault(found, found)
+        self.lengths = sorted({len(key) for key in self.index})
+        self.min_len = self.lengths[0] if self.lengths else None
+        self.spanning = KeyAutomaton(spanning_keys, spanning_labels) if spanning_keys else None
+
+    def search(self, line) -> bool:
+        if self.spanning is not None and self.spanning.search(line):
+            return True
+        min_len = self.min_len
+        if min_len is None:
+            return False
+        index = self.index
+        for field in line.split(','):
+            n = len(field)
+            if n < min_len:
+                continue
+            if field in index:
+                return True
+            if n > min_len:
+                for length in self.lengths:
+                    if length >= n:
+                        break
+                    for i in range(n - length + 1):
+                        if field[i:i + length] in index:
+                            return True
+        return False
+
+    def labels(self, line) -> set:
+        found = set(self.spanning.labels(line)) if self.spanning is not None else set()
+        min_len = self.min_len
+        if min_len is None:
+            return found
+        index = self.index
+        for field in line.split(','):
+            n = len(field)
+            if n < min_len:
+                continue
+            hit = index.get(field)
+            if hit:
+                found |= hit
+            if n > min_len:
+                for length in self.lengths:
+                    if length >= n:
+                        break
+                    for i in range(n - length + 1):
+                        hit = index.get(field[i:i + length])
+                        if hit:
+                            found |= hit
+        return found
+
+def build_key_matcher(keys, mode=None):
+    mode = mode or KEY_MATCH_MODE
+    if mode == "column":
+        key_set = frozenset(keys)
+        def match(line):
+            parts = line.split(',', KEY_COLUMN + 1)
+            if len(parts) <= KEY_COLUMN:
+                return False
+            return parts[KEY_COLUMN].strip() in key_set
+        return match
+    if mode in ("index", "automaton"):
+        return KeySubstringIndex(keys).search
+    if mode == "substring":
+        key_list = list(keys)
+        return lambda line: any(k in line for k in key_list)
+    raise ValueError(f"unknown key match mode: {mode}")
+
+def build_key_router(key_sets: dict, mode=None):
+    """Return line -> collection of targets whose manifest keys match the line.
+
+    key_sets maps a target (e.g. a manifest name) to its keys. Matching
+    semantics per target are the same as build_key_matcher(keys, mode).
+    """
+    mode = mode or KEY_MATCH_MODE
+    if mode == "column":
+        index = defaultdict(list)
+        for target, keys in key_sets.items():
+            for key in set(keys):
+                index[key].append(target)
+        index = {k: tuple(v) for k, v in index.items()}
+        def route(line):
+            parts = line.split(',', KEY_COLUMN + 1)
+            if len(parts) <= KEY_COLUMN:
+                return ()
+            return index.get(parts[KEY_COLUMN].strip(), ())
+        return route
+    if mode in ("index", "automaton"):
+        all_keys = []
+        all_labels = []
+        for target, keys in key_sets.items():
+            all_keys.extend(keys)
+            all_labels.extend([target] * len(keys))
+        return KeySubstringIndex(all_keys, all_labels).labels
+    if mode == "substring":
+        matchers = [(target, build_key_matcher(keys, mode)) for target, keys in key_sets.items()]
+        return lambda line: [t for t, m in matchers if m(line)]
+    raise ValueError(f"unknown key match mode: {mode}")
+
+# Timestamp helpers 
+#
+# Logger timestamps use the fixed layout YYYY-MM-DDTHH:MM:SS[.ffffff]. One regex
+# match plus a cached date lookup replaces per-row strptime calls, and the
+# result is absolute (microseconds since the Unix epoch), so request intervals
+# stay correct across midnight. Timestamps that do not match the layout yield
+# None here; iso_to_excel falls back to strptime for them.
+
+ISO_TS_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?", re.ASCII)
+UNIX_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+EXCEL_EPOCH_ORDINAL = date(1899, 12, 30).toordinal()
+DAY_US = 86400 * 1_000_000
+
+@lru_cache(maxsize=4096)
+def iso_date_days(year, month, day):
+    # Days since the Unix epoch, or None for an invalid calendar date.
+    try:
+        return date(int(year), int(month), int(day)).toordinal() - UNIX_EPOCH_ORDINAL
+    except ValueError:
+        return None
+
+def _iso_parts(ts):
+    # (microseconds since the Unix epoch, number of fraction digits) or None.
+    m = ISO_TS_RE.fullmatch(ts)
+    if m is None:
+        return None
+    year, month, day, hh, mm, ss, frac = m.groups()
+    days = iso_date_days(year, month, day)
+    h, mi, sec = int(hh), int(mm), int(ss)
+    if days is None or h > 23 or mi > 59 or sec > 59:
+        return None
+    frac = frac or ""
+    micros = int(frac[:6].ljust(6, "0")) if frac else 0
+    return (days * 86400 + h * 3600 + mi * 60 + sec) * 1_000_000 + micros, len(frac)
+
+def parse_iso_timestamp(ts):
+    parts = _iso_parts(ts)
+    return None if parts is None else parts[0]
+
+def timestamp_epoch_seconds(ts):
+    micros = parse_iso_timestamp(ts)
+    return None if micros is None else micros // 1_000_000
+
 # Parsing helpers 
+#
+# parse_request_line() returns a RequestRecord, a fixed-slot object rather
+# than a dict per line. A job keeps its records in a ParsedRequests: parallel
+# arrays in log order, with keys, IPs, request types and HTLs interned to
+# integer ids per job. The 64-character keys and ip:port strings are stored
+# once however often they repeat, and per-peer aggregation counts ids. A
+# record points back at its filtered line instead of copying the timestamp
+# and location out of it.
+
+NO_TIME = -(1 << 63)  # time_seconds of a record whose timestamp does not parse
+
+class RequestRecord:
+    __slots__ = ('timestamp_raw', 'req_type', 'key', 'request_loc', 'htl', 'ip', 'num_peers', 'time_seconds')
+
+    def __init__(self, timestamp_raw, req_type, key, request_loc, htl, ip, num_peers, time_seconds):
+        self.timestamp_raw = timestamp_raw
+        self.req_type = req_type
+        self.key = key
+        self.request_loc = request_loc
+        self.htl = htl
+        self.ip = ip
+        self.num_peers = num_peers
+        self.time_seconds = time_seconds
 
 def parse_request_line(line):
     parts = line.rstrip("\n").split(',')
     if len(parts) < 9:
         raise ValueError("Malformed request line")
-    timestamp = parts[0]
-    req_type = parts[1]
-    key = parts[2]
-    request_loc = parts[3]
-    htl = parts[4]
-    ip = parts[5]
     try:
         num_peers = float(parts[8])
     except Exception:
         num_peers = 0.0
-    time_seconds = None
-    if 'T' in timestamp:
-        try:
-            time_part = timestamp.split('T', 1)[1]
-            h, m, s = time_part.split(':')
-            time_seconds = int(h) * 3600 + int(m) * 60 + int(float(s))
-        except Exception:
-            time_seconds = None
-    return {
-        'timestamp_raw': timestamp,
-        'req_type': req_type,
-        'key': key,
-        'request_loc': request_loc,
-        'htl': htl,
-        'ip': ip,
-        'num_peers': num_peers,
-        'time_seconds': time_seconds,
-    }
+    # timestamp, type, key, location, HTL, ip:port
+    return RequestRecord(parts[0], parts[1], parts[2], parts[3], parts[4], parts[5], num_peers,
+                         timestamp_epoch_seconds(parts[0]))
 
-def read_and_split(path: Path):
-    try:
-        return path.read_text(encoding='utf-8').splitlines()
-    except UnicodeDecodeError:
-        return path.read_text(encoding='utf-16', errors='ignore').splitlines()
+class ParsedRequests:
+    # A job's filtered lines (without newlines) and, for the lines that parse,
+    # their records as parallel columns in log order. line[i] is the index in
+    # lines of record i; the timestamp and location are sliced from it on demand.
+    INTERNED = ('key', 'ip', 'req_type', 'htl')
+
+    def __init__(self):
+        self.lines = []
+        self.ids = tuple({} for _ in self.INTERNED)  # per INTERNED column: string -> id
+        self.line = array('I')
+        self.key = array('i')
+        self.ip = array('i')
+        self.req_type = array('i')
+        self.htl = array('i')
+        self.num_peers = array('d')
+        self.time_seconds = array('q')  # NO_TIME when the timestamp does not parse
+
+    def __len__(self):
+        return len(self.line)
+
+    def table(self, name):
+        # id -> string for one INTERNED column.
+        return list(self.ids[self.INTERNED.index(name)])
+
+    def add_line(self, line, rec=None):
+        # Appends a filtered line and its parsed record, if any; returns the
+        # record's row number (None for an unparsed line).
+        self.lines.append(line)
+        if rec is None:
+            return None
+        return self.add(len(self.lines) - 1, rec.req_type, rec.key, rec.htl, rec.ip, rec.num_peers, rec.time_seconds)
+
+    def add(self, line_no, req_type, key, htl, ip, num_peers, time_seconds):
+        key_ids, ip_ids, req_type_ids, htl_ids = self.ids
+        self.line.append(line_no)
+        self.key.append(key_ids.setdefault(key, len(key_ids)))
+        self.ip.append(ip_ids.setdefault(ip, len(ip_ids)))
+        self.req_type.append(req_type_ids.setdefault(req_type, len(req_type_ids)))
+        self.htl.append(htl_ids.setdefault(htl, len(htl_ids)))
+        self.num_peers.append(num_peers)
+        self.time_seconds.append(NO_TIME if time_seconds is None else time_seconds)
+        return len(self.line) - 1
+
+    def extend(self, other):
+        # Appends other's lines and records, re-interning its ids into this job's tables.
+        base = len(self.lines)
+        self.lines.extend(other.lines)
+        self.line.extend(base + line_no for line_no in other.line)
+        for name, ids, other_ids in zip(self.INTERNED, self.ids, other.ids):
+            remap = array('i', (ids.setdefault(value, len(ids)) for value in other_ids))
+            getattr(self, name).extend(remap[vid] for vid in getattr(other, name))
+        self.num_peers.extend(other.num_peers)
+        self.time_seconds.extend(other.time_seconds)
+
+    def peer_rows(self):
+        # ip id -> row numbers of the records sent to it, peers in first-seen order.
+        rows = {}
+        for i, ip_id in enumerate(self.ip):
+            peer = rows.get(ip_id)
+            if peer is None:
+                peer = rows[ip_id] = array('I')
+            peer.append(i)
+        return rows
+
+    def request_locs(self):
+        lines = self.lines
+        return (lines[line_no].split(',', 4)[3] for line_no in self.line)
+
+    def line_repr(self, i):
+        # peer_line_repr() of record i: its first six columns and two empty ones.
+        return ",".join(self.lines[self.line[i]].split(',', 6)[:6]) + ",,"
+
+    def forwarded_keys(self):
+        # Keys of the records that are not inserts, as relayer IP derivation matches them.
+        inserts = {type_id for type_id, req_type in enumerate(self.table('req_type')) if 'insert' in req_type.lower()}
+        keys = self.table('key')
+        return {keys[key_id] for key_id, type_id in zip(self.key, self.req_type) if type_id not in inserts}
 
 def iso_to_excel(iso_str):
     iso_str = iso_str.strip().split(',')[0]
+    parts = _iso_parts(iso_str)
+    if parts is not None and parts[1] <= 6:
+        days, rem = divmod(parts[0], DAY_US)
+        secs, micros = divmod(rem, 1_000_000)
+        serial = (days + UNIX_EPOCH_ORDINAL - EXCEL_EPOCH_ORDINAL) + (secs + micros / 1e6) / 86400
+        return f"{serial:.4f}"
+    # Anything but the logger's fixed layout goes through strptime as before.
     fmt = "%Y-%m-%dT%H:%M:%S.%f" if '.' in iso_str else "%Y-%m-%dT%H:%M:%S"
     try:
         dt = datetime.strptime(iso_str, fmt)
@@ -134,20 +570,264 @@ def ensure_dir(path: Path):
 
 # Log location helper 
 
-def locate_requests_log(instance_name: str, start_dir: Path) -> Path | None:
+# requests_<instance>.log, or a compressed copy of it; the plain log wins.
+LOG_COMPRESSION_SUFFIXES = (".gz", ".xz", ".zst", ".bz2")
+
+def locate_requests_log(instance_name: str, start_dir: Path, input_dir: Path | None = None) -> Path | None:
+    # Searches upward from start_dir, then input_dir (when outputs live elsewhere).
     filename = f"requests_{instance_name}.log"
+    names = [filename] + [filename + suffix for suffix in LOG_COMPRESSION_SUFFIXES]
+    dirs = []
     cur = start_dir
     for _ in range(5):
-        candidate = cur / filename
-        if candidate.exists():
-            return candidate
+        dirs.append(cur)
         cur = cur.parent
+    if input_dir is not None:
+        dirs.append(input_dir)
+    for d in dirs:
+        for name in names:
+            candidate = d / name
+            if candidate.exists():
+                return candidate
     return None
 
+# Columnar parse cache 
+#
+# requests_<instance>.log.lmcache sits next to the log and holds one row per
+# physical log line: byte offset/length into the log, interned key/IP/type/HTL
+# ids, peer counts and whole-second epoch timestamps, plus a key-sorted line
+# index. Only the lines selected by a manifest are ever decoded again. Cached
+# selection follows --key-match column semantics; the other modes always read
+# the text log. PARSE_CACHE_VERSION changes with the row layout or meaning
+# (2: epoch timestamps instead of seconds since midnight), so older caches are
+# rebuilt.
+
+PARSE_CACHE_VERSION = 2
+PARSE_CACHE_MAGIC = b"LMPCACHE"
+PARSE_CACHE_SUFFIX = ".lmcache"
+FINGERPRINT_SAMPLE = 1 << 20
+
+def log_fingerprint(logpath: Path) -> dict:
+    # Size + mtime + a hash of the first and last MiB. Hashing multi-GB logs in
+    # full on every load would cost as much as the parse the cache avoids.
+    st = logpath.stat()
+    h = hashlib.sha256()
+    with open(logpath, 'rb') as f:
+        h.update(f.read(FINGERPRINT_SAMPLE))
+        if st.st_size > FINGERPRINT_SAMPLE:
+            f.seek(max(FINGERPRINT_SAMPLE, st.st_size - FINGERPRINT_SAMPLE))
+            h.update(f.read(FINGERPRINT_SAMPLE))
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256_sampled': h.hexdigest()}
+
+def parse_cache_path(logpath: Path) -> Path:
+    return logpath.with_name(logpath.name + PARSE_CACHE_SUFFIX)
+
+class ParseCache:
+    def __init__(self, logpath: Path, meta: dict, cache_mm, log_mm):
+        self.logpath = logpath
+        self.meta = meta
+        self._cache_mm = cache_mm
+        self._log_mm = log_mm
+        self.tables = meta['tables']
+        self.cols = {}
+        for col in meta['columns']:
+            view = memoryview(cache_mm)[col['offset']:col['offset'] + col['nbytes']]
+            self.cols[col['name']] = view.cast(col['typecode'])
+
+    def close(self):
+        for view in self.cols.values():
+            view.release()
+        self.cols = {}
+        self._cache_mm.close()
+        if self._log_mm is not None:
+            self._log_mm.close()
+
+    def _wanted_key_ids(self, key_set):
+        return [kid for kid, k in enumerate(self.tables['key']) if k.strip() in key_set]
+
+    def _line_ids(self, key_ids):
+        by_key = self.cols['by_key']
+        key_start = self.cols['key_start']
+        ids = []
+        for kid in key_ids:
+            ids.extend(by_key[key_start[kid]:key_start[kid + 1]])
+        ids.sort()
+        return ids
+
+    def _materialize(self, i, targets):
+        # Appends line i (and its record, if it parsed) to each ParsedRequests in targets.
+        cols = self.cols
+        offset = cols['offset'][i]
+        raw = self._log_mm[offset:offset + cols['length'][i]].decode('utf-8', errors='ignore')
+        for parsed in targets:
+            parsed.add_line(raw)
+            if cols['parsed'][i]:
+                parsed.add(len(parsed.lines) - 1, self.tables['req_type'][cols['req_type'][i]],
+                           self.tables['key'][cols['key'][i]], self.tables['htl'][cols['htl'][i]],
+                           self.tables['ip'][cols['ip'][i]], cols['num_peers'][i], cols['time_seconds'][i])
+
+    def select(self, key_set):
+        selected = ParsedRequests()
+        for i in self._line_ids(self._wanted_key_ids(key_set)):
+            self._materialize(i, (selected,))
+        return selected
+
+    def route(self, key_sets: dict):
+        routed = {t: ParsedRequests() for t in key_sets}
+        id_targets = defaultdict(list)
+        for target, keys in key_sets.items():
+            for kid in self._wanted_key_ids(set(keys)):
+                id_targets[kid].append(routed[target])
+        key_col = self.cols['key']
+        for i in self._line_ids(id_targets):
+            self._materialize(i, id_targets[key_col[i]])
+        return routed
+
+def build_parse_cache(logpath: Path) -> Path | None:
+    if is_compressed_log(logpath):
+        print(f"[WARN] {logpath.name}: compressed log, not caching")
+        return None
+    if not is_utf8_log(logpath):
+        print(f"[WARN] {logpath.name}: UTF-16 log, not caching")
+        return None
+    fingerprint = log_fingerprint(logpath)
+    interned = {name: {} for name in ('key', 'ip', 'req_type', 'htl')}
+    cols = {
+        'offset': array('q'), 'length': array('i'), 'key': array('i'), 'parsed': array('b'),
+        'req_type': array('H'), 'htl': array('H'), 'ip': array('i'),
+        'num_peers': array('d'), 'time_seconds': array('q'),
+    }
+
+    def intern(name, value):
+        table = interned[name]
+        vid = table.get(value)
+        if vid is None:
+            vid = table[value] = len(table)
+        return vid
+
+    offset = 0
+    with open(logpath, 'rb') as f:
+        for raw in f:
+            content = raw[:-1] if raw.endswith(b"\n") else raw
+            if content.endswith(b"\r"):
+                content = content[:-1]
+            if b"\r" in content:
+                # Text mode would split here; the byte-offset layout cannot express that.
+                print(f"[WARN] {logpath.name}: bare carriage return at byte {offset}, not caching")
+                return None
+            line = content.decode('utf-8', errors='ignore')
+            cols['offset'].append(offset)
+            cols['length'].append(len(content))
+            offset += len(raw)
+            parts = line.split(',')
+            kid = intern('key', parts[KEY_COLUMN]) if line.strip() and len(parts) > KEY_COLUMN else -1
+            cols['key'].append(kid)
+            try:
+                rec = parse_request_line(line)
+            except ValueError:
+                rec = None
+            if rec is None:
+                cols['parsed'].append(0)
+                for name in ('req_type', 'htl', 'ip', 'num_peers', 'time_seconds'):
+                    cols[name].append(0)
+                continue
+            cols['parsed'].append(1)
+            cols['req_type'].append(intern('req_type', rec.req_type))
+            cols['htl'].append(intern('htl', rec.htl))
+            cols['ip'].append(intern('ip', rec.ip))
+            cols['num_peers'].append(rec.num_peers)
+            cols['time_seconds'].append(NO_TIME if rec.time_seconds is None else rec.time_seconds)
+
+    if len(interned['req_type']) > 0xFFFF or len(interned['htl']) > 0xFFFF:
+        print(f"[WARN] {logpath.name}: too many distinct request types/HTLs, not caching")
+        return None
+
+    # Counting sort of line ids by key id, so a manifest selects its lines
+    # without touching the rest of the log.
+    nkeys = len(interned['key'])
+    key_start = array('q', [0]) * (nkeys + 1)
+    for kid in cols['key']:
+        if kid >= 0:
+            key_start[kid + 1] += 1
+    for kid in range(nkeys):
+        key_start[kid + 1] += key_start[kid]
+    fill = array('q', key_start)
+    by_key = array('q', [0]) * key_start[nkeys]
+    for i, kid in enumerate(cols['key']):
+        if kid >= 0:
+            by_key[fill[kid]] = i
+            fill[kid] += 1
+    cols['by_key'] = by_key
+    cols['key_start'] = key_start
+
+    # Layout: magic, u64 offset of the JSON meta block, 8-byte aligned columns, meta.
+    column_meta = []
+    pos = len(PARSE_CACHE_MAGIC) + 8
+    for name, arr in cols.items():
+        nbytes = len(arr) * arr.itemsize
+        column_meta.append({'name': name, 'typecode': arr.typecode, 'offset': pos, 'nbytes': nbytes})
+        pos += (nbytes + 7) & ~7
+    meta = {
+        'version': PARSE_CACHE_VERSION,
+        'byteorder': sys.byteorder,
+        'log': fingerprint,
+        'lines': len(cols['offset']),
+        'tables': {name: list(table) for name, table in interned.items()},
+        'columns': column_meta,
+    }
+
+    out_path = parse_cache_path(logpath)
+    tmp_path = out_path.with_name(f"{out_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(PARSE_CACHE_MAGIC)
+        f.write(struct.pack('<Q', pos))
+        for col in column_meta:
+            f.seek(col['offset'])
+            cols[col['name']].tofile(f)
+        f.seek(pos)
+        f.write(json.dumps(meta).encode('utf-8'))
+    os.replace(tmp_path, out_path)
+    return out_path
+
+def load_parse_cache(logpath: Path) -> ParseCache | None:
+    cache_path = parse_cache_path(logpath)
+    if not cache_path.exists():
+        return None
+    with open(cache_path, 'rb') as f:
+        if f.read(len(PARSE_CACHE_MAGIC)) != PARSE_CACHE_MAGIC:
+            return None
+        (meta_offset,) = struct.unpack('<Q', f.read(8))
+        f.seek(meta_offset)
+        try:
+            meta = json.loads(f.read().decode('utf-8'))
+        except Exception:
+            return None
+        if meta.get('version') != PARSE_CACHE_VERSION or meta.get('byteorder') != sys.byteorder:
+            return None
+        if meta.get('log') != log_fingerprint(logpath):
+            return None
+        cache_mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    log_mm = None
+    if meta['log']['size'] > 0:
+        with open(logpath, 'rb') as lf:
+            log_mm = mmap.mmap(lf.fileno(), 0, access=mmap.ACCESS_READ)
+    return ParseCache(logpath, meta, cache_mm, log_mm)
+
+def get_parse_cache(logpath: Path) -> ParseCache | None:
+    cache = load_parse_cache(logpath)
+    if cache is None and build_parse_cache(logpath) is not None:
+        cache = load_parse_cache(logpath)
+    return cache
+
+def open_parse_cache(logpath: Path, key_match=None) -> ParseCache | None:
+    if not USE_PARSE_CACHE or (key_match or KEY_MATCH_MODE) != "column":
+        return None
+    return get_parse_cache(logpath)
+
 # Override loader 
 
-def load_overrides():
-    overrides_path = Path("overrides.json")
+def load_overrides(inst_dir: Path):
+    overrides_path = inst_dir / "overrides.json"
     if not overrides_path.exists():
         return {}
     try:
@@ -157,91 +837,558 @@ def load_overrides():
 
 # Derive relayer IP via key overlap
 
-def derive_relayer_ip_from_overlap(inst: Path) -> str:
-    MIN_OVERLAP = 3
-    MIN_RATIO = 0.5  # at least 50% of relayer forwarded keys must align with a single downloader dest
+_DOWNLOADER_INDEX = {}
+DOWNLOADER_INDEX_EXPANSION = 5  # index memory per byte of downloadRequests.txt
+DEST_INDEX = ".levine_dest_index.json"
+DEST_INDEX_VERSION = 1
 
-    parent_file_dir = inst.parent  # FileN/
-    downloader_requests = parent_file_dir / "downloader" / "downloadRequests.txt"
-    if not downloader_requests.exists():
-        return ""
+def file_stamp(path: Path):
+    st = path.stat()
+    return (st.st_size, st.st_mtime_ns)
+
+def write_dest_index(inst_dir: Path, parsed):
+    # Saves downloader_key_index() of the downloadRequests.txt just written from
+    # parsed (a ParsedRequests), so relayer jobs in every worker load it instead
+    # of parsing the file again. Plain JSON: the output folder may be shared,
+    # and loading it must not be able to run code. Nearly every key goes to one
+    # destination, so it holds the key list, each key's first destination id,
+    # and the further (key, destination) pairs.
+    first = [-1] * len(parsed.ids[0])
+    extra = set()
+    for key_id, ip_id in zip(parsed.key, parsed.ip):
+        if first[key_id] < 0:
+            first[key_id] = ip_id
+        elif first[key_id] != ip_id:
+            extra.add((key_id, ip_id))
+    extra = sorted(extra)
+    index = {
+        'version': DEST_INDEX_VERSION,
+        'stamp': file_stamp(inst_dir / "downloadRequests.txt"),
+        'dests': parsed.table('ip'),
+        'keys': parsed.table('key'),
+        'first': first,
+        'extra_keys': [key_id for key_id, _ in extra],
+        'extra_dests': [ip_id for _, ip_id in extra],
+    }
+    tmp = inst_dir / (DEST_INDEX + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(',', ':'))
+    os.replace(tmp, inst_dir / DEST_INDEX)
 
-    dest_to_keys = defaultdict(set)
-    with downloader_requests.open("r", encoding="utf-8", errors="ignore") as f:
+def load_dest_index(downloader_requests: Path, stamp):
+    # Returns (index, None), or (None, why it is not used).
+    path = downloader_requests.parent / DEST_INDEX
+    if not path.exists():
+        return None, "missing"
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved.get('version') != DEST_INDEX_VERSION:
+            return None, "old format"
+        if tuple(saved['stamp']) != stamp:
+            return None, "stale"
+        keys = saved['keys']
+        key_to_dests = dict(zip(keys, zip(saved['first'])))
+        for key_id, ip_id in zip(saved['extra_keys'], saved['extra_dests']):
+            key_to_dests[keys[key_id]] += (ip_id,)
+        return (saved['dests'], key_to_dests), None
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return None, "unreadable"
+
+def downloader_key_index(downloader_requests: Path):
+    # Inverted index of the downloader's requests: (destinations in first-seen
+    # order, key -> ids of the destinations it was sent to). Loaded from the
+    # downloader job's DEST_INDEX, or built, once per process and reused by
+    # every relayer of the file until the file changes.
+    stamp = file_stamp(downloader_requests)
+    cached = _DOWNLOADER_INDEX.get(downloader_requests)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    index, reason = load_dest_index(downloader_requests, stamp)
+    if index is not None:
+        _DOWNLOADER_INDEX[downloader_requests] = (stamp, index)
+        return index
+
+    inst_dir = downloader_requests.parent
+    print(f"[WARN] {inst_dir.parent.name}/{inst_dir.name}: {DEST_INDEX} {reason}, parsing {downloader_requests.name}")
+    dest_ids = {}
+    key_to_dests = defaultdict(set)
+    # Read in the encoding it was written in, so the result equals the saved index.
+    with downloader_requests.open("r", errors="ignore") as f:
         for line in f:
             try:
                 rec = parse_request_line(line)
             except Exception:
                 continue
-            dest_ipport = rec['ip']
-            key = rec['key']
-            dest_to_keys[dest_ipport].add(key)
+            dest_id = dest_ids.setdefault(rec.ip, len(dest_ids))
+            key_to_dests[rec.key].add(dest_id)
+    index = (list(dest_ids), {key: tuple(ids) for key, ids in key_to_dests.items()})
+    _DOWNLOADER_INDEX[downloader_requests] = (stamp, index)
+    return index
 
-    relayer_keys = set()
-    download_reqs_path = inst / "downloadRequests.txt"
-    if not download_reqs_path.exists():
-        return ""
-    with download_reqs_path.open("r", encoding="utf-8", errors="ignore") as f:
+def scan_downloader_overlap(downloader_requests: Path, relayer_keys):
+    # The same overlap counts as downloader_key_index, taken in one pass over
+    # the downloader's requests without indexing every key. Returns
+    # (destinations in first-seen order, dest id -> relayer keys sent there).
+    dest_ids = {}
+    seen = set()
+    overlaps = Counter()
+    with downloader_requests.open("r", errors="ignore") as f:
         for line in f:
             try:
                 rec = parse_request_line(line)
             except Exception:
                 continue
-            if 'insert' in rec['req_type'].lower():
-                continue
-            relayer_keys.add(rec['key'])
+            dest_id = dest_ids.setdefault(rec.ip, len(dest_ids))
+            if rec.key in relayer_keys and (rec.key, dest_id) not in seen:
+                seen.add((rec.key, dest_id))
+                overlaps[dest_id] += 1
+    return list(dest_ids), overlaps
 
-    if not relayer_keys:
+RELAYER_MIN_OVERLAP = 3
+RELAYER_MIN_RATIO = 0.5  # at least 50% of relayer forwarded keys must align with a single downloader dest
+
+def best_overlap_dest(overlaps, key_count):
+    # The downloader destination id the relayer's keys overlap most (ties go to
+    # the destination the downloader used first), or None below the thresholds.
+    if not overlaps or not key_count:
+        return None
+    best_id = min(overlaps, key=lambda dest_id: (-overlaps[dest_id], dest_id))
+    if overlaps[best_id] >= RELAYER_MIN_OVERLAP and overlaps[best_id] / key_count >= RELAYER_MIN_RATIO:
+        return best_id
+    return None
+
+def derive_relayer_ip_from_overlap(inst: Path, relayer_keys=None) -> str:
+    # relayer_keys: the instance's forwarded (non-insert) keys, taken from its
+    # records in memory. Streaming jobs do not hold their records and pass
+    # None, and the keys are read back from the instance's downloadRequests.txt.
+    parent_file_dir = inst.parent  # FileN/
+    downloader_requests = parent_file_dir / "downloader" / "downloadRequests.txt"
+    if not downloader_requests.exists():
         return ""
 
-    best_ip = ""
-    best_overlap = 0
-    best_ratio = 0.0
-    for cand_ip, keys in dest_to_keys.items():
-        overlap = len(relayer_keys & keys)
-        if overlap == 0:
-            continue
-        ratio = overlap / len(relayer_keys)
-        if overlap > best_overlap or (overlap == best_overlap and ratio > best_ratio):
-            best_overlap = overlap
-            best_ratio = ratio
-            best_ip = cand_ip
+    if relayer_keys is None:
+        relayer_keys = set()
+        download_reqs_path = inst / "downloadRequests.txt"
+        if not download_reqs_path.exists():
+            return ""
+        with download_reqs_path.open("r", errors="ignore") as f:
+            for line in f:
+                try:
+                    rec = parse_request_line(line)
+                except Exception:
+                    continue
+                if 'insert' in rec.req_type.lower():
+                    continue
+                relayer_keys.add(rec.key)
+
+    if not relayer_keys:
+        return ""
 
-    if best_overlap >= MIN_OVERLAP and best_ratio >= MIN_RATIO:
-        return best_ip
-    return ""
+    # Streaming jobs scan instead when the index would not fit their memory budget.
+    if STREAM_MEMORY_BYTES and downloader_requests.stat().st_size * DOWNLOADER_INDEX_EXPANSION > STREAM_MEMORY_BYTES:
+        dests, overlaps = scan_downloader_overlap(downloader_requests, relayer_keys)
+    else:
+        dests, key_to_dests = downloader_key_index(downloader_requests)
+        overlaps = Counter()
+        for key in relayer_keys:
+            overlaps.update(key_to_dests.get(key, ()))
+    best_id = best_overlap_dest(overlaps, len(relayer_keys))
+    return dests[best_id] if best_id is not None else ""
 
 # FTS block writer 
 
 def write_fts_block_final(out_path: Path, relayer_name: str, overrides: dict, le_ipport: str,
                           run_start_excel: str, run_end_excel: str,
                           detail_rows: list[str], manifest_key: str, subject_ip: str):
-    le_ip, le_port = (le_ipport.split(':', 1) + [""])[:2]
     with out_path.open("w", encoding="utf-8") as f:
-        f.write(f"{relayer_name}\t\n")
-        f.write(f"My Status\t{overrides.get('My Status','')}\n")
-        f.write(f"Iccacops Status\t{overrides.get('Iccacops Status','')}\n")
-        f.write(f"ISP:\t{overrides.get('ISP','')}\n")
-        f.write(f"Location\t{overrides.get('Location','')}\n")
-        f.write(f"IP Address\t{subject_ip}\n")  # relayer's IP
-        f.write(f"Location ID\t{overrides.get('Location ID','')}\n")
-        f.write(f"LE ID\t{le_port}\n")
-        f.write(f"Filename\t{overrides.get('Filename','')}\n")
-        f.write(f"SHA1 hex\t{overrides.get('SHA1 hex','')}\n")
-        f.write(f"SHA1 base32\t{overrides.get('SHA1 base32','')}\n")
-        f.write(f"SHA256\t{overrides.get('SHA256','')}\n")
-        f.write(f"Manifest key\t{manifest_key}\n")
-        f.write(f"Run Start\t{run_start_excel}\n")
-        f.write(f"Run End\t{run_end_excel}\n")
-        f.write("\n")
-        f.write("Date/Time\tPort\tType\tHTL\tTotal Blocks\tData Blocks\tPeers\tLE ID\tSplit Keys\n")
+        write_fts_header(f, relayer_name, overrides, le_ipport, run_start_excel, run_end_excel,
+                         manifest_key, subject_ip)
         for row in detail_rows:
             f.write(row.rstrip("\n") + "\n")
 
+def write_fts_header(f, relayer_name: str, overrides: dict, le_ipport: str,
+                     run_start_excel: str, run_end_excel: str, manifest_key: str, subject_ip: str):
+    # Everything of an FTS block above its detail rows, ending with the column header line.
+    le_ip, le_port = (le_ipport.split(':', 1) + [""])[:2]
+    f.write(f"{relayer_name}\t\n")
+    f.write(f"My Status\t{overrides.get('My Status','')}\n")
+    f.write(f"Iccacops Status\t{overrides.get('Iccacops Status','')}\n")
+    f.write(f"ISP:\t{overrides.get('ISP','')}\n")
+    f.write(f"Location\t{overrides.get('Location','')}\n")
+    f.write(f"IP Address\t{subject_ip}\n")  # relayer's IP
+    f.write(f"Location ID\t{overrides.get('Location ID','')}\n")
+    f.write(f"LE ID\t{le_port}\n")
+    f.write(f"Filename\t{overrides.get('Filename','')}\n")
+    f.write(f"SHA1 hex\t{overrides.get('SHA1 hex','')}\n")
+    f.write(f"SHA1 base32\t{overrides.get('SHA1 base32','')}\n")
+    f.write(f"SHA256\t{overrides.get('SHA256','')}\n")
+    f.write(f"Manifest key\t{manifest_key}\n")
+    f.write(f"Run Start\t{run_start_excel}\n")
+    f.write(f"Run End\t{run_end_excel}\n")
+    f.write("\n")
+    f.write("Date/Time\tPort\tType\tHTL\tTotal Blocks\tData Blocks\tPeers\tLE ID\tSplit Keys\n")
+
+# Incremental resume fingerprints 
+#
+# Each finished job leaves .levine_job.json in its instance folder describing
+# the inputs it was computed from. A job is skipped only when that record
+# matches the current inputs; aggregate reports keep a record of the job
+# records they were built from, so only files with changed jobs are rebuilt.
+
+JOB_RECORD = ".levine_job.json"
+AGGREGATE_RECORD = ".levine_aggregate.json"
+_CODE_VERSION = None
+
+def sha256_file(path: Path):
+    if not path.exists():
+        return None
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def code_version():
+    global _CODE_VERSION
+    if _CODE_VERSION is None:
+        _CODE_VERSION = sha256_file(Path(__file__).resolve())
+    return _CODE_VERSION
+
+def log_input_fingerprint(instance_name: str, start_dir: Path, input_dir: Path | None = None):
+    logpath = locate_requests_log(instance_name, start_dir, input_dir)
+    if logpath is None:
+        return None
+    if FULL_LOG_HASH:
+        st = logpath.stat()
+        return {'path': str(logpath.resolve()), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                'sha256': full_log_sha256(str(logpath.resolve()), st.st_size, st.st_mtime_ns)}
+    # The sampled hash misses a same-size edit in the middle of the log, so the
+    # mtime is part of the fingerprint too: re-staging a log recomputes its
+    # jobs rather than risk keeping stale results.
+    return {'path': str(logpath.resolve()), **log_fingerprint(logpath)}
+
+@lru_cache(maxsize=None)
+def full_log_sha256(path, size, mtime_ns):
+    # Keyed by size and mtime so every relayer job of a worker hashes the
+    # downloader log once.
+    return sha256_file(Path(path))
+
+def job_fingerprint(manifest_path: Path, inst_dir: Path, instance_name: str) -> dict:
+    input_dir = manifest_path.parent
+    record = {
+        'code': code_version(),
+        'manifest': manifest_sha256(manifest_path),
+        'log': log_input_fingerprint(instance_name, inst_dir, input_dir),
+        'constants': {
+            'RUN_MIN_REQUESTS': RUN_MIN_REQUESTS,
+            'PROB_THRESHOLD': PROB_THRESHOLD,
+            'KEY_MATCH_MODE': KEY_MATCH_MODE,
+            'USE_PEER_ARCHIVE': USE_PEER_ARCHIVE,
+        },
+        'overrides': overrides_sha256(inst_dir),
+    }
+    if instance_name != "downloader":
+        # Relayer FTS output derives the subject IP from the downloader's filtered requests.
+        record['downloader_log'] = log_input_fingerprint("downloader", inst_dir.parent / "downloader", input_dir)
+    return record
+
+def read_job_record(inst_dir: Path):
+    path = inst_dir / JOB_RECORD
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except Exception:
+        return None
+
+def write_job_record(inst_dir: Path, fingerprint: dict):
+    tmp = inst_dir / (JOB_RECORD + ".tmp")
+    tmp.write_text(json.dumps(fingerprint, sort_keys=True, indent=1), encoding='utf-8')
+    os.replace(tmp, inst_dir / JOB_RECORD)
+
+def clear_job_record(inst_dir: Path):
+    try:
+        (inst_dir / JOB_RECORD).unlink()
+    except FileNotFoundError:
+        pass
+
+def aggregate_inputs(folder: Path, instances=None) -> dict:
+    jobs = {}
+    for sub in sorted(p for p in folder.iterdir() if p.is_dir()):
+        jobs[sub.name] = sha256_file(sub / JOB_RECORD)
+    return {'code': code_version(), 'jobs': jobs, 'instances': instances}
+
+def aggregate_is_current(folder: Path, inputs: dict, outputs) -> bool:
+    if FORCE_REPROCESS:
+        return False
+    if not all((folder / name).exists() for name in outputs):
+        return False
+    try:
+        return json.loads((folder / AGGREGATE_RECORD).read_text(encoding='utf-8')) == inputs
+    except Exception:
+        return False
+
+def write_aggregate_record(folder: Path, inputs: dict):
+    (folder / AGGREGATE_RECORD).write_text(json.dumps(inputs, sort_keys=True, indent=1), encoding='utf-8')
+
+# Results store 
+#
+# Every job also writes its structured results (per-peer metrics, run
+# decisions and FTS detail rows) into levine_results.db next to the manifests.
+# Per-file reports, File<N>_summary.csv and the false positive index are built
+# from indexed queries on it instead of re-reading and re-parsing every
+# instance's text outputs, and the same tables answer cross-file questions
+# (e.g. every file and relayer a peer had a run on) directly.
+
+RESULTS_DB = "levine_results.db"
+RESULTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS instances (
+    file TEXT NOT NULL,
+    instance TEXT NOT NULL,
+    is_downloader INTEGER NOT NULL,
+    avg_peers REAL,
+    total_blocks INTEGER,
+    unique_peers INTEGER,
+    runs INTEGER,
+    false_positives INTEGER,
+    true_positives INTEGER,
+    unique_requests INTEGER,
+    report TEXT NOT NULL,
+    fingerprint TEXT,
+    PRIMARY KEY (file, instance)
+);
+CREATE TABLE IF NOT EXISTS peers (
+    file TEXT NOT NULL,
+    instance TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    peer TEXT NOT NULL,
+    requests INTEGER,
+    duplicates INTEGER,
+    inserts INTEGER,
+    adj_requests INTEGER,
+    avg_interval REAL,
+    had_run INTEGER,
+    passes INTEGER,
+    probability REAL,
+    report_line TEXT,
+    PRIMARY KEY (file, instance, idx)
+);
+CREATE INDEX IF NOT EXISTS peers_by_peer ON peers (peer);
+CREATE TABLE IF NOT EXISTS fts_rows (
+    file TEXT NOT NULL,
+    instance TEXT NOT NULL,
+    peer TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    excel_date TEXT,
+    port TEXT,
+    type TEXT,
+    htl TEXT,
+    total_blocks TEXT,
+    data_blocks TEXT,
+    peers TEXT,
+    le_ip TEXT,
+    split_key TEXT,
+    PRIMARY KEY (file, instance, peer, seq)
+);
+CREATE INDEX IF NOT EXISTS fts_rows_by_peer ON fts_rows (peer);
+"""
+
+@contextmanager
+def results_db(base: Path):
+    conn = sqlite3.connect(base / RESULTS_DB, timeout=120)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")  # readers never block the writing workers
+        conn.executescript(RESULTS_SCHEMA)
+        yield conn
+    finally:
+        conn.close()
+
+def instance_results(peer_order, duplicates_list, inserts_list, data_requests_num_list, avg_intervals,
+                     report_lines, decisions, avg_peers, total_blocks, unique_peers, is_downloader):
+    # In-memory result of one instance: what the FTS extraction and the results
+    # store consume, so neither has to parse the text outputs back.
+    rows = peer_rows(peer_order, duplicates_list, inserts_list, data_requests_num_list)
+    peers = []
+    for idx, ((peer, requests, inserts_cnt, duplicates_cnt, adj_requests), avg_interval, decision) in enumerate(
+            zip(rows, avg_intervals, decisions), start=1):
+        had_run, passes, prob, line = decision
+        if isinstance(avg_interval, float) and math.isnan(avg_interval):
+            avg_interval = None
+        peers.append((idx, peer, requests, duplicates_cnt, inserts_cnt, adj_requests,
+                      avg_interval, int(had_run), int(passes), prob, line))
+    runs = sum(1 for had_run, _, _, _ in decisions if had_run)
+    passing = [peer for peer, (_, passes, _, _) in zip(peer_order, decisions) if passes]
+    return {
+        'is_downloader': is_downloader,
+        'avg_peers': avg_peers,
+        'total_blocks': total_blocks,
+        'unique_peers': unique_peers,
+        'runs': runs,
+        'false_positives': None if is_downloader else len(passing),
+        'true_positives': len(passing) if is_downloader else None,
+        'unique_requests': sum(int(x) for x in data_requests_num_list if x.isdigit()),
+        'report': "\n".join(report_lines),
+        'peers': peers,
+        'passing': passing,
+        'fts': {},
+    }
+
+def store_instance_results(inst_dir: Path, results: dict, fingerprint=None, fts_peers=None, fts_seq=None):
+    # Replaces the stored results of one instance folder. fts_peers limits the
+    # FTS rows replaced to those peers (follow mode re-extracts only some).
+    # fts_seq (peer -> seq of its first row in results['fts']) appends rows
+    # after a peer's stored ones instead.
+    base = inst_dir.parent.parent
+    key = (inst_dir.parent.name[len("File"):], inst_dir.name)
+    with results_db(base) as db, db:
+        db.execute("DELETE FROM peers WHERE file = ? AND instance = ?", key)
+        if fts_peers is None:
+            db.execute("DELETE FROM fts_rows WHERE file = ? AND instance = ?", key)
+        else:
+            db.executemany("DELETE FROM fts_rows WHERE file = ? AND instance = ? AND peer = ?",
+                           [key + (peer,) for peer in fts_peers])
+        db.execute(
+            "INSERT OR REPLACE INTO instances VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            key + (int(results['is_downloader']), results['avg_peers'], results['total_blocks'],
+                   results['unique_peers'], results['runs'], results['false_positives'],
+                   results['true_positives'], results['unique_requests'], results['report'],
+                   json.dumps(fingerprint, sort_keys=True) if fingerprint is not None else None))
+        db.executemany("INSERT INTO peers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       [key + p for p in results['peers']])
+        insert_fts_rows(db, key, results['fts'], fts_seq)
+    # Streaming jobs extract after the instance row exists, each batch in a short transaction.
+    for fts in results.get('fts_batches', ()):
+        with results_db(base) as db, db:
+            insert_fts_rows(db, key, fts)
+
+def insert_fts_rows(db, key, fts, first_seq=None):
+    first_seq = first_seq or {}
+    db.executemany("INSERT INTO fts_rows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                   (key + (peer, seq) + tuple(fields[:9])
+                    for peer, rows in fts.items() for seq, fields in enumerate(rows, first_seq.get(peer, 0))))
+
+def truncate_fts_rows(inst_dir: Path, kept: dict):
+    # Deletes the stored FTS rows of one instance folder past kept[peer] rows
+    # per peer, and all rows of peers not in kept.
+    base = inst_dir.parent.parent
+    if not (base / RESULTS_DB).exists():
+        return
+    key = (inst_dir.parent.name[len("File"):], inst_dir.name)
+    with results_db(base) as db, db:
+        counts = db.execute("SELECT peer, COUNT(*) FROM fts_rows WHERE file = ? AND instance = ? GROUP BY peer",
+                            key).fetchall()
+        for peer, count in counts:
+            if count > kept.get(peer, 0):
+                db.execute("DELETE FROM fts_rows WHERE file = ? AND instance = ? AND peer = ? AND seq >= ?",
+                           key + (peer, kept.get(peer, 0)))
+
+def delete_instance_results(inst_dir: Path):
+    # Drops every stored row of one instance folder, so a job that fails after
+    # this point leaves nothing for the aggregates to report.
+    base = inst_dir.parent.parent
+    if not (base / RESULTS_DB).exists():
+        return
+    key = (inst_dir.parent.name[len("File"):], inst_dir.name)
+    with results_db(base) as db, db:
+        for table in ("instances", "peers", "fts_rows"):
+            db.execute(f"DELETE FROM {table} WHERE file = ? AND instance = ?", key)
+
+def set_results_fingerprint(inst_dir: Path, fingerprint: dict):
+    with results_db(inst_dir.parent.parent) as db, db:
+        db.execute("UPDATE instances SET fingerprint = ? WHERE file = ? AND instance = ?",
+                   (json.dumps(fingerprint, sort_keys=True), inst_dir.parent.name[len("File"):], inst_dir.name))
+
+def results_are_current(inst_dir: Path, fingerprint: dict) -> bool:
+    base = inst_dir.parent.parent
+    if not (base / RESULTS_DB).exists():
+        return False
+    with results_db(base) as db:
+        row = db.execute("SELECT fingerprint FROM instances WHERE file = ? AND instance = ?",
+                         (inst_dir.parent.name[len("File"):], inst_dir.name)).fetchone()
+    return row is not None and row[0] == json.dumps(fingerprint, sort_keys=True)
+
+# Run context 
+#
+# Inputs that every job would otherwise re-read are read once by the runner
+# and handed to the workers with the settings, through the pool initializer:
+# each manifest's keys, block count, first line (the FTS "Manifest key") and
+# hash, and each instance folder's overrides.json and its hash. Jobs read the
+# files themselves when no context is set (follow mode, direct calls) or an
+# input is not in it. The downloader's destination index only exists once the
+# downloader job has run, so that job writes it next to its outputs instead
+# (see write_dest_index).
+
+_RUN_CONTEXT = {}
+
+def manifest_first_line(path: Path):
+    try:
+        return path.read_text(encoding='utf-8', errors='ignore').splitlines()[0].strip()
+    except Exception:
+        return ""
+
+def build_run_context(input_dir: Path, output_dir: Path, manifests, instances) -> dict:
+    context = {'manifests': {}, 'instances': {}}
+    for name in manifests:
+        path = input_dir / name
+        if not path.exists() or not name.startswith("downloadKeys_File") or not name.endswith(".txt"):
+            continue
+        context['manifests'][str(path)] = {
+            'sha256': sha256_file(path),
+            'keys': read_manifest_keys(path),
+            'total_blocks': count_manifest_blocks(path),
+            'first_line': manifest_first_line(path),
+        }
+        file_dir = output_dir / f"File{name[len('downloadKeys_File'):-4]}"
+        for inst in instances:
+            inst_dir = file_dir / inst
+            context['instances'][str(inst_dir)] = {
+                'manifest': str(path),
+                'overrides_sha256': sha256_file(inst_dir / "overrides.json"),
+                'overrides': load_overrides(inst_dir),
+            }
+    return context
+
+def set_run_context(context):
+    global _RUN_CONTEXT
+    _RUN_CONTEXT = context or {}
+
+def context_manifest(inst_dir: Path):
+    # The run context entry of the manifest copied into inst_dir, or None.
+    inst = _RUN_CONTEXT.get('instances', {}).get(str(inst_dir))
+    return _RUN_CONTEXT['manifests'].get(inst['manifest']) if inst is not None else None
+
+def manifest_sha256(manifest_path: Path):
+    cached = _RUN_CONTEXT.get('manifests', {}).get(str(manifest_path))
+    return cached['sha256'] if cached is not None else sha256_file(manifest_path)
+
+def overrides_sha256(inst_dir: Path):
+    cached = _RUN_CONTEXT.get('instances', {}).get(str(inst_dir))
+    return cached['overrides_sha256'] if cached is not None else sha256_file(inst_dir / "overrides.json")
+
+def instance_overrides(inst_dir: Path):
+    cached = _RUN_CONTEXT.get('instances', {}).get(str(inst_dir))
+    return cached['overrides'] if cached is not None else load_overrides(inst_dir)
+
+def instance_manifest_keys(inst_dir: Path):
+    cached = context_manifest(inst_dir)
+    return cached['keys'] if cached is not None else read_manifest_keys(inst_dir / "downloadKeys.txt")
+
+def instance_total_blocks(inst_dir: Path):
+    cached = context_manifest(inst_dir)
+    return cached['total_blocks'] if cached is not None else read_total_blocks(inst_dir)
+
+def instance_manifest_key(inst_dir: Path):
+    cached = context_manifest(inst_dir)
+    if cached is not None:
+        return cached['first_line']
+    dk_path = inst_dir / "downloadKeys.txt"
+    return manifest_first_line(dk_path) if dk_path.exists() else ""
+
 # Core logic for a single (manifest, instance) pair 
 
-def process_instance_pair(manifest_name, instance_name):
-    base = Path.cwd()
+def prepare_instance_pair(manifest_name, instance_name, input_dir=None, output_dir=None):
+    base = Path(input_dir) if input_dir is not None else Path.cwd()
     manifest_path = base / manifest_name
     if not manifest_path.exists():
         print(f"[WARN] manifest missing: {manifest_name}")
@@ -249,389 +1396,1093 @@ def process_instance_pair(manifest_name, instance_name):
     if not manifest_name.startswith("downloadKeys_File") or not manifest_name.endswith(".txt"):
         return
     file_number = manifest_name[len("downloadKeys_File"):-4]
-    file_dir = base / f"File{file_number}"
+    file_dir = (Path(output_dir) if output_dir is not None else base) / f"File{file_number}"
     inst_dir = file_dir / instance_name
     ensure_dir(inst_dir)
 
+    fingerprint = job_fingerprint(manifest_path, inst_dir, instance_name)
     prob_report_path = inst_dir / "probabilityReport.txt"
-    if prob_report_path.exists() and not FORCE_REPROCESS:
-        return
+    if (prob_report_path.exists() and not FORCE_REPROCESS and read_job_record(inst_dir) == fingerprint
+            and results_are_current(inst_dir, fingerprint)):
+        return None
 
+    clear_job_record(inst_dir)
+    delete_instance_results(inst_dir)
     shutil.copy2(manifest_path, inst_dir / "downloadKeys.txt")
-    process_instance(inst_dir, is_downloader=(instance_name == "downloader"))
+    return inst_dir, fingerprint
 
-def process_instance(instance_folder: Path, is_downloader=False):
-    cwd = os.getcwd()
-    os.chdir(instance_folder)
-    try:
-        with open("downloadKeys.txt", 'r', encoding='utf-8', errors='ignore') as f:
-            keys = [l.strip() for l in f if l.strip()]
+def process_instance_pair(manifest_name, instance_name, key_match=None, input_dir=None, output_dir=None):
+    prepared = prepare_instance_pair(manifest_name, instance_name, input_dir, output_dir)
+    if prepared is None:
+        return
+    inst_dir, fingerprint = prepared
+    results = process_instance(inst_dir, is_downloader=(instance_name == "downloader"), key_match=key_match,
+                               input_dir=input_dir)
+    if results is not None:
+        with profile_stage("store_results"):
+            store_instance_results(inst_dir, results, fingerprint)
+        write_job_record(inst_dir, fingerprint)
+
+def process_instance_files(manifest_names, instance_name, key_match=None, input_dir=None, output_dir=None):
+    # Single-pass ingestion: read requests_<instance>.log once and route each
+    # line to every manifest whose key set contains its key.
+    pending = {}
+    fingerprints = {}
+    for manifest_name in manifest_names:
+        prepared = prepare_instance_pair(manifest_name, instance_name, input_dir, output_dir)
+        if prepared is not None:
+            pending[manifest_name], fingerprints[manifest_name] = prepared
+    if not pending:
+        return
 
-        instance_name = instance_folder.name
-        logpath = locate_requests_log(instance_name, instance_folder)
+    by_log = defaultdict(list)
+    for manifest_name, inst_dir in pending.items():
+        logpath = locate_requests_log(instance_name, inst_dir, input_dir)
         if logpath is None:
-            print(f"[ERROR] no requests_{instance_name}.log found in {instance_folder} or upward")
-            return
+            print(f"[ERROR] no requests_{instance_name}.log found in {inst_dir} or upward")
+            continue
+        by_log[logpath].append(manifest_name)
 
-        filtered_lines = []
-        parsed_records = []
-        ip_add = []
-        num_peers_vals = []
-        request_locs = []
-        with open(logpath, 'r', encoding='utf-8', errors='ignore') as f:
-            for line in f:
-                if not line.strip():
-                    continue
-                if any(k in line for k in keys):
-                    filtered_lines.append(line.rstrip("\n"))
-                    try:
-                        rec = parse_request_line(line)
-                    except ValueError:
-                        continue
-                    parsed_records.append(rec)
-                    ip_add.append(rec['ip'])
-                    num_peers_vals.append(rec['num_peers'])
-                    request_locs.append(rec['request_loc'])
+    for logpath, group in by_log.items():
+        key_sets = {m: instance_manifest_keys(pending[m]) for m in group}
+        if STREAM_MEMORY_BYTES:
+            stream_instance_files(pending, fingerprints, logpath, key_sets, key_match, instance_name == "downloader")
+            continue
+        with profile_stage("filter_parse"):
+            cache = open_parse_cache(logpath, key_match)
+            if cache is not None:
+                try:
+                    routed = cache.route(key_sets)
+                finally:
+                    cache.close()
+            elif should_split_log(logpath):
+                routed = parallel_route_request_log(logpath, key_sets, key_match)
+            elif use_mmap_reader(logpath, key_match):
+                routed = scan_log_mmap(logpath, key_sets)
+            else:
+                routed = route_request_log(logpath, build_key_router(key_sets, key_match), group)
+        if profiling():
+            profile_count("filter_parse", count_log_lines(logpath),
+                          sum(len(routed[m].lines) for m in group))
+        for manifest_name in group:
+            results = analyze_instance(pending[manifest_name], routed[manifest_name],
+                                       is_downloader=(instance_name == "downloader"))
+            with profile_stage("store_results"):
+                store_instance_results(pending[manifest_name], results, fingerprints[manifest_name])
+            write_job_record(pending[manifest_name], fingerprints[manifest_name])
 
-        with open("downloadRequests.txt", "w") as f:
-            for l in filtered_lines:
-                f.write(l + "\n")
-        with open("requestLocs.txt", "w") as f:
-            for loc in request_locs:
-                f.write(loc + "\n")
-        avg_peers = sum(num_peers_vals) / len(num_peers_vals) if num_peers_vals else 0.0
-        with open("avgPeers.txt", "w") as f:
-            f.write(f"{avg_peers}\n")
-        ip_counts = Counter(ip_add)
-        with open("sentToPeer.txt", "w") as f:
-            for ip, cnt in ip_counts.items():
-                f.write(f"{ip}   was sent {cnt} requests\n")
-
-        per_peer = defaultdict(lambda: {
-            'raw_requests': [],
-            'non_insert_requests': [],
-            'key_freq': Counter(),
-            'insert_count': 0,
-            'htl_counts': {'16':0, '17':0, '18':0},
-            'timestamps': [],
-            'request_locs': [],
-        })
-        for rec in parsed_records:
-            peer = rec['ip']
-            entry = per_peer[peer]
-            line_repr = ",".join([
-                rec['timestamp_raw'],
-                rec['req_type'],
-                rec['key'],
-                rec['request_loc'],
-                rec['htl'],
-                rec['ip'],
-                "", "",
-            ])
-            entry['raw_requests'].append(line_repr)
-            entry['request_locs'].append(rec['request_loc'])
+def read_manifest_keys(path: Path):
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        return [l.strip() for l in f if l.strip()]
 
-            if 'insert' in rec['req_type'].lower():
-                entry['insert_count'] += 1
-            else:
-                entry['non_insert_requests'].append(line_repr)
-                entry['key_freq'][rec['key']] += 1
+def iter_routed_log(logpath: Path, route_line):
+    # Yields (targets, line without its newline, parsed record or None) for
+    # each line route_line sends anywhere, reading the log as text.
+    with open_log_text(logpath) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            hits = route_line(line)
+            if not hits:
+                continue
+            try:
+                rec = parse_request_line(line)
+            except ValueError:
+                rec = None
+            yield hits, line.rstrip("\n"), rec
 
-            if rec['htl'] in ('16','17','18'):
-                entry['htl_counts'][rec['htl']] += 1
-            if rec['time_seconds'] is not None:
-                entry['timestamps'].append(rec['time_seconds'])
+def filter_request_log(logpath: Path, matches_key):
+    parsed = ParsedRequests()
+    for _, line, rec in iter_routed_log(logpath, matches_key):
+        parsed.add_line(line, rec)
+    return parsed
 
-        for entry in per_peer.values():
-            entry['timestamps'].sort()
+def route_request_log(logpath: Path, route_line, targets):
+    routed = {t: ParsedRequests() for t in targets}
+    for hits, line, rec in iter_routed_log(logpath, route_line):
+        for target in hits:
+            routed[target].add_line(line, rec)
+    return routed
 
-        peer_order = []
-        with open("sentToPeer.txt", "r") as f:
-            for ln in f:
-                if not ln.strip():
-                    continue
-                peer_order.append(ln.strip().split()[0])
-
-        duplicates_list = []
-        inserts_list = []
-        data_requests_num_list = []
-        htl_lines = []
-        avg_intervals = []
-
-        for idx, peer in enumerate(peer_order, start=1):
-            entry = per_peer.get(peer, {
-                'raw_requests': [],
-                'non_insert_requests': [],
-                'key_freq': Counter(),
-                'insert_count': 0,
-                'htl_counts': {'16':0, '17':0, '18':0},
-                'timestamps': [],
-                'request_locs': [],
-            })
+# Log readers 
+#
+# Logs are normally UTF-8 (LF or CRLF). Captures redirected by PowerShell are
+# UTF-16 with a BOM; the text reader detects them instead of matching nothing. The
+# byte-oriented paths (parse cache, byte ranges, mmap reader, follow) handle
+# UTF-8 only and fall back to the text reader for UTF-16 logs.
+#
+# Compressed logs (.gz, .xz, .bz2, and .zst with the zstandard package) are
+# stream-decompressed by a background thread into a bounded queue, so memory
+# stays at a few MiB and decompression (which releases the GIL) overlaps with
+# filtering. They need byte offsets into the plain file for the byte-oriented
+# paths, so those fall back to the text reader as for UTF-16.
+#
+# The mmap reader scans raw bytes for the key column and decodes only lines
+# whose key matches (--key-match column). It avoids decoding and allocating a
+# str for every line; in CPython the per-line loop dominates either way, so it
+# is opt-in (--log-reader mmap) rather than the default.
 
-            keys_file = f"keys{idx}.txt"
-            requests_file = f"requests{idx}.txt"
-            timestamps_file = f"requestTimestamps{idx}.txt"
-            intervals_file = f"requestIntervals{idx}.txt"
-            data_only_file = f"dataRequestsOnly{idx}.txt"
+ODD_KEY_BYTES_RE = re.compile(rb"[^\x21-\x7e]")
+STR_ONLY_WHITESPACE = (b"\r", b"\x1c", b"\x1d", b"\x1e", b"\x1f")
 
-            with open(keys_file, "w") as f:
-                for line in entry['raw_requests']:
-                    try:
-                        parsed = parse_request_line(line)
-                    except Exception:
-                        continue
-                    f.write(parsed['key'] + "\n")
+def is_plain_ascii(block: bytes) -> bool:
+    # No bytes where utf-8/ignore decoding, universal newlines or str.strip()
+    # would treat the text differently from the raw bytes.
+    return block.isascii() and not any(ch in block for ch in STR_ONLY_WHITESPACE)
 
-            with open(requests_file, "w") as f:
-                for line in entry['raw_requests']:
-                    f.write(line + "\n")
+DECOMPRESS_CHUNK = 1 << 20
+DECOMPRESS_QUEUE = 4  # decompressed chunks buffered ahead of the reader
+COMPRESSION_RATIO_ESTIMATE = 8  # assumed expansion when the format does not record it
 
-            with open(timestamps_file, "w") as f:
-                for ts in entry['timestamps']:
-                    f.write(f"{ts}\n")
-
-            intervals = []
-            for i in range(1, len(entry['timestamps'])):
-                intervals.append(entry['timestamps'][i] - entry['timestamps'][i-1])
-            with open(intervals_file, "w") as f:
-                for iv in intervals:
-                    f.write(f"{iv}\n")
-            if intervals:
-                avg_intervals.append(sum(intervals)/len(intervals))
-            else:
-                avg_intervals.append(float('nan'))
+def is_compressed_log(logpath: Path) -> bool:
+    return logpath.suffix in LOG_COMPRESSION_SUFFIXES
 
-            with open(data_only_file, "w") as f:
-                for line in entry['non_insert_requests']:
-                    f.write(line + "\n")
+def open_decompressor(logpath: Path):
+    # Binary stream of the decompressed log (read in the calling thread).
+    suffix = logpath.suffix
+    if suffix == ".gz":
+        return gzip.open(logpath, 'rb')
+    if suffix == ".xz":
+        return lzma.open(logpath, 'rb')
+    if suffix == ".bz2":
+        return bz2.open(logpath, 'rb')
+    if suffix == ".zst":
+        if zstandard is None:
+            raise RuntimeError(f"{logpath.name}: reading .zst logs requires the zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(open(logpath, 'rb'), closefd=True)
+    return open(logpath, 'rb')
 
-            duplicates = sum(c*(c-1)//2 for c in entry['key_freq'].values())
-            inserts = entry['insert_count']
-            data_requests_num = len(entry['non_insert_requests'])
-            htl_line = f"HTL 18: {entry['htl_counts'].get('18',0)}, HTL 17: {entry['htl_counts'].get('17',0)}, HTL 16: {entry['htl_counts'].get('16',0)}"
+class DecompressedStream(io.RawIOBase):
+    # Raw stream over a compressed log whose decompression runs in a background
+    # thread, at most DECOMPRESS_QUEUE chunks ahead of the reader.
 
-            duplicates_list.append(str(duplicates))
-            inserts_list.append(str(inserts))
-            data_requests_num_list.append(str(data_requests_num))
-            htl_lines.append(htl_line)
+    def __init__(self, logpath: Path):
+        self.logpath = logpath
+        self.chunks = queue.Queue(maxsize=DECOMPRESS_QUEUE)
+        self.pending = memoryview(b"")
+        self.at_eof = False
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._decompress, name=f"decompress-{logpath.name}", daemon=True)
+        self.thread.start()
 
-        with open("avgIntervals.txt", "w") as f:
-            for v in avg_intervals:
-                if isinstance(v, float) and math.isnan(v):
-                    f.write("nan\n")
-                else:
-                    f.write(f"{v}\n")
-        with open("duplicates.txt", "w") as f:
-            for l in duplicates_list:
-                f.write(l + "\n")
-        with open("inserts.txt", "w") as f:
-            for l in inserts_list:
-                f.write(l + "\n")
-        with open("dataRequestsNum.txt", "w") as f:
-            for l in data_requests_num_list:
-                f.write(l + "\n")
-        with open("HTL.txt", "w") as f:
-            for l in htl_lines:
-                f.write(l + "\n")
+    def _put(self, item):
+        while not self.stopping.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
 
-        peer_list_for_report = peer_order
-        adj_requests_sent = sum(int(x) for x in data_requests_num_list if x.isdigit())
+    def _decompress(self):
         try:
-            with open("avgPeers.txt", "r") as f:
-                avg_peers = float(f.read().strip())
-        except Exception:
-            avg_peers = 0.0
-        with open("downloadKeys.txt", "r") as f:
-            blocks = [l for l in (x.rstrip("\n") for x in f) if l != ""]
-        total_blocks = len(blocks)
-        T = int(0.8 * total_blocks)
-
-        report_lines = []
-        num_runs = 0
-        false_positive = 0
-        true_positive = 0
-        unique_peers_count = len(per_peer)
-
-        for idx, peer in enumerate(peer_list_for_report):
-            # Match Excel behavior: "requests" is unique non-insert requests (Total Unique Requests)
-            requests = int(data_requests_num_list[idx]) if idx < len(data_requests_num_list) and data_requests_num_list[idx].isdigit() else 0
-            inserts_cnt = int(inserts_list[idx]) if idx < len(inserts_list) and inserts_list[idx].isdigit() else 0
-            duplicates_cnt = int(duplicates_list[idx]) if idx < len(duplicates_list) and duplicates_list[idx].isdigit() else 0
-
-            adj_requests = requests - inserts_cnt - 3 * duplicates_cnt
-            if adj_requests < 0:
-                adj_requests = 0
-
-            if requests >= RUN_MIN_REQUESTS:
-                num_runs += 1
-                prob = calc_even_share_probability(avg_peers, T, adj_requests)
-                passes = prob > PROB_THRESHOLD
-                if passes:
-                    if is_downloader:
-                        true_positive += 1
-                    else:
-                        false_positive += 1
-                decision = "Yes" if passes else "No"
-                report_lines.append(
-                    f"{peer} had a run. Requests: {requests}, Duplicates: {duplicates_cnt}, Inserts: {inserts_cnt}, "
-                    f"Adj. Requests: {adj_requests}, Passes Levine: {decision}, Levine Downloader probability: {prob:.6f}"
-                )
-            else:
-                report_lines.append(
-                    f"{peer} did not see a run. Requests: {requests}, Duplicates: {duplicates_cnt}, Inserts: {inserts_cnt}, "
-                    f"Adj. Requests: {adj_requests}"
-                )
-
-        report_lines.append("")
-        report_lines.append(f"Average Peers: {avg_peers}")
-        report_lines.append(f"Number of Unique Peers Requests were Sent To: {unique_peers_count}")
-        if unique_peers_count > 0:
-            report_lines.append(f"Percent of Runs out of Peers Requests were Sent To: {100.0 * (num_runs / unique_peers_count):.2f} %")
-        else:
-            report_lines.append("Percent of Runs out of Peers Requests were Sent To:  0 %")
-        report_lines.append(f"Number of Runs: {num_runs}")
-        if not is_downloader:
-            report_lines.append(f"Number of False Positive Runs: {false_positive}")
-            if num_runs > 0:
-                report_lines.append(f"Local Rate of False Positive Runs: {100.0 * (false_positive / num_runs):.2f} %")
-            else:
-                report_lines.append("Local Rate of False Positive Runs: Not Applicable")
-        else:
-            report_lines.append(f"Number of True Positive Runs: {true_positive}")
-            if num_runs > 0:
-                report_lines.append(f"Local Rate of True Positive Runs: {100.0 * (true_positive / num_runs):.2f} %")
-            else:
-                report_lines.append("Local Rate of True Positive Runs: Not Applicable")
-            report_lines.append(f"Total Number of Blocks for File: {total_blocks}")
-            report_lines.append(f"Unique Requests sent: {adj_requests_sent}")
-            if total_blocks > 0:
-                report_lines.append(f"Percent of File Requested: {100.0 * adj_requests_sent / total_blocks:.2f} %")
-            else:
-                report_lines.append("Percent of File Requested: 0 %")
+            with open_decompressor(self.logpath) as src:
+                while True:
+                    chunk = src.read(DECOMPRESS_CHUNK)
+                    if not chunk or not self._put(chunk):
+                        break
+        except Exception as e:
+            self._put(e)
+        self._put(None)
 
-        with open("probabilityReport.txt", "w") as f:
-            for l in report_lines:
-                f.write(l + "\n")
+    def readable(self):
+        return True
 
-        extract_peer_requests_for_instance(is_downloader)
+    def readinto(self, b):
+        while not self.pending:
+            if self.at_eof:
+                return 0
+            item = self.chunks.get()
+            if item is None:
+                self.at_eof = True
+                return 0
+            if isinstance(item, Exception):
+                self.at_eof = True
+                raise item
+            self.pending = memoryview(item)
+        n = min(len(b), len(self.pending))
+        b[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        return n
 
-    finally:
-        os.chdir(cwd)
+    def close(self):
+        if not self.closed:
+            self.stopping.set()
+            self.thread.join()
+        super().close()
 
-# Post-processing helpers 
+def open_log_binary(logpath: Path):
+    if is_compressed_log(logpath):
+        return io.BufferedReader(DecompressedStream(logpath), DECOMPRESS_CHUNK)
+    return open(logpath, 'rb')
 
-def extract_peer_requests_for_instance(is_downloader_flag):
-    inst = Path.cwd()
-    relayer_name = inst.name
-    prob_report = inst / "probabilityReport.txt"
-    download_requests = inst / "downloadRequests.txt"
-    if not prob_report.exists() or not download_requests.exists():
-        return
+def log_size_estimate(logpath: Path) -> int:
+    # Uncompressed size of a log, for job costs. gzip records it (mod 4 GiB)
+    # in its last four bytes; other formats use COMPRESSION_RATIO_ESTIMATE.
+    size = logpath.stat().st_size
+    if not is_compressed_log(logpath):
+        return size
+    if logpath.suffix == ".gz" and size >= 4:
+        with open(logpath, 'rb') as f:
+            f.seek(-4, os.SEEK_END)
+            (isize,) = struct.unpack('<I', f.read(4))
+        if isize >= size:
+            return isize
+    return size * COMPRESSION_RATIO_ESTIMATE
 
-    ip_ports = []
-    for line in read_and_split(prob_report):
-        m = PASS_RUN_RE.match(line.strip())
-        if m:
-            ip_ports.append(m.group(1))
-    if not ip_ports:
-        return
+def detect_log_encoding(logpath: Path) -> str:
+    if is_compressed_log(logpath):
+        with open_decompressor(logpath) as f:
+            head = f.read(2)
+    else:
+        with open(logpath, 'rb') as f:
+            head = f.read(2)
+    if head in (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE):
+        return 'utf-16'
+    return 'utf-8'
 
-    req_lines = download_requests.read_text(encoding='utf-8', errors='ignore').splitlines()
-    overrides_all = load_overrides()
+def open_log_text(logpath: Path):
+    encoding = detect_log_encoding(logpath)
+    if is_compressed_log(logpath):
+        return io.TextIOWrapper(open_log_binary(logpath), encoding=encoding, errors='ignore')
+    return open(logpath, 'r', encoding=encoding, errors='ignore')
 
-    total_blocks = ""
-    data_blocks = ""
-    for line in read_and_split(prob_report):
-        low = line.lower()
-        if "total number of blocks for file:" in low:
-            parts = line.split(":", 1)
-            if len(parts) > 1:
-                total_blocks = parts[1].strip()
-        if "unique requests sent:" in low:
-            parts = line.split(":", 1)
-            if len(parts) > 1:
-                data_blocks = parts[1].strip()
-
-    avg_peers = 0.0
-    if (inst / "avgPeers.txt").exists():
-        try:
-            with open("avgPeers.txt", "r") as f:
-                avg_peers = float(f.read().strip())
-        except:
-            avg_peers = 0.0
-
-    percent_file_requested = ""
-    if is_downloader_flag:
-        for line in read_and_split(prob_report):
-            if line.lower().startswith("percent of file requested:"):
-                pct = line.split(":", 1)[1].strip()
-                percent_file_requested = pct
-
-    manifest_key = ""
-    dk_path = inst / "downloadKeys.txt"
-    if dk_path.exists():
+def is_utf8_log(logpath: Path) -> bool:
+    return detect_log_encoding(logpath) == 'utf-8'
+
+def use_mmap_reader(logpath: Path, key_match=None) -> bool:
+    return (LOG_READER == "mmap" and (key_match or KEY_MATCH_MODE) == "column" and not is_compressed_log(logpath)
+            and is_utf8_log(logpath))
+
+def scan_log_mmap(logpath: Path, key_sets: dict):
+    index = defaultdict(list)
+    for target, keys in key_sets.items():
+        for key in set(keys):
+            index[key].append(target)
+    str_index = {k: tuple(v) for k, v in index.items()}
+    byte_index = {k.encode('utf-8'): v for k, v in str_index.items()}
+    routed = {t: ParsedRequests() for t in key_sets}
+
+    def emit(line, hits):
+        stripped = line.rstrip("\n")
         try:
-            manifest_key = dk_path.read_text(encoding='utf-8', errors='ignore').splitlines()[0].strip()
-        except Exception:
-            manifest_key = ""
+            rec = parse_request_line(line)
+        except ValueError:
+            rec = None
+        for target in hits:
+            routed[target].add_line(stripped, rec)
 
-    for ip_port in ip_ports:
-        matches = [l for l in req_lines if ip_port in l]
-        if not matches:
-            continue
-        safe = ip_port.replace('.', '_').replace(':', '_')
-        out_req = inst / f"requests_{safe}.txt"
-        with out_req.open('w', encoding='utf-8') as f:
-            for l in matches:
-                f.write(l + "\n")
+    def text_route(raw):
+        # Exact text-mode handling for the rare line with a bare CR or a key
+        # field that is not plain printable ASCII.
+        for line in decode_log_text(raw):
+            parts = line.split(',', KEY_COLUMN + 1)
+            if line.strip() and len(parts) > KEY_COLUMN:
+                hits = str_index.get(parts[KEY_COLUMN].strip())
+                if hits:
+                    emit(line, hits)
 
-        detail_rows = []
-        total_blocks_for_detail = total_blocks
-        data_blocks_for_detail = data_blocks
-        for line in matches:
-            parts = line.strip().split(',')
-            if len(parts) < 9:
-                continue
-            excel_date = iso_to_excel(parts[0])
-            port = ip_port.split(':', 1)[1]
-            req_type = "R" if parts[1].strip() == "FNPCHKDataRequest" else ("I" if parts[1].strip() == "FNPInsertRequest" else "?")
-            htl = parts[4].strip()
-            peers = parts[8].strip()
-            le_ip = escape_for_excel(parts[5].strip())
-            split_key = escape_for_excel(parts[2].strip())
-            detail_line = "\t".join([
-                excel_date,
-                port,
-                req_type,
-                htl,
-                total_blocks_for_detail,
-                data_blocks_for_detail,
-                peers,
-                le_ip,
-                split_key
-            ])
-            detail_rows.append(detail_line)
-
-        run_start_excel = ""
-        run_end_excel = ""
-        if matches:
-            excels = []
-            for line in matches:
-                p = line.strip().split(',')
-                if p:
-                    excel = iso_to_excel(p[0])
-                    excels.append(excel)
-            if excels:
-                run_start_excel = excels[0]
-                run_end_excel = excels[-1]
-
-        key_name = f"{relayer_name}_{ip_port.replace(':', '_')}"
-        overrides = overrides_all.get(key_name, {})
-
-        subject_ip = derive_relayer_ip_from_overlap(inst)
+    size = logpath.stat().st_size
+    if size == 0:
+        return routed
+    with open(logpath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = 0
+        while pos < size:
+            end = mm.find(b"\n", min(size, pos + SPLIT_READ_BLOCK))
+            end = size if end < 0 else end + 1
+            block = mm[pos:end]
+            pos = end
+            lines = block.split(b"\n")
+            tail = lines.pop()  # b"" unless the log ends without a newline
+            if is_plain_ascii(block):
+                # Bytes and decoded text split and strip identically here.
+                get = byte_index.get
+                for raw in lines:
+                    parts = raw.split(b",", KEY_COLUMN + 1)
+                    if len(parts) > KEY_COLUMN:
+                        hits = get(parts[KEY_COLUMN].strip())
+                        if hits is not None:
+                            emit(raw.decode('ascii') + "\n", hits)
+            else:
+                for raw in lines:
+                    if b"\r" in raw:
+                        if raw.find(b"\r") != len(raw) - 1:
+                            text_route(raw + b"\n")
+                            continue
+                        raw = raw[:-1]  # CRLF
+                    parts = raw.split(b",", KEY_COLUMN + 1)
+                    if len(parts) <= KEY_COLUMN:
+                        continue
+                    field = parts[KEY_COLUMN].strip()
+                    hits = byte_index.get(field)
+                    if hits is not None:
+                        emit(raw.decode('utf-8', errors='ignore') + "\n", hits)
+                    elif ODD_KEY_BYTES_RE.search(field):
+                        text_route(raw + b"\n")
+            if tail:
+                text_route(tail)
+    return routed
 
-        fts_path = inst / f"FTS-{safe}.txt"
+# Byte-range parallel filtering 
+#
+# A single very large log would otherwise pin one core while the rest of the
+# pool idles at the tail of the run. Such logs are cut into newline-aligned
+# byte ranges that are filtered and parsed in separate processes; the per-range
+# line and record lists are concatenated in range order, which is exactly the
+# serial result.
+
+SPLIT_READ_BLOCK = 8 << 20
+
+def split_byte_ranges(logpath: Path, parts):
+    size = logpath.stat().st_size
+    if parts <= 1 or size == 0:
+        return [(0, size)]
+    bounds = [0]
+    with open(logpath, 'rb') as f:
+        for i in range(1, parts):
+            pos = max(bounds[-1], size * i // parts)
+            f.seek(pos)
+            f.readline()  # advance to the start of the next line
+            pos = f.tell()
+            if pos >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def decode_log_text(data: bytes):
+    # Text-mode view of raw log bytes: utf-8 with errors='ignore' and universal
+    # newlines. data must end at a line boundary unless it is the end of the log.
+    text = data.decode('utf-8', errors='ignore').replace("\r\n", "\n").replace("\r", "\n")
+    lines = text.split("\n")
+    last = lines.pop()
+    lines = [line + "\n" for line in lines]
+    if last:
+        lines.append(last)
+    return lines
+
+def iter_log_lines(logpath: Path, start=0, end=None):
+    # Yields the lines of [start, end) exactly as `for line in open(logpath,
+    # encoding='utf-8', errors='ignore')` would.
+    with open(logpath, 'rb') as f:
+        if end is None:
+            end = os.fstat(f.fileno()).st_size
+        f.seek(start)
+        pos = start
+        carry = b""
+        while pos < end:
+            block = f.read(min(SPLIT_READ_BLOCK, end - pos))
+            if not block:
+                break
+            pos += len(block)
+            data = carry + block
+            cut = data.rfind(b"\n") + 1
+            carry = data[cut:]
+            yield from decode_log_text(data[:cut])
+        if carry:
+            yield from decode_log_text(carry)
+
+def scan_byte_range(logpath: Path, start, end, key_sets: dict, key_match=None):
+    route_line = build_key_router(key_sets, key_match)
+    routed = {t: ParsedRequests() for t in key_sets}
+    for line in iter_log_lines(logpath, start, end):
+        if not line.strip():
+            continue
+        hits = route_line(line)
+        if not hits:
+            continue
+        stripped = line.rstrip("\n")
+        try:
+            rec = parse_request_line(line)
+        except ValueError:
+            rec = None
+        for target in hits:
+            routed[target].add_line(stripped, rec)
+    return routed
+
+# Byte-range processes granted to the job running in this thread. Inside a
+# job pool the scheduler grants them (Runner._run_jobs) so that a job splits
+# its log only onto cores no other job is waiting for; elsewhere (serial
+# runs, --follow, --sweep) a job may use all --split-workers.
+_SPLIT = threading.local()
+
+def split_workers() -> int:
+    return getattr(_SPLIT, 'workers', SPLIT_WORKERS)
+
+def log_can_split(logpath: Path) -> bool:
+    return (SPLIT_LOG_BYTES > 0 and SPLIT_WORKERS > 1 and not is_compressed_log(logpath)
+            and logpath.stat().st_size >= SPLIT_LOG_BYTES and is_utf8_log(logpath))
+
+def should_split_log(logpath: Path) -> bool:
+    return split_workers() > 1 and log_can_split(logpath)
+
+def split_pool_context():
+    # Forking a process that runs other threads (a --backend thread worker)
+    # copies locks those threads may hold, so helpers start from a fresh
+    # interpreter there instead.
+    if threading.active_count() == 1 or os.name == "nt":
+        return None
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+def parallel_route_request_log(logpath: Path, key_sets: dict, key_match=None):
+    workers = split_workers()
+    parts = max(workers, min(4 * workers, logpath.stat().st_size // max(1, SPLIT_LOG_BYTES // 4)))
+    ranges = split_byte_ranges(logpath, parts)
+    routed = {t: ParsedRequests() for t in key_sets}
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), mp_context=split_pool_context(),
+                             initializer=init_worker, initargs=(cli_settings(),)) as exe:
+        futures = [exe.submit(scan_byte_range, logpath, start, end, key_sets, key_match) for start, end in ranges]
+        for fut in futures:  # merge in range order
+            for target, parsed in fut.result().items():
+                routed[target].extend(parsed)
+    return routed
+
+def process_instance(instance_folder: Path, is_downloader=False, key_match=None, input_dir=None):
+    keys = instance_manifest_keys(instance_folder)
+
+    instance_name = instance_folder.name
+    logpath = locate_requests_log(instance_name, instance_folder, input_dir)
+    if logpath is None:
+        print(f"[ERROR] no requests_{instance_name}.log found in {instance_folder} or upward")
+        return None
+    if STREAM_MEMORY_BYTES:
+        return stream_instance(instance_folder, logpath, keys, key_match, is_downloader)
+
+    with profile_stage("filter_parse"):
+        cache = open_parse_cache(logpath, key_match)
+        if cache is not None:
+            try:
+                parsed = cache.select(set(keys))
+            finally:
+                cache.close()
+        elif should_split_log(logpath):
+            parsed = parallel_route_request_log(logpath, {None: keys}, key_match)[None]
+        elif use_mmap_reader(logpath, key_match):
+            parsed = scan_log_mmap(logpath, {None: keys})[None]
+        else:
+            parsed = filter_request_log(logpath, build_key_matcher(keys, key_match))
+    if profiling():
+        profile_count("filter_parse", count_log_lines(logpath), len(parsed.lines))
+    return analyze_instance(instance_folder, parsed, is_downloader)
+
+def peer_line_repr(rec):
+    # The line the per-peer requests files hold for a record.
+    return ",".join([
+        rec.timestamp_raw,
+        rec.req_type,
+        rec.key,
+        rec.request_loc,
+        rec.htl,
+        rec.ip,
+        "", "",
+    ])
+
+# Per-peer artifact archive 
+#
+# Five small files per peer add up to hundreds of thousands of files per run,
+# and file creation dominates on network storage. With --peer-archive they are
+# stored as members of one peerFiles.zip per instance instead: uncompressed,
+# with the zip central directory as the offset index, so any peer's file is
+# read without scanning. Member bytes are exactly what the legacy files would
+# contain (platform newline and default encoding included), and
+# --export-peer-files writes them back out in the legacy layout. A job removes
+# whichever format it did not write, so switching --peer-archive on or off
+# never leaves stale per-peer output next to the current results.
+
+PEER_ARCHIVE = "peerFiles.zip"
+PEER_FILE_STEMS = ("keys", "requests", "requestTimestamps", "requestIntervals", "dataRequestsOnly")
+PEER_FILE_RE = re.compile(rf"(?:{'|'.join(PEER_FILE_STEMS)})(\d+)\.txt")
+
+class PeerArchiveWriter:
+    def __init__(self, path: Path):
+        self.path = path
+        self.tmp_path = path.with_name(path.name + ".tmp")
+        self.zf = zipfile.ZipFile(self.tmp_path, "w", zipfile.ZIP_STORED, allowZip64=True)
+        self.encoding = locale.getpreferredencoding(False)
+
+    @contextmanager
+    def open(self, name):
+        buf = io.StringIO()
+        yield buf
+        data = buf.getvalue().replace("\n", os.linesep).encode(self.encoding)
+        self.zf.writestr(name, data)
+
+    def close(self):
+        self.zf.close()
+        os.replace(self.tmp_path, self.path)
+
+def remove_stale_peer_files(inst_dir: Path, peer_count, archive=None):
+    # Called after a job wrote its per-peer output. With --peer-archive every
+    # loose per-peer file goes; otherwise peerFiles.zip goes, as do the files of
+    # peers past peer_count left by an earlier run that saw more peers.
+    # archive overrides --peer-archive (--follow always writes loose files).
+    archive = USE_PEER_ARCHIVE if archive is None else archive
+    if not archive:
+        (inst_dir / PEER_ARCHIVE).unlink(missing_ok=True)
+    stale = []
+    with os.scandir(inst_dir) as entries:
+        for entry in entries:
+            m = PEER_FILE_RE.fullmatch(entry.name)
+            if m and (archive or int(m.group(1)) > peer_count):
+                stale.append(entry.path)
+    for path in stale:
+        os.unlink(path)
+
+def export_peer_files(inst_dir: Path):
+    # Returns the number of files written, or None when peerFiles.zip does not
+    # belong to the instance's current results (its job record says the last
+    # run wrote legacy files, or there is no record) and nothing was written.
+    archive = inst_dir / PEER_ARCHIVE
+    if not archive.exists():
+        return 0
+    record = read_job_record(inst_dir)
+    if record is None or not record.get('constants', {}).get('USE_PEER_ARCHIVE'):
+        return None
+    with zipfile.ZipFile(archive) as zf:
+        names = zf.namelist()
+        for name in names:
+            (inst_dir / Path(name).name).write_bytes(zf.read(name))
+    return len(names)
+
+def write_peer_files(inst_dir: Path, idx, records, rows, archive=None):
+    # Writes the five per-peer audit files for the given rows of records (a
+    # ParsedRequests), into archive when given, otherwise as files in inst_dir.
+    # Returns (duplicates, inserts, data requests, HTL line, average interval).
+    open_out = archive.open if archive is not None else (lambda name: open(inst_dir / name, "w"))
+    keys_file = f"keys{idx}.txt"
+    requests_file = f"requests{idx}.txt"
+    data_only_file = f"dataRequestsOnly{idx}.txt"
+    insert_ids = {vid for vid, req_type in enumerate(records.table('req_type')) if 'insert' in req_type.lower()}
+    req_type_col = records.req_type
+    data_rows = [i for i in rows if req_type_col[i] not in insert_ids]
+    lines = [records.line_repr(i) for i in rows]
+
+    with open_out(keys_file) as f:
+        for line in lines:
+            try:
+                parsed = parse_request_line(line)
+            except Exception:
+                continue
+            f.write(parsed.key + "\n")
+
+    with open_out(requests_file) as f:
+        for line in lines:
+            f.write(line + "\n")
+
+    time_col = records.time_seconds
+    timestamps = sorted(t for t in (time_col[i] for i in rows) if t != NO_TIME)
+    avg_interval = write_peer_timing(open_out, idx, timestamps)
+
+    with open_out(data_only_file) as f:
+        for i, line in zip(rows, lines):
+            if req_type_col[i] not in insert_ids:
+                f.write(line + "\n")
+
+    key_col = records.key
+    key_freq = Counter(key_col[i] for i in data_rows)
+    htl_counts = {'16': 0, '17': 0, '18': 0}
+    htl_col = records.htl
+    htl_names = records.table('htl')
+    for htl_id, count in Counter(htl_col[i] for i in rows).items():
+        if htl_names[htl_id] in htl_counts:
+            htl_counts[htl_names[htl_id]] += count
+    return peer_file_metrics(key_freq, len(rows) - len(data_rows), len(data_rows), htl_counts, avg_interval)
+
+def write_peer_timing(open_out, idx, timestamps):
+    # Writes requestTimestamps<idx>.txt and requestIntervals<idx>.txt from the
+    # sorted timestamps; returns the average interval (nan below two requests).
+    with open_out(f"requestTimestamps{idx}.txt") as f:
+        for ts in timestamps:
+            f.write(f"{ts}\n")
+
+    intervals = []
+    for i in range(1, len(timestamps)):
+        intervals.append(timestamps[i] - timestamps[i-1])
+    with open_out(f"requestIntervals{idx}.txt") as f:
+        for iv in intervals:
+            f.write(f"{iv}\n")
+    if intervals:
+        return sum(intervals)/len(intervals)
+    return float('nan')
+
+def peer_file_metrics(key_freq, insert_count, data_requests_num, htl_counts, avg_interval):
+    # (duplicates, inserts, data requests, HTL line, average interval), as write_peer_files returns.
+    duplicates = sum(c*(c-1)//2 for c in key_freq.values())
+    return peer_metrics(duplicates, insert_count, data_requests_num, htl_counts, avg_interval)
+
+def peer_metrics(duplicates, insert_count, data_requests_num, htl_counts, avg_interval):
+    htl_line = f"HTL 18: {htl_counts.get('18',0)}, HTL 17: {htl_counts.get('17',0)}, HTL 16: {htl_counts.get('16',0)}"
+    return str(duplicates), str(insert_count), str(data_requests_num), htl_line, avg_interval
+
+def write_metric_files(inst_dir: Path, avg_intervals, duplicates_list, inserts_list, data_requests_num_list, htl_lines):
+    with open(inst_dir / "avgIntervals.txt", "w") as f:
+        for v in avg_intervals:
+            if isinstance(v, float) and math.isnan(v):
+                f.write("nan\n")
+            else:
+                f.write(f"{v}\n")
+    with open(inst_dir / "duplicates.txt", "w") as f:
+        for l in duplicates_list:
+            f.write(l + "\n")
+    with open(inst_dir / "inserts.txt", "w") as f:
+        for l in inserts_list:
+            f.write(l + "\n")
+    with open(inst_dir / "dataRequestsNum.txt", "w") as f:
+        for l in data_requests_num_list:
+            f.write(l + "\n")
+    with open(inst_dir / "HTL.txt", "w") as f:
+        for l in htl_lines:
+            f.write(l + "\n")
+
+def read_total_blocks(inst_dir: Path):
+    return count_manifest_blocks(inst_dir / "downloadKeys.txt")
+
+def count_manifest_blocks(path: Path):
+    with open(path, "r") as f:
+        blocks = [l for l in (x.rstrip("\n") for x in f) if l != ""]
+    return len(blocks)
+
+def peer_rows(peer_order, duplicates_list, inserts_list, data_requests_num_list):
+    # (peer, requests, inserts, duplicates, adjusted requests) per peer, in report order.
+    rows = []
+    for idx, peer in enumerate(peer_order):
+        # Match Excel behavior: "requests" is unique non-insert requests (Total Unique Requests)
+        requests = int(data_requests_num_list[idx]) if idx < len(data_requests_num_list) and data_requests_num_list[idx].isdigit() else 0
+        inserts_cnt = int(inserts_list[idx]) if idx < len(inserts_list) and inserts_list[idx].isdigit() else 0
+        duplicates_cnt = int(duplicates_list[idx]) if idx < len(duplicates_list) and duplicates_list[idx].isdigit() else 0
+
+        adj_requests = requests - inserts_cnt - 3 * duplicates_cnt
+        if adj_requests < 0:
+            adj_requests = 0
+        rows.append((peer, requests, inserts_cnt, duplicates_cnt, adj_requests))
+    return rows
+
+def build_probability_report(peer_order, duplicates_list, inserts_list, data_requests_num_list,
+                             avg_peers, total_blocks, unique_peers_count, is_downloader):
+    adj_requests_sent = sum(int(x) for x in data_requests_num_list if x.isdigit())
+    T = int(0.8 * total_blocks)
+
+    report_lines = []
+    decisions = []
+    num_runs = 0
+    false_positive = 0
+    true_positive = 0
+
+    rows = peer_rows(peer_order, duplicates_list, inserts_list, data_requests_num_list)
+    run_adj = [row[4] for row in rows if row[1] >= RUN_MIN_REQUESTS]
+    probs = iter(calc_even_share_probabilities(avg_peers, T, run_adj, use_numpy=False))
+
+    for peer, requests, inserts_cnt, duplicates_cnt, adj_requests in rows:
+        if requests >= RUN_MIN_REQUESTS:
+            num_runs += 1
+            prob = next(probs)
+            passes = prob > PROB_THRESHOLD
+            if passes:
+                if is_downloader:
+                    true_positive += 1
+                else:
+                    false_positive += 1
+            decision = "Yes" if passes else "No"
+            report_lines.append(
+                f"{peer} had a run. Requests: {requests}, Duplicates: {duplicates_cnt}, Inserts: {inserts_cnt}, "
+                f"Adj. Requests: {adj_requests}, Passes Levine: {decision}, Levine Downloader probability: {prob:.6f}"
+            )
+            decisions.append((True, passes, prob, report_lines[-1]))
+        else:
+            report_lines.append(
+                f"{peer} did not see a run. Requests: {requests}, Duplicates: {duplicates_cnt}, Inserts: {inserts_cnt}, "
+                f"Adj. Requests: {adj_requests}"
+            )
+            decisions.append((False, False, None, report_lines[-1]))
+
+    report_lines.append("")
+    report_lines.append(f"Average Peers: {avg_peers}")
+    report_lines.append(f"Number of Unique Peers Requests were Sent To: {unique_peers_count}")
+    if unique_peers_count > 0:
+        report_lines.append(f"Percent of Runs out of Peers Requests were Sent To: {100.0 * (num_runs / unique_peers_count):.2f} %")
+    else:
+        report_lines.append("Percent of Runs out of Peers Requests were Sent To:  0 %")
+    report_lines.append(f"Number of Runs: {num_runs}")
+    if not is_downloader:
+        report_lines.append(f"Number of False Positive Runs: {false_positive}")
+        if num_runs > 0:
+            report_lines.append(f"Local Rate of False Positive Runs: {100.0 * (false_positive / num_runs):.2f} %")
+        else:
+            report_lines.append("Local Rate of False Positive Runs: Not Applicable")
+    else:
+        report_lines.append(f"Number of True Positive Runs: {true_positive}")
+        if num_runs > 0:
+            report_lines.append(f"Local Rate of True Positive Runs: {100.0 * (true_positive / num_runs):.2f} %")
+        else:
+            report_lines.append("Local Rate of True Positive Runs: Not Applicable")
+        report_lines.append(f"Total Number of Blocks for File: {total_blocks}")
+        report_lines.append(f"Unique Requests sent: {adj_requests_sent}")
+        if total_blocks > 0:
+            report_lines.append(f"Percent of File Requested: {100.0 * adj_requests_sent / total_blocks:.2f} %")
+        else:
+            report_lines.append("Percent of File Requested: 0 %")
+    # decisions: (had run, passes, probability, report line) per peer, in report order.
+    return report_lines, decisions
+
+def write_probability_report(inst_dir: Path, report_lines):
+    with open(inst_dir / "probabilityReport.txt", "w") as f:
+        for l in report_lines:
+            f.write(l + "\n")
+
+def analyze_instance(inst_dir: Path, parsed: ParsedRequests, is_downloader=False):
+    # Writes every per-instance artifact into inst_dir and returns instance_results().
+    with profile_stage("write_instance_files"):
+        with open(inst_dir / "downloadRequests.txt", "w") as f:
+            for l in parsed.lines:
+                f.write(l + "\n")
+        with open(inst_dir / "requestLocs.txt", "w") as f:
+            for loc in parsed.request_locs():
+                f.write(loc + "\n")
+        num_peers_vals = parsed.num_peers
+        avg_peers = sum(num_peers_vals) / len(num_peers_vals) if num_peers_vals else 0.0
+        with open(inst_dir / "avgPeers.txt", "w") as f:
+            f.write(f"{avg_peers}\n")
+        ips = parsed.table('ip')
+        ip_counts = Counter(parsed.ip)
+        with open(inst_dir / "sentToPeer.txt", "w") as f:
+            for ip_id, cnt in ip_counts.items():
+                f.write(f"{ips[ip_id]}   was sent {cnt} requests\n")
+        if is_downloader:
+            write_dest_index(inst_dir, parsed)
+
+    with profile_stage("group_peers"):
+        per_peer = parsed.peer_rows()
+
+    peer_order = [ips[ip_id] for ip_id in per_peer]
+
+    with profile_stage("write_peer_files"):
+        archive = PeerArchiveWriter(inst_dir / PEER_ARCHIVE) if USE_PEER_ARCHIVE else None
+        peer_metrics = [write_peer_files(inst_dir, idx, parsed, rows, archive)
+                        for idx, rows in enumerate(per_peer.values(), start=1)]
+        if archive is not None:
+            archive.close()
+        remove_stale_peer_files(inst_dir, len(per_peer))
+    return score_instance(inst_dir, peer_order, peer_metrics, avg_peers, len(per_peer), is_downloader, parsed.lines,
+                          records=parsed)
+
+def score_instance(inst_dir: Path, peer_order, peer_metrics, avg_peers, unique_peers, is_downloader, request_lines,
+                   extract_batches=None, records=None):
+    # Second half of every job, shared by the in-memory and streaming paths:
+    # metric files, the Levine decisions and reports, and FTS extraction from
+    # request_lines (the instance's filtered lines, in log order).
+    # peer_metrics holds write_peer_files() results in peer_order.
+    # With extract_batches (peers -> batch number), extraction is left to
+    # store_instance_results, one batch and one pass over request_lines() at a time.
+    # records, the instance's ParsedRequests when it is in memory, supplies the
+    # keys relayer IP derivation needs.
+    duplicates_list = [m[0] for m in peer_metrics]
+    inserts_list = [m[1] for m in peer_metrics]
+    data_requests_num_list = [m[2] for m in peer_metrics]
+    htl_lines = [m[3] for m in peer_metrics]
+    avg_intervals = [m[4] for m in peer_metrics]
+
+    with profile_stage("levine"):
+        total_blocks = instance_total_blocks(inst_dir)
+        report_lines, decisions = build_probability_report(
+            peer_order, duplicates_list, inserts_list, data_requests_num_list,
+            avg_peers, total_blocks, unique_peers, is_downloader,
+        )
+    with profile_stage("write_reports"):
+        write_metric_files(inst_dir, avg_intervals, duplicates_list, inserts_list, data_requests_num_list, htl_lines)
+        write_probability_report(inst_dir, report_lines)
+        write_peer_stats(inst_dir, peer_order, duplicates_list, inserts_list, data_requests_num_list,
+                         avg_peers, total_blocks, is_downloader)
+
+    results = instance_results(
+        peer_order, duplicates_list, inserts_list, data_requests_num_list, avg_intervals,
+        report_lines, decisions, avg_peers, total_blocks, unique_peers, is_downloader,
+    )
+    if extract_batches is not None:
+        results['fts_batches'] = extract_in_batches(inst_dir, results, request_lines, extract_batches)
+        return results
+    with profile_stage("extract"):
+        results['fts'] = extract_peer_requests(inst_dir, results, request_lines, records=records)
+    return results
+
+def extract_in_batches(inst_dir: Path, results: dict, request_lines, extract_batches):
+    # Yields the FTS rows of one batch of passing peers at a time.
+    batches = defaultdict(set)
+    for peer in results['passing']:
+        batches[extract_batches(peer)].add(peer)
+    subject_ip = None
+    for batch in sorted(batches):
+        with profile_stage("extract"):
+            if subject_ip is None:
+                with profile_stage("derive_relayer_ip"):
+                    subject_ip = derive_relayer_ip_from_overlap(inst_dir)
+            fts = extract_peer_requests(inst_dir, results, request_lines(), only_peers=batches[batch],
+                                        subject_ip=subject_ip)
+        yield fts
+
+# Streaming mode 
+#
+# With --stream a job never holds the matched lines. Filtered lines and
+# request locations go straight to downloadRequests.txt and requestLocs.txt,
+# and each parsed record is kept only as its short per-peer requests line,
+# tagged with the peer's index. Once those buffered lines reach the memory
+# budget they are sorted by peer and spilled to a run file under
+# .levine_spill/; at the end the runs are merged peer by peer (arrival order
+# within a peer is kept), so only one peer's timestamps and key counts are in
+# memory while its files are written. FTS extraction re-reads the passing
+# peers' lines from downloadRequests.txt. Outputs are identical to the
+# in-memory path. Streaming always reads the log as text; the parse cache,
+# byte ranges and the mmap reader hold their matches in memory and are not used.
+
+STREAM_MEMORY_BYTES = None  # per-job budget for buffered records; None = in-memory path
+STREAM_RECORD_OVERHEAD = 120  # bytes a buffered (peer, line) tuple costs beyond the line itself
+STREAM_EXTRACT_BYTES_PER_LINE = 1000  # a matched line plus its FTS detail row during extraction
+SPILL_DIR = ".levine_spill"
+
+class StreamingInstance:
+    # Consumes one instance's matched lines in log order (feed) and writes its
+    # artifacts within a memory budget (finish).
+
+    def __init__(self, inst_dir: Path, memory_budget: int):
+        self.inst_dir = inst_dir
+        self.memory_budget = max(1, int(memory_budget))
+        self.requests_out = open(inst_dir / "downloadRequests.txt", "w")
+        self.locs_out = open(inst_dir / "requestLocs.txt", "w")
+        self.peer_index = {}
+        self.sent = []
+        self.peer_sum = 0.0
+        self.peer_n = 0
+        self.lines = 0
+        self.buffer = []
+        self.buffered = 0
+        self.runs = []
+
+    def feed(self, line, rec):
+        self.requests_out.write(line + "\n")
+        self.lines += 1
+        if rec is None:
+            return
+        self.locs_out.write(rec.request_loc + "\n")
+        self.peer_sum += rec.num_peers
+        self.peer_n += 1
+        idx = self.peer_index.get(rec.ip)
+        if idx is None:
+            idx = self.peer_index[rec.ip] = len(self.peer_index) + 1
+            self.sent.append(0)
+        self.sent[idx - 1] += 1
+        line_repr = peer_line_repr(rec)
+        self.buffer.append((idx, line_repr))
+        self.buffered += len(line_repr) + STREAM_RECORD_OVERHEAD
+        if self.buffered >= self.memory_budget:
+            self.spill()
+
+    def spill(self):
+        spill_dir = self.inst_dir / SPILL_DIR
+        spill_dir.mkdir(exist_ok=True)
+        path = spill_dir / f"run{len(self.runs)}.txt"
+        self.buffer.sort(key=itemgetter(0))  # stable: arrival order within a peer survives
+        with open(path, "w", encoding="utf-8", newline="\n") as f:
+            for idx, line_repr in self.buffer:
+                f.write(f"{idx}\t{line_repr}\n")
+        self.runs.append(path)
+        self.buffer = []
+        self.buffered = 0
+
+    @staticmethod
+    def read_run(path: Path):
+        with open(path, "r", encoding="utf-8", newline="\n") as f:
+            for row in f:
+                idx, line_repr = row[:-1].split("\t", 1)
+                yield int(idx), line_repr
+
+    def peer_records(self):
+        # (peer index, requests line) for every record, by peer, then in arrival order.
+        self.buffer.sort(key=itemgetter(0))
+        return heapq.merge(*(self.read_run(path) for path in self.runs), self.buffer, key=itemgetter(0))
+
+    def close(self):
+        self.requests_out.close()
+        self.locs_out.close()
+        shutil.rmtree(self.inst_dir / SPILL_DIR, ignore_errors=True)
+
+    def finish(self, is_downloader=False):
+        # Writes the remaining artifacts and returns instance_results().
+        self.requests_out.close()
+        self.locs_out.close()
+        inst_dir = self.inst_dir
+        with profile_stage("write_instance_files"):
+            avg_peers = self.peer_sum / self.peer_n if self.peer_n else 0.0
+            with open(inst_dir / "avgPeers.txt", "w") as f:
+                f.write(f"{avg_peers}\n")
+            with open(inst_dir / "sentToPeer.txt", "w") as f:
+                for ip, cnt in zip(self.peer_index, self.sent):
+                    f.write(f"{ip}   was sent {cnt} requests\n")
+
+        with profile_stage("write_peer_files"):
+            archive = PeerArchiveWriter(inst_dir / PEER_ARCHIVE) if USE_PEER_ARCHIVE else None
+            peer_metrics = [
+                write_streamed_peer_files(inst_dir, idx, (line_repr for _, line_repr in records), archive)
+                for idx, records in groupby(self.peer_records(), key=itemgetter(0))
+            ]
+            if archive is not None:
+                archive.close()
+            remove_stale_peer_files(inst_dir, len(self.peer_index))
+            self.buffer = []
+        if self.runs:
+            print(f"[STREAM] {inst_dir.parent.name}/{inst_dir.name}: merged {len(self.runs)} spill runs")
+        return score_instance(inst_dir, list(self.peer_index), peer_metrics, avg_peers, len(self.peer_index),
+                              is_downloader, lambda: read_request_lines(inst_dir), self.extract_batches())
+
+    def extract_batches(self):
+        # Peer -> extraction batch: consecutive peers whose matched lines (and
+        # their FTS rows) fit the memory budget together.
+        batch_of = {}
+        batch = used = 0
+        for ip, cnt in zip(self.peer_index, self.sent):
+            cost = cnt * STREAM_EXTRACT_BYTES_PER_LINE
+            if used and used + cost > self.memory_budget:
+                batch += 1
+                used = 0
+            batch_of[ip] = batch
+            used += cost
+        return lambda peer: batch_of.get(peer, 0)
+
+def read_request_lines(inst_dir: Path):
+    with open(inst_dir / "downloadRequests.txt", "r") as f:
+        for line in f:
+            yield line.rstrip("\n")
+
+def write_streamed_peer_files(inst_dir: Path, idx, line_reprs, archive=None):
+    # write_peer_files() for a peer whose requests lines (peer_line_repr) arrive
+    # one at a time; same files, same return value.
+    open_out = archive.open if archive is not None else (lambda name: open(inst_dir / name, "w"))
+    key_freq = Counter()
+    insert_count = 0
+    data_requests_num = 0
+    htl_counts = {'16': 0, '17': 0, '18': 0}
+    timestamps = array('q')
+    with open_out(f"keys{idx}.txt") as f_keys, open_out(f"requests{idx}.txt") as f_req, \
+            open_out(f"dataRequestsOnly{idx}.txt") as f_data:
+        for line in line_reprs:
+            try:
+                f_keys.write(parse_request_line(line).key + "\n")
+            except Exception:
+                pass
+            f_req.write(line + "\n")
+            timestamp, req_type, key, _, htl = line.split(',', 5)[:5]
+            if 'insert' in req_type.lower():
+                insert_count += 1
+            else:
+                f_data.write(line + "\n")
+                data_requests_num += 1
+                key_freq[key] += 1
+            if htl in htl_counts:
+                htl_counts[htl] += 1
+            seconds = timestamp_epoch_seconds(timestamp)
+            if seconds is not None:
+                timestamps.append(seconds)
+    avg_interval = write_peer_timing(open_out, idx, sorted(timestamps))
+    return peer_file_metrics(key_freq, insert_count, data_requests_num, htl_counts, avg_interval)
+
+def stream_instance(inst_dir: Path, logpath: Path, keys, key_match=None, is_downloader=False):
+    stream = StreamingInstance(inst_dir, STREAM_MEMORY_BYTES)
+    try:
+        with profile_stage("filter_parse"):
+            for _, line, rec in iter_routed_log(logpath, build_key_matcher(keys, key_match)):
+                stream.feed(line, rec)
+        if profiling():
+            profile_count("filter_parse", count_log_lines(logpath), stream.lines)
+        return stream.finish(is_downloader)
+    finally:
+        stream.close()
+
+def stream_instance_files(inst_dirs, fingerprints, logpath: Path, key_sets, key_match=None, is_downloader=False):
+    # Single-pass streaming: one read of logpath feeds a stream per manifest,
+    # which share the job's memory budget.
+    streams = {m: StreamingInstance(inst_dirs[m], STREAM_MEMORY_BYTES / len(key_sets)) for m in key_sets}
+    try:
+        with profile_stage("filter_parse"):
+            for hits, line, rec in iter_routed_log(logpath, build_key_router(key_sets, key_match)):
+                for m in hits:
+                    streams[m].feed(line, rec)
+        if profiling():
+            profile_count("filter_parse", count_log_lines(logpath), sum(st.lines for st in streams.values()))
+        for m, stream in streams.items():
+            results = stream.finish(is_downloader)
+            stream.close()
+            with profile_stage("store_results"):
+                store_instance_results(inst_dirs[m], results, fingerprints[m])
+            write_job_record(inst_dirs[m], fingerprints[m])
+    finally:
+        for stream in streams.values():
+            stream.close()
+
+# Post-processing helpers 
+
+def extract_peer_requests(inst: Path, results: dict, request_lines, only_peers=None, subject_ip=None, records=None):
+    # Writes requests_<ipport>.txt and FTS-<ipport>.txt for the passing peers in
+    # results (see instance_results), taking their lines from the instance's
+    # filtered request lines. Returns the FTS detail rows as {ip_port: [fields, ...]}.
+    # records (ParsedRequests, optional) gives relayer IP derivation its keys.
+    relayer_name = inst.name
+    fts = {}
+    ip_ports = results['passing']
+    if only_peers is not None:
+        ip_ports = [ip_port for ip_port in ip_ports if ip_port in only_peers]
+    if not ip_ports:
+        return fts
+
+    overrides_all = instance_overrides(inst)
+
+    total_blocks = ""
+    data_blocks = ""
+    if results['is_downloader']:
+        # Only the downloader's report carries the file totals shown in every detail row.
+        total_blocks = str(results['total_blocks'])
+        data_blocks = str(results['unique_requests'])
+
+    manifest_key = instance_manifest_key(inst)
+
+    # Group once by the IP column, the same attribution analyze_instance uses.
+    # (A substring test would also give 1.2.3.4:1 the lines of 1.2.3.4:10.)
+    wanted = set(ip_ports)
+    by_peer = defaultdict(list)
+    scanned = 0
+    for l in request_lines:
+        scanned += 1
+        parts = l.split(',')
+        if len(parts) >= 9 and parts[5] in wanted:
+            by_peer[parts[5]].append(l)
+    profile_count("extract", scanned, sum(len(matches) for matches in by_peer.values()))
+
+    for ip_port in ip_ports:
+        matches = by_peer.get(ip_port)
+        if not matches:
+            continue
+        safe = ip_port.replace('.', '_').replace(':', '_')
+        out_req = inst / f"requests_{safe}.txt"
+        with out_req.open('w', encoding='utf-8') as f:
+            for l in matches:
+                f.write(l + "\n")
+
+        detail_fields = [fields for fields in (fts_detail_fields(line, ip_port, total_blocks, data_blocks)
+                                               for line in matches) if fields is not None]
+        detail_rows = ["\t".join(fields) for fields in detail_fields]
+        fts[ip_port] = detail_fields
+
+        run_start_excel = detail_fields[0][0] if detail_fields else ""
+        run_end_excel = detail_fields[-1][0] if detail_fields else ""
+
+        overrides = overrides_all.get(fts_override_name(relayer_name, ip_port), {})
+
+        # The same for every peer of this instance; derived on first use unless given.
+        if subject_ip is None:
+            with profile_stage("derive_relayer_ip"):
+                subject_ip = derive_relayer_ip_from_overlap(
+                    inst, records.forwarded_keys() if records is not None else None)
+
+        fts_path = inst / f"FTS-{safe}.txt"
         write_fts_block_final(
             out_path=fts_path,
             relayer_name=relayer_name,
@@ -643,213 +2494,1392 @@ def extract_peer_requests_for_instance(is_downloader_flag):
             manifest_key=manifest_key,
             subject_ip=subject_ip or overrides.get("IP Address", "")
         )
+    return fts
+
+def fts_detail_fields(line, ip_port, total_blocks="", data_blocks=""):
+    # The FTS detail row of one of a passing peer's request lines, or None for a short line.
+    parts = line.strip().split(',')
+    if len(parts) < 9:
+        return None
+    excel_date = iso_to_excel(parts[0])
+    port = ip_port.split(':', 1)[1]
+    req_type = "R" if parts[1].strip() == "FNPCHKDataRequest" else ("I" if parts[1].strip() == "FNPInsertRequest" else "?")
+    htl = parts[4].strip()
+    peers = parts[8].strip()
+    le_ip = escape_for_excel(parts[5].strip())
+    split_key = escape_for_excel(parts[2].strip())
+    return [
+        excel_date,
+        port,
+        req_type,
+        htl,
+        total_blocks,
+        data_blocks,
+        peers,
+        le_ip,
+        split_key
+    ]
+
+def fts_override_name(relayer_name, ip_port):
+    # The overrides.json entry of one FTS block.
+    return f"{relayer_name}_{ip_port.replace(':', '_')}"
 
-def generate_false_positive_index(file_numbers):
-    base = Path.cwd()
+def report_relayers(instances, present=()):
+    # Relayers in report order: instancesNames.txt order, or when no list is
+    # given, the relayers found in the results in natural order (Relayer2 before Relayer10).
+    if instances is None:
+        return sorted((inst for inst in present if inst != "downloader"),
+                      key=lambda name: [int(p) if p.isdigit() else p for p in re.split(r'(\d+)', name)])
+    return [inst for inst in instances if inst != "downloader"]
+
+def generate_false_positive_index(file_numbers, base=None, instances=None):
+    base = Path(base) if base is not None else Path.cwd()
+    out_path = base / "false_positives_report.txt"
+    inputs = {
+        'code': code_version(),
+        'files': [[str(num), sha256_file(base / f"File{num}" / AGGREGATE_RECORD)] for num in file_numbers],
+        'instances': instances,
+    }
+    if aggregate_is_current(base, inputs, [out_path.name]):
+        return
+    write_false_positive_index(base, file_numbers, instances)
+    write_aggregate_record(base, inputs)
+
+def write_false_positive_index(base: Path, file_numbers, instances=None):
     out_path = base / "false_positives_report.txt"
-    with out_path.open("w", encoding="utf-8") as outf:
+    with results_db(base) as db, out_path.open("w", encoding="utf-8") as outf:
         for num in file_numbers:
             folder = base / f"File{num}"
             if not folder.exists():
                 continue
             outf.write(f"File{num}:\n")
-            for i in range(1, 36):  # hard coded for our 36-node setup, will be updated in future to determine upper range by the number of entries in instanceNames.txt.
-                relayer_dir = folder / f"Relayer{i}"
-                prob_file = relayer_dir / "probabilityReport.txt"
-                if not prob_file.exists():
-                    continue
-                for line in read_and_split(prob_file):
-                    m = FP_LINE_RE.search(line)
-                    if m:
-                        num_fp = int(m.group(1))
-                        if num_fp > 0:
-                            outf.write(f"  Relayer{i}: Number of False Positive Runs: {num_fp}\n")
-                        break
-            full_download = folder / "fullDownloadReport.txt"
-            if full_download.exists():
-                outf.write("\n")
-                for line in read_and_split(full_download):
-                    outf.write(f"  {line}\n")
+            rows = db.execute("SELECT instance, report, false_positives FROM instances WHERE file = ?", (num,)).fetchall()
+            reports = {inst: report for inst, report, _ in rows}
+            false_positives = {inst: num_fp for inst, _, num_fp in rows}
+            relayers = report_relayers(instances, reports)
+            for name in relayers:
+                num_fp = false_positives.get(name)
+                if num_fp:
+                    outf.write(f"  {name}: Number of False Positive Runs: {num_fp}\n")
+            outf.write("\n")
+            for line in full_download_report_lines(num, reports, relayers):
+                outf.write(f"  {line}\n")
             outf.write("\n")
 
-def generate_per_file_reports(file_numbers):
-    base = Path.cwd()
-    for num in file_numbers:
-        folder = base / f"File{num}"
-        if not folder.exists():
+PER_FILE_REPORTS = [
+    "fullDownloadReport.txt", "duplicatesReport.txt", "insertsReport.txt",
+    "avgTimingReport.txt", "Requests.txt", "Metadata.txt",
+]
+
+def aggregate_file(folder: Path, num, instances=None):
+    # Rebuilds one File<N> folder's reports unless they are current; returns
+    # whether it wrote them. File<N> folders are independent, so these run in parallel.
+    inputs = aggregate_inputs(folder, instances)
+    remove_stale_summary_files(folder, num)
+    if aggregate_is_current(folder, inputs, PER_FILE_REPORTS + summary_outputs(num)):
+        return False
+    write_per_file_reports(folder, num, instances)
+    write_aggregate_record(folder, inputs)
+    return True
+
+def generate_per_file_reports(file_numbers, base=None, instances=None, backend="serial", workers=None):
+    base = Path(base) if base is not None else Path.cwd()
+    folders = [(base / f"File{num}", num) for num in file_numbers if (base / f"File{num}").exists()]
+    if backend == "serial" or len(folders) < 2:
+        written = [aggregate_file(folder, num, instances) for folder, num in folders]
+    else:
+        pool = ThreadPoolExecutor if backend == "thread" else ProcessPoolExecutor
+        max_workers = min(len(folders), workers or max(1, (os.cpu_count() or 1) - 1))
+        with pool(max_workers=max_workers, initializer=init_worker, initargs=(cli_settings(),)) as exe:
+            written = list(exe.map(aggregate_file, *zip(*folders), [instances] * len(folders)))
+    for (_, num), was_written in zip(folders, written):
+        if not was_written:
+            print(f"[SKIP] File{num} aggregate reports are current")
+
+def full_download_report_lines(num, reports, relayers):
+    # reports: instance -> probability report text.
+    lines = [f"File{num} Summary:"]
+    if "downloader" in reports:
+        lines.append("Downloader:")
+        lines.extend(f"  {line}" for line in reports["downloader"].splitlines())
+    for name in relayers:
+        report = reports.get(name)
+        if report is None:
+            continue
+        lines.append("")
+        lines.append(f"{name}:")
+        lines.extend(f"  {line}" for line in report.splitlines())
+    return lines
+
+def write_per_file_reports(folder: Path, num, instances=None):
+    with results_db(folder.parent) as db:
+        write_file_reports_from_db(db, folder, num, instances)
+
+def write_file_reports_from_db(db, folder: Path, num, instances=None):
+    # One query per table for the file, then one pass over the relayers that
+    # feeds every report.
+    reports = {}
+    downloader_meta = None
+    for inst, report, total_blocks, unique_requests in db.execute(
+            "SELECT instance, report, total_blocks, unique_requests FROM instances WHERE file = ?", (num,)):
+        reports[inst] = report
+        if inst == "downloader":
+            downloader_meta = (total_blocks, unique_requests)
+    relayers = report_relayers(instances, reports)
+
+    metrics = defaultdict(list)
+    first_pass = {}
+    for inst, duplicates_cnt, inserts_cnt, avg_interval, passes, line in db.execute(
+            "SELECT instance, duplicates, inserts, avg_interval, passes, report_line FROM peers"
+            " WHERE file = ? ORDER BY instance, idx", (num,)):
+        metrics[inst].append((duplicates_cnt, inserts_cnt, "nan" if avg_interval is None else f"{avg_interval}"))
+        if passes:
+            first_pass.setdefault(inst, line)
+
+    dup_lines = [f"Duplicates report for File{num}"]
+    ins_lines = [f"Inserts report for File{num}"]
+    avg_lines = [f"Average timing (intervals) for File{num}"]
+    req_lines = [f"Relayers with pass runs for File{num}"]
+    for name in relayers:
+        if name in reports:
+            peer_metrics = metrics[name]
+            dup_lines.append(f"{name}: {' '.join(str(m[0]) for m in peer_metrics)}")
+            ins_lines.append(f"{name}: {' '.join(str(m[1]) for m in peer_metrics)}")
+            avg_lines.append(f"{name}: {' '.join(m[2] for m in peer_metrics)}")
+        if name in first_pass:
+            req_lines.append(f"{name}: {first_pass[name]}")
+
+    meta_lines = [f"File{num} Metadata"]
+    if downloader_meta is not None:
+        meta_lines.append(f"Total Number of Blocks for File: {downloader_meta[0]}")
+        meta_lines.append(f"Unique Requests sent: {downloader_meta[1]}")
+
+    outputs = {
+        "fullDownloadReport.txt": full_download_report_lines(num, reports, relayers),
+        "duplicatesReport.txt": dup_lines,
+        "insertsReport.txt": ins_lines,
+        "avgTimingReport.txt": avg_lines,
+        "Requests.txt": req_lines,
+        "Metadata.txt": meta_lines,
+    }
+    for name, lines in outputs.items():
+        with (folder / name).open("w", encoding="utf-8") as f:
+            for line in lines:
+                f.write(f"{line}\n")
+    write_summary(db, folder, num, relayers)
+
+# File<N>_summary.csv holds every FTS detail row of the file, one per line,
+# tagged with its relayer. Rows are streamed from fts_rows straight into
+# csv.writer (quoted where a field needs it) in batches, so a file with
+# millions of detail rows is never held in memory. With --columnar the same
+# rows also go to File<N>_summary.parquet or .arrow (zstd-compressed, typed
+# columns) for loading into analysis tools without parsing text.
+
+SUMMARY_COLUMNS = [
+    "ExcelDate", "Port", "Type", "HTL", "TotalBlocks", "DataBlocks",
+    "Peers", "LE_IP", "SplitKey", "SourceRelayer", "IPPortRun",
+]
+SUMMARY_NUMERIC = {'ExcelDate': float, 'Port': int, 'HTL': int, 'TotalBlocks': int, 'DataBlocks': int, 'Peers': int}
+SUMMARY_BATCH_ROWS = 65536
+SUMMARY_FORMATS = ("parquet", "arrow")
+
+def summary_outputs(num):
+    outputs = [f"File{num}_summary.csv"]
+    if COLUMNAR_FORMAT:
+        outputs.append(f"File{num}_summary.{COLUMNAR_FORMAT}")
+    return outputs
+
+def remove_stale_summary_files(folder: Path, num):
+    # Every run removes the columnar summaries it does not write: both without
+    # --columnar, the other format with it.
+    for fmt in SUMMARY_FORMATS:
+        if fmt != COLUMNAR_FORMAT:
+            (folder / f"File{num}_summary.{fmt}").unlink(missing_ok=True)
+
+def summary_number(value, cast):
+    # Empty or malformed cells are nulls in the columnar file; the CSV keeps the text.
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+class SummaryWriter:
+    def __init__(self, folder: Path, num):
+        self.columnar = None
+        self.pending = []
+        if COLUMNAR_FORMAT:
+            if pyarrow is None:
+                raise RuntimeError("--columnar requires the pyarrow package")
+            self.schema = pyarrow.schema([
+                (name, pyarrow.float64() if SUMMARY_NUMERIC.get(name) is float else
+                 pyarrow.int64() if name in SUMMARY_NUMERIC else pyarrow.string())
+                for name in SUMMARY_COLUMNS
+            ])
+            path = str(folder / f"File{num}_summary.{COLUMNAR_FORMAT}")
+            if COLUMNAR_FORMAT == "parquet":
+                self.columnar = pyarrow.parquet.ParquetWriter(path, self.schema, compression="zstd")
+            else:
+                self.columnar = pyarrow.ipc.new_file(
+                    path, self.schema, options=pyarrow.ipc.IpcWriteOptions(compression="zstd"))
+        self.csv_file = (folder / f"File{num}_summary.csv").open("w", encoding="utf-8", newline="")
+        self.csv = csv.writer(self.csv_file, lineterminator="\n")
+        self.csv.writerow(SUMMARY_COLUMNS)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, rows):
+        # rows: sequences in SUMMARY_COLUMNS order. Fields come from comma-split
+        # log lines and rarely need quoting, so a batch is joined directly
+        # unless a field holds a delimiter, quote or line break.
+        try:
+            text = "".join([",".join(row) + "\n" for row in rows])
+        except TypeError:
+            text = None
+        if (text is not None and text.count(",") == (len(SUMMARY_COLUMNS) - 1) * len(rows)
+                and text.count("\n") == len(rows) and '"' not in text and "\r" not in text):
+            self.csv_file.write(text)
+        else:
+            self.csv.writerows(rows)
+        if self.columnar is not None:
+            self.pending.extend(rows)
+            if len(self.pending) >= SUMMARY_BATCH_ROWS:
+                self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        columns = zip(*self.pending)
+        arrays = []
+        for name, values in zip(SUMMARY_COLUMNS, columns):
+            cast = SUMMARY_NUMERIC.get(name)
+            if cast is not None:
+                values = [summary_number(v, cast) for v in values]
+            arrays.append(pyarrow.array(values, type=self.schema.field(name).type))
+        self.columnar.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema))
+        self.pending = []
+
+    def close(self):
+        self.csv_file.close()
+        if self.columnar is not None:
+            try:
+                self.flush()
+            finally:
+                self.columnar.close()
+
+def write_summary(db, folder: Path, num, relayers):
+    with SummaryWriter(folder, num) as writer:
+        for name in relayers:
+            cur = db.execute(
+                "SELECT f.peer, f.excel_date, f.port, f.type, f.htl, f.total_blocks, f.data_blocks,"
+                " f.peers, f.le_ip, f.split_key FROM fts_rows f JOIN peers p"
+                " ON p.file = f.file AND p.instance = f.instance AND p.peer = f.peer"
+                " WHERE f.file = ? AND f.instance = ? ORDER BY p.idx, f.seq", (num, name))
+            while True:
+                batch = cur.fetchmany(SUMMARY_BATCH_ROWS)
+                if not batch:
+                    break
+                # IPPortRun keeps the legacy value: the FTS file name after "FTS-".
+                writer.write([row[1:] + (name, row[0].replace('.', '_').replace(':', '_') + ".txt")
+                              for row in batch])
+
+# Parameter sweep 
+#
+# Every job also writes peerStats.json: the per-peer (requests, duplicates,
+# inserts) counts plus avg_peers and T, i.e. everything the Levine decision
+# needs. --sweep reloads those and evaluates a grid of RUN_MIN_REQUESTS and
+# PROB_THRESHOLD values in memory, one process per file. The probability of a
+# peer does not depend on either constant, so it is computed once per peer and
+# each grid point is only a pair of comparisons.
+
+PEER_STATS = "peerStats.json"
+SWEEP_MIN_REQUESTS = list(range(5, 55, 5))
+SWEEP_THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.96, 0.97, 0.98, 0.99, 0.995, 0.999]
+
+def write_peer_stats(inst_dir: Path, peer_order, duplicates_list, inserts_list, data_requests_num_list,
+                     avg_peers, total_blocks, is_downloader):
+    rows = peer_rows(peer_order, duplicates_list, inserts_list, data_requests_num_list)
+    stats = {
+        'is_downloader': is_downloader,
+        'avg_peers': avg_peers,
+        'total_blocks': total_blocks,
+        'T': int(0.8 * total_blocks),
+        'peers': [[peer, requests, duplicates_cnt, inserts_cnt] for peer, requests, inserts_cnt, duplicates_cnt, _ in rows],
+    }
+    with open(inst_dir / PEER_STATS, "w") as f:
+        json.dump(stats, f)
+
+def sweep_file(folder: Path, instances, min_requests_grid, thresholds):
+    # Returns (instances with stats, CSV rows) for one File<N> folder.
+    samples = {True: [], False: []}  # is_downloader -> [(requests, probability)]
+    found = 0
+    for inst in instances:
+        stats_path = folder / inst / PEER_STATS
+        if not stats_path.exists():
+            continue
+        stats = json.loads(stats_path.read_text(encoding='utf-8'))
+        found += 1
+        adj = [max(0, requests - inserts_cnt - 3 * duplicates_cnt) for _, requests, duplicates_cnt, inserts_cnt in stats['peers']]
+        probs = calc_even_share_probabilities(stats['avg_peers'], stats['T'], adj)
+        samples[bool(stats['is_downloader'])].extend(
+            (peer[1], prob) for peer, prob in zip(stats['peers'], probs)
+        )
+
+    rows = []
+    for min_requests in min_requests_grid:
+        runs = {flag: [prob for requests, prob in samples[flag] if requests >= min_requests] for flag in samples}
+        for threshold in thresholds:
+            fp = sum(1 for prob in runs[False] if prob > threshold)
+            tp = sum(1 for prob in runs[True] if prob > threshold)
+            fp_rate = f"{100.0 * fp / len(runs[False]):.4f}" if runs[False] else ""
+            tp_rate = f"{100.0 * tp / len(runs[True]):.4f}" if runs[True] else ""
+            rows.append([
+                str(min_requests), f"{threshold:g}",
+                str(len(runs[False])), str(fp), fp_rate,
+                str(len(runs[True])), str(tp), tp_rate,
+            ])
+    return found, rows
+
+def write_sweep_report(folder: Path, num, rows):
+    headers = [
+        "RunMinRequests", "ProbThreshold",
+        "RelayerRuns", "FalsePositives", "FalsePositiveRatePct",
+        "DownloaderRuns", "TruePositives", "TruePositiveRatePct",
+    ]
+    out_path = folder / f"File{num}_sweep.csv"
+    with out_path.open("w", encoding="utf-8") as f:
+        f.write(",".join(headers) + "\n")
+        for row in rows:
+            f.write(",".join(row) + "\n")
+    return out_path
+
+def run_sweep(file_nums, instances, min_requests_grid, thresholds, parallel=True, base=None):
+    base = Path(base) if base is not None else Path.cwd()
+    folders = [(num, base / f"File{num}") for num in file_nums if (base / f"File{num}").exists()]
+    start = time.time()
+    if parallel and len(folders) > 1:
+        with ProcessPoolExecutor(max_workers=max(1, min(len(folders), (os.cpu_count() or 1) - 1))) as exe:
+            futures = [exe.submit(sweep_file, folder, instances, min_requests_grid, thresholds) for _, folder in folders]
+            results = [fut.result() for fut in futures]
+    else:
+        results = [sweep_file(folder, instances, min_requests_grid, thresholds) for _, folder in folders]
+    for (num, folder), (found, rows) in zip(folders, results):
+        if not found:
+            print(f"[WARN] File{num}: no {PEER_STATS} found, run the pipeline first")
+            continue
+        out_path = write_sweep_report(folder, num, rows)
+        print(f"[SWEEP] File{num}: {len(rows)} settings over {found} instances -> {out_path.name}")
+    print(f"[SWEEP] done in {time.time() - start:.2f}s")
+
+# Live follow mode 
+#
+# --follow tails each requests_<instance>.log from a byte offset. Per
+# (manifest, instance) pair it keeps compact per-peer counters instead of the
+# records: key frequencies (keys interned to ids), inserts, data requests,
+# duplicates, HTL counts and the first and last timestamp. Each refresh appends
+# the newly matched lines to downloadRequests.txt, requestLocs.txt and the
+# per-peer files of the peers that received them, and rewrites only the small
+# metric files and probabilityReport.txt. A peer that starts passing has its
+# FTS block extracted once; afterwards its new rows are appended to the block
+# and to levine_results.db and its header is updated in place. The downloader's
+# rows also carry the file's data request total, which every new line changes:
+# rows appended while following show the total of their refresh, and stopping
+# re-extracts the downloader's blocks once with the final total. Relayer IP
+# derivation counts key overlaps with the downloader's follower as lines
+# arrive. Cost per refresh is proportional to the new lines, not to the log
+# size. On exit the counters and the size of every appended file are
+# checkpointed (.levine_follow.json); the next --follow truncates the outputs
+# to those sizes, dropping anything written after the checkpoint, and resumes
+# at the saved offset.
+
+FOLLOW_CHECKPOINT = ".levine_follow.json"
+
+class LogTail:
+    def __init__(self, logpath: Path, offset=0):
+        self.logpath = logpath
+        self.offset = offset
+
+    def head_digest(self, length=None):
+        length = self.offset if length is None else length
+        with open(self.logpath, 'rb') as f:
+            return hashlib.sha256(f.read(min(length, FINGERPRINT_SAMPLE))).hexdigest()
+
+    def read_lines(self, final=False):
+        # Returns the complete lines appended since the last call (text-mode
+        # style, with "\n"), or None if the log shrank and must be re-read.
+        size = self.logpath.stat().st_size
+        if size < self.offset:
+            return None
+        if size == self.offset:
+            return []
+        with open(self.logpath, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        end = len(data) if final else data.rfind(b"\n") + 1
+        if end <= 0:
+            return []
+        self.offset += end
+        return decode_log_text(data[:end])
+
+class FollowedPeer:
+    # Running counters of one peer of a followed instance: what write_peer_files
+    # derives from the peer's records, without keeping the records.
+    __slots__ = ('idx', 'sent', 'inserts', 'data_requests', 'duplicates', 'htl_counts', 'key_freq',
+                 'times', 'first_time', 'last_time')
+
+    def __init__(self, idx):
+        self.idx = idx
+        self.sent = 0
+        self.inserts = 0
+        self.data_requests = 0
+        self.duplicates = 0
+        self.htl_counts = {'16': 0, '17': 0, '18': 0}
+        self.key_freq = Counter()  # key id -> non-insert requests
+        self.times = 0  # timestamps that parse
+        self.first_time = None
+        self.last_time = None
+
+    def metrics(self):
+        # The sorted timestamps' intervals sum to last - first.
+        avg_interval = (self.last_time - self.first_time) / (self.times - 1) if self.times > 1 else float('nan')
+        return peer_metrics(self.duplicates, self.inserts, self.data_requests, self.htl_counts, avg_interval)
+
+    def state(self, ip):
+        key_freq = []
+        for key_id, count in self.key_freq.items():
+            key_freq += (key_id, count)
+        return [ip, self.sent, self.inserts, self.data_requests, self.duplicates,
+                [self.htl_counts['16'], self.htl_counts['17'], self.htl_counts['18']],
+                self.times, self.first_time, self.last_time, key_freq]
+
+    @classmethod
+    def from_state(cls, idx, state):
+        ip, sent, inserts, data_requests, duplicates, htl, times, first_time, last_time, key_freq = state
+        peer = cls(idx)
+        peer.sent, peer.inserts, peer.data_requests, peer.duplicates = sent, inserts, data_requests, duplicates
+        peer.htl_counts = dict(zip(('16', '17', '18'), htl))
+        peer.times, peer.first_time, peer.last_time = times, first_time, last_time
+        peer.key_freq = Counter(dict(zip(key_freq[::2], key_freq[1::2])))
+        return ip, peer
+
+def append_peer_files(inst_dir: Path, peer: FollowedPeer, records):
+    # Appends a followed peer's new records to its five per-peer files (its
+    # first records create them) and updates its timestamp counters.
+    idx = peer.idx
+    mode = "w" if peer.sent == len(records) else "a"
+    lines = [peer_line_repr(rec) for rec in records]
+    with open(inst_dir / f"keys{idx}.txt", mode) as f:
+        for line in lines:
+            try:
+                parsed = parse_request_line(line)
+            except Exception:
+                continue
+            f.write(parsed.key + "\n")
+    with open(inst_dir / f"requests{idx}.txt", mode) as f:
+        for line in lines:
+            f.write(line + "\n")
+    with open(inst_dir / f"dataRequestsOnly{idx}.txt", mode) as f:
+        for rec, line in zip(records, lines):
+            if 'insert' not in rec.req_type.lower():
+                f.write(line + "\n")
+
+    times = [rec.time_seconds for rec in records if rec.time_seconds is not None]
+    in_order = all(a <= b for a, b in zip(times, times[1:]))
+    if in_order and (not times or peer.last_time is None or times[0] >= peer.last_time):
+        with open(inst_dir / f"requestTimestamps{idx}.txt", mode) as f:
+            for ts in times:
+                f.write(f"{ts}\n")
+        with open(inst_dir / f"requestIntervals{idx}.txt", mode) as f:
+            prev = peer.last_time
+            for ts in times:
+                if prev is not None:
+                    f.write(f"{ts - prev}\n")
+                prev = ts
+    else:
+        # A timestamp earlier than one already written: sort this peer's again.
+        written = []
+        if mode == "a":
+            with open(inst_dir / f"requestTimestamps{idx}.txt", "r") as f:
+                written = [int(l) for l in f if l.strip()]
+        write_peer_timing(lambda name: open(inst_dir / name, "w"), idx, sorted(written + times))
+    if times:
+        peer.times += len(times)
+        peer.first_time = min(times) if peer.first_time is None else min(peer.first_time, min(times))
+        peer.last_time = max(times) if peer.last_time is None else max(peer.last_time, max(times))
+
+def remove_fts_files(inst_dir: Path, keep):
+    # Removes the FTS blocks and requests_<ipport>.txt files of peers not in keep.
+    names = set()
+    for ip_port in keep:
+        safe = ip_port.replace('.', '_').replace(':', '_')
+        names.update((f"FTS-{safe}.txt", f"requests_{safe}.txt"))
+    for pattern in ("FTS-*.txt", "requests_*.txt"):
+        for path in inst_dir.glob(pattern):
+            if path.name not in names:
+                path.unlink()
+
+def read_fts_header(f):
+    # Reads an FTS block's header (through the column header line) from f.
+    lines = []
+    while True:
+        line = f.readline()
+        lines.append(line)
+        if not line or line.startswith("Date/Time\t"):
+            return "".join(lines)
+
+class InstanceFollower:
+    def __init__(self, inst_dir: Path, is_downloader: bool):
+        self.inst_dir = inst_dir
+        self.is_downloader = is_downloader
+        self.total_blocks = read_total_blocks(inst_dir)
+        self.peers = {}  # ip -> FollowedPeer, in order of first request
+        self.peer_sum = 0.0
+        self.peer_n = 0
+        self.keys = []  # key id -> key
+        self.key_ids = {}
+        self.forwarded = set()  # ids of the keys of non-insert requests
+        self.key_dests = {}  # downloader only: key id -> indexes of the peers it was sent to
+        self.source = None  # the downloader follower of the same manifest (see link_followers)
+        self.subscribers = []  # downloader only: the followers whose source it is
+        self.overlaps = Counter()  # source peer index -> forwarded keys the source also sent it
+        self.passing = {}  # passing peer -> [FTS rows written, run start, run end]
+        self.header_ip = None  # IP Address in the passing peers' FTS headers
+        self.pending_lines = []
+        self.pending_locs = []
+        self.pending = defaultdict(list)  # ip -> (line, record) not yet written
+        self.started = False
+
+    def feed(self, line, rec):
+        line = line.rstrip("\n")
+        self.pending_lines.append(line)
+        if rec is None:
+            return
+        self.pending_locs.append(rec.request_loc)
+        self.peer_sum += rec.num_peers
+        self.peer_n += 1
+        peer = self.peers.get(rec.ip)
+        if peer is None:
+            peer = self.peers[rec.ip] = FollowedPeer(len(self.peers) + 1)
+        self.pending[rec.ip].append((line, rec))
+        peer.sent += 1
+        if rec.htl in peer.htl_counts:
+            peer.htl_counts[rec.htl] += 1
+        key_id = self.key_ids.get(rec.key)
+        if key_id is None:
+            key_id = self.key_ids[rec.key] = len(self.keys)
+            self.keys.append(rec.key)
+        if 'insert' in rec.req_type.lower():
+            peer.inserts += 1
+        else:
+            peer.data_requests += 1
+            peer.duplicates += peer.key_freq[key_id]
+            peer.key_freq[key_id] += 1
+            if key_id not in self.forwarded:
+                self.forwarded.add(key_id)
+                self.count_overlap(rec.key)
+        if self.is_downloader:
+            dests = self.key_dests.setdefault(key_id, set())
+            if peer.idx not in dests:
+                dests.add(peer.idx)
+                for follower in self.subscribers:
+                    follower.count_dest_overlap(rec.key, peer.idx)
+
+    def count_overlap(self, key):
+        # key was forwarded for the first time: count the source peers it went to.
+        if self.source is None:
+            return
+        for dest in self.source.key_dests.get(self.source.key_ids.get(key), ()):
+            self.overlaps[dest] += 1
+
+    def count_dest_overlap(self, key, dest):
+        # The source sent key to its peer dest for the first time.
+        key_id = self.key_ids.get(key)
+        if key_id is not None and key_id in self.forwarded:
+            self.overlaps[dest] += 1
+
+    def recount_overlaps(self):
+        self.overlaps = Counter()
+        for key_id in self.forwarded:
+            self.count_overlap(self.keys[key_id])
+
+    def subject_ip(self):
+        # derive_relayer_ip_from_overlap() from the overlaps counted while following.
+        if self.source is None:
+            return derive_relayer_ip_from_overlap(self.inst_dir, {self.keys[k] for k in self.forwarded})
+        best_id = best_overlap_dest(self.overlaps, len(self.forwarded))
+        return list(self.source.peers)[best_id - 1] if best_id is not None else ""
+
+    def flush(self, final=False) -> bool:
+        if self.started and not self.pending_lines and not final:
+            return False
+        self._flush(final)
+        self.started = True
+        return True
+
+    def _flush(self, final):
+        inst_dir = self.inst_dir
+        mode = "a" if self.started else "w"
+        with open(inst_dir / "downloadRequests.txt", mode) as f:
+            for l in self.pending_lines:
+                f.write(l + "\n")
+        with open(inst_dir / "requestLocs.txt", mode) as f:
+            for loc in self.pending_locs:
+                f.write(loc + "\n")
+        self.pending_lines = []
+        self.pending_locs = []
+
+        avg_peers = self.peer_sum / self.peer_n if self.peer_n else 0.0
+        with open(inst_dir / "avgPeers.txt", "w") as f:
+            f.write(f"{avg_peers}\n")
+        with open(inst_dir / "sentToPeer.txt", "w") as f:
+            for ip, peer in self.peers.items():
+                f.write(f"{ip}   was sent {peer.sent} requests\n")
+
+        for ip, new in self.pending.items():
+            append_peer_files(inst_dir, self.peers[ip], [rec for _, rec in new])
+        if not self.started:
+            remove_stale_peer_files(inst_dir, len(self.peers), archive=False)
+
+        peer_order = list(self.peers)
+        columns = list(zip(*(peer.metrics() for peer in self.peers.values()))) or [(), (), (), (), ()]
+        duplicates_list, inserts_list, data_requests_num_list, htl_lines, avg_intervals = (list(c) for c in columns)
+        write_metric_files(inst_dir, avg_intervals, duplicates_list, inserts_list, data_requests_num_list, htl_lines)
+
+        report_lines, decisions = build_probability_report(
+            peer_order, duplicates_list, inserts_list, data_requests_num_list,
+            avg_peers, self.total_blocks, len(self.peers), self.is_downloader,
+        )
+        write_probability_report(inst_dir, report_lines)
+        write_peer_stats(inst_dir, peer_order, duplicates_list, inserts_list, data_requests_num_list,
+                         avg_peers, self.total_blocks, self.is_downloader)
+
+        results = instance_results(
+            peer_order, duplicates_list, inserts_list, data_requests_num_list, avg_intervals,
+            report_lines, decisions, avg_peers, self.total_blocks, len(self.peers),
+            self.is_downloader,
+        )
+        self.update_fts(results, final)
+        self.pending = defaultdict(list)
+
+    def update_fts(self, results, final):
+        # Brings the FTS blocks and stored FTS rows up to date with results.
+        inst_dir = self.inst_dir
+        passing = results['passing']
+        dropped = [ip_port for ip_port in self.passing if ip_port not in set(passing)]
+        for ip_port in dropped:
+            del self.passing[ip_port]
+        if dropped or not self.started:
+            remove_fts_files(inst_dir, passing)
+        subject_ip = self.subject_ip() if passing else ""
+
+        if final and self.is_downloader:
+            # Rows appended while following show the data request total of their refresh.
+            extract = set(passing)
+        else:
+            extract = {ip_port for ip_port in passing if ip_port not in self.passing}
+        fts = {}
+        if extract:
+            # Once per newly passing peer; only its lines are kept.
+            fts = extract_peer_requests(inst_dir, results, read_request_lines(inst_dir), only_peers=extract,
+                                        subject_ip=subject_ip)
+            for ip_port in extract:
+                rows = fts.get(ip_port, [])
+                self.passing[ip_port] = [len(rows), rows[0][0] if rows else "", rows[-1][0] if rows else ""]
+
+        first_seq = {}
+        if self.is_downloader:
+            total_blocks, data_blocks = str(results['total_blocks']), str(results['unique_requests'])
+        else:
+            total_blocks = data_blocks = ""
+        overrides_all = instance_overrides(inst_dir)
+        manifest_key = instance_manifest_key(inst_dir)
+        for ip_port in passing:
+            if ip_port in extract:
+                continue
+            new = self.pending.get(ip_port, ())
+            rows = [fields for fields in (fts_detail_fields(line, ip_port, total_blocks, data_blocks)
+                                          for line, _ in new) if fields is not None]
+            if not new and subject_ip == self.header_ip:
+                continue
+            overrides = overrides_all.get(fts_override_name(inst_dir.name, ip_port), {})
+            self.append_fts_block(ip_port, new, rows, overrides, manifest_key, subject_ip)
+            if rows:
+                fts[ip_port] = rows
+                first_seq[ip_port] = self.passing[ip_port][0]
+                self.passing[ip_port][0] += len(rows)
+        self.header_ip = subject_ip
+        results['fts'] = fts
+        store_instance_results(inst_dir, results, fts_peers=(extract | set(dropped)) if self.started else None,
+                               fts_seq=first_seq)
+
+    def append_fts_block(self, ip_port, new, rows, overrides, manifest_key, subject_ip):
+        # Appends a passing peer's new lines and detail rows to its requests_
+        # file and FTS block, and updates the block's header: in place, unless
+        # its length changed.
+        safe = ip_port.replace('.', '_').replace(':', '_')
+        if new:
+            with (self.inst_dir / f"requests_{safe}.txt").open("a", encoding="utf-8") as f:
+                for line, _ in new:
+                    f.write(line + "\n")
+        state = self.passing[ip_port]
+        if rows:
+            state[1] = state[1] or rows[0][0]
+            state[2] = rows[-1][0]
+        header = io.StringIO()
+        write_fts_header(header, self.inst_dir.name, overrides, ip_port, state[1], state[2], manifest_key,
+                         subject_ip or overrides.get("IP Address", ""))
+        header = header.getvalue()
+        path = self.inst_dir / f"FTS-{safe}.txt"
+        with path.open("r", encoding="utf-8") as f:
+            old_header = read_fts_header(f)
+            body_start = f.tell()
+        if len(header.encode("utf-8")) == len(old_header.encode("utf-8")):
+            with path.open("r+", encoding="utf-8") as f:
+                if header != old_header:
+                    f.write(header)
+                f.seek(0, os.SEEK_END)
+                for fields in rows:
+                    f.write("\t".join(fields) + "\n")
+        else:
+            with path.open("r", encoding="utf-8") as f:
+                f.seek(body_start)
+                body = f.read()
+            with path.open("w", encoding="utf-8") as f:
+                f.write(header)
+                f.write(body)
+                for fields in rows:
+                    f.write("\t".join(fields) + "\n")
+
+    def checkpoint(self):
+        # The follower's counters and the size of every file it appends to.
+        names = ["downloadRequests.txt", "requestLocs.txt"]
+        for peer in self.peers.values():
+            names += [f"{stem}{peer.idx}.txt" for stem in PEER_FILE_STEMS]
+        for ip_port in self.passing:
+            safe = ip_port.replace('.', '_').replace(':', '_')
+            names += [f"requests_{safe}.txt", f"FTS-{safe}.txt"]
+        sizes = {}
+        for name in names:
+            path = self.inst_dir / name
+            if path.exists():
+                sizes[name] = path.stat().st_size
+        return {
+            'keys': self.keys,
+            'peers': [peer.state(ip) for ip, peer in self.peers.items()],
+            'peer_sum': self.peer_sum,
+            'peer_n': self.peer_n,
+            'key_dests': [[key_id] + sorted(dests) for key_id, dests in self.key_dests.items()],
+            'passing': self.passing,
+            'header_ip': self.header_ip,
+            'sizes': sizes,
+        }
+
+    def restore(self, saved) -> bool:
+        # Resumes from checkpoint(), dropping whatever a run that did not
+        # checkpoint wrote after it: appended files are truncated to their
+        # checkpointed sizes, FTS blocks (whose headers and downloader rows are
+        # rewritten) to their checkpointed rows, and timing files (rewritten
+        # when a timestamp arrives out of order) are rebuilt from the truncated
+        # requests<N>.txt. A passing peer whose FTS files are gone (it stopped
+        # passing after the checkpoint) is extracted again if it still passes.
+        # False, with nothing changed, when another output is missing or shorter.
+        inst_dir = self.inst_dir
+        sizes = dict(saved['sizes'])
+        passing = dict(saved['passing'])
+        fts_names = {}
+        for ip_port, state in saved['passing'].items():
+            safe = ip_port.replace('.', '_').replace(':', '_')
+            names = (f"FTS-{safe}.txt", f"requests_{safe}.txt")
+            if not all((inst_dir / name).exists() for name in names):
+                del passing[ip_port]
+                for name in names:
+                    sizes.pop(name, None)
+                continue
+            fts_names[names[0]] = state[0]
+        trimmed = {}
+        for name, size in sizes.items():
+            path = inst_dir / name
+            if not path.exists():
+                return False
+            if path.stat().st_size == size or name.startswith(("requestTimestamps", "requestIntervals")):
+                continue
+            if name in fts_names:
+                with path.open("r", encoding="utf-8") as f:
+                    header = read_fts_header(f)
+                    rows = [f.readline() for _ in range(fts_names[name])]
+                if not all(row.endswith("\n") for row in rows):
+                    return False
+                trimmed[name] = header + "".join(rows)
+            elif path.stat().st_size < size:
+                return False
+
+        for name, size in sizes.items():
+            path = inst_dir / name
+            if name in trimmed:
+                with path.open("w", encoding="utf-8") as f:
+                    f.write(trimmed[name])
+            elif path.stat().st_size > size and not name.startswith(("requestTimestamps", "requestIntervals")):
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+        self.keys = saved['keys']
+        self.key_ids = {key: key_id for key_id, key in enumerate(self.keys)}
+        for idx, state in enumerate(saved['peers'], start=1):
+            ip, peer = FollowedPeer.from_state(idx, state)
+            self.peers[ip] = peer
+            self.forwarded.update(peer.key_freq)
+            if any((inst_dir / f"{stem}{idx}.txt").stat().st_size != sizes.get(f"{stem}{idx}.txt")
+                   for stem in ("requestTimestamps", "requestIntervals")):
+                with open(inst_dir / f"requests{idx}.txt", "r") as f:
+                    times = (timestamp_epoch_seconds(line.split(',', 1)[0]) for line in f)
+                    times = sorted(ts for ts in times if ts is not None)
+                write_peer_timing(lambda name: open(inst_dir / name, "w"), idx, times)
+        self.peer_sum = saved['peer_sum']
+        self.peer_n = saved['peer_n']
+        self.key_dests = {row[0]: set(row[1:]) for row in saved['key_dests']}
+        self.passing = passing
+        self.header_ip = None  # the first refresh rewrites every header
+        self.started = True
+        remove_stale_peer_files(inst_dir, len(self.peers), archive=False)
+        remove_fts_files(inst_dir, self.passing)
+        truncate_fts_rows(inst_dir, {ip_port: state[0] for ip_port, state in self.passing.items()})
+        return True
+
+def link_followers(groups):
+    # Points every follower at the downloader follower of its manifest, whose
+    # destinations relayer IP derivation counts key overlaps with.
+    sources = {}
+    for group in groups:
+        if group['instance'] == "downloader":
+            sources = dict(group['followers'])
+    followers = [(m, f) for group in groups for m, f in group['followers'].items()]
+    for m, f in followers:
+        f.source = sources.get(m)
+        f.subscribers = []
+    for m, f in followers:
+        if f.source is not None:
+            f.source.subscribers.append(f)
+    for m, f in followers:
+        f.recount_overlaps()
+
+def follow_checkpoint_state(manifest_path: Path, key_match):
+    return {'code': code_version(), 'manifest': sha256_file(manifest_path), 'key_match': key_match}
+
+def load_follow_checkpoint(inst_dir: Path, state: dict):
+    path = inst_dir / FOLLOW_CHECKPOINT
+    if FORCE_REPROCESS or not path.exists():
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(saved, dict) or saved.get('state') != state:
+        return None
+    return saved
+
+def write_follow_checkpoint(inst_dir: Path, checkpoint: dict):
+    tmp = inst_dir / (FOLLOW_CHECKPOINT + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, separators=(",", ":"))
+    os.replace(tmp, inst_dir / FOLLOW_CHECKPOINT)
+
+def follow_logs(manifests, instances, file_nums, interval=30.0, key_match=None, input_dir=None, output_dir=None):
+    key_match = key_match or KEY_MATCH_MODE
+    input_dir = Path(input_dir) if input_dir is not None else Path.cwd()
+    base = Path(output_dir) if output_dir is not None else input_dir
+    groups = []
+    for inst in instances:
+        followers = {}
+        states = {}
+        for manifest_name in manifests:
+            manifest_path = input_dir / manifest_name
+            if not manifest_path.exists():
+                print(f"[WARN] manifest missing: {manifest_name}")
+                continue
+            inst_dir = base / f"File{manifest_name[len('downloadKeys_File'):-4]}" / inst
+            ensure_dir(inst_dir)
+            clear_job_record(inst_dir)
+            shutil.copy2(manifest_path, inst_dir / "downloadKeys.txt")
+            followers[manifest_name] = InstanceFollower(inst_dir, is_downloader=(inst == "downloader"))
+            states[manifest_name] = follow_checkpoint_state(manifest_path, key_match)
+        if not followers:
+            continue
+        logpath = locate_requests_log(inst, next(iter(followers.values())).inst_dir, input_dir)
+        if logpath is None:
+            print(f"[ERROR] no requests_{inst}.log found for {inst}, not following it")
+            continue
+        if is_compressed_log(logpath):
+            print(f"[ERROR] {logpath.name} is compressed; --follow reads plain logs only, not following it")
+            continue
+        if not is_utf8_log(logpath):
+            print(f"[ERROR] {logpath.name} is UTF-16; --follow reads UTF-8 logs only, not following it")
             continue
+        tail = LogTail(logpath)
+
+        saved = {m: load_follow_checkpoint(f.inst_dir, states[m]) for m, f in followers.items()}
+        offsets = {s['offset'] for s in saved.values() if s is not None}
+        if None not in saved.values() and len(offsets) == 1:
+            tail.offset = offsets.pop()
+            if logpath.stat().st_size >= tail.offset and tail.head_digest() == next(iter(saved.values()))['head']:
+                if all(f.restore(saved[m]['follower']) for m, f in followers.items()):
+                    print(f"[FOLLOW] {inst}: resuming at byte {tail.offset}")
+                else:
+                    print(f"[FOLLOW] {inst}: outputs changed since the checkpoint, starting over")
+                    followers = {m: InstanceFollower(f.inst_dir, f.is_downloader) for m, f in followers.items()}
+                    tail.offset = 0
+            else:
+                tail.offset = 0
+
+        key_sets = {m: read_manifest_keys(f.inst_dir / "downloadKeys.txt") for m, f in followers.items()}
+        groups.append({
+            'instance': inst,
+            'tail': tail,
+            'followers': followers,
+            'states': states,
+            'route': build_key_router(key_sets, key_match),
+        })
 
-        full_dl_path = folder / "fullDownloadReport.txt"
-        with full_dl_path.open("w", encoding="utf-8") as f_full:
-            f_full.write(f"File{num} Summary:\n")
-            dl_dir = folder / "downloader"
-            if dl_dir.exists():
-                pr = dl_dir / "probabilityReport.txt"
-                if pr.exists():
-                    f_full.write("Downloader:\n")
-                    for line in read_and_split(pr):
-                        f_full.write(f"  {line}\n")
-            for i in range(1, 36): # hard coded for our 36-node setup, will be updated in future to determine upper range by the number of entries in instanceNames.txt.
-                rel_dir = folder / f"Relayer{i}"
-                pr = rel_dir / "probabilityReport.txt"
-                if not pr.exists():
+    if not groups:
+        print("[FATAL] nothing to follow")
+        return
+    # The downloader goes first, so relayer IP derivation sees its lines of the same refresh.
+    groups.sort(key=lambda group: group['instance'] != "downloader")
+    link_followers(groups)
+
+    def poll(final=False):
+        touched = set()
+        for group in groups:
+            lines = group['tail'].read_lines(final=final)
+            if lines is None:
+                print(f"[FOLLOW] {group['tail'].logpath.name} shrank, starting over")
+                group['tail'].offset = 0
+                for m, f in list(group['followers'].items()):
+                    group['followers'][m] = InstanceFollower(f.inst_dir, f.is_downloader)
+                link_followers(groups)
+                lines = group['tail'].read_lines(final=final)
+            for line in lines:
+                if not line.strip():
                     continue
-                f_full.write(f"\nRelayer{i}:\n")
-                for line in read_and_split(pr):
-                    f_full.write(f"  {line}\n")
-
-        dup_report = folder / "duplicatesReport.txt"
-        with dup_report.open("w", encoding="utf-8") as f_dup:
-            f_dup.write(f"Duplicates report for File{num}\n")
-            for i in range(1, 36): # hard coded for our 36-node setup, will be updated in future to determine upper range by the number of entries in instanceNames.txt.
-                rel_dir = folder / f"Relayer{i}"
-                dups = rel_dir / "duplicates.txt"
-                if dups.exists():
-                    vals = [l.strip() for l in read_and_split(dups) if l.strip()]
-                    f_dup.write(f"Relayer{i}: {' '.join(vals)}\n")
-
-        ins_report = folder / "insertsReport.txt"
-        with ins_report.open("w", encoding="utf-8") as f_ins:
-            f_ins.write(f"Inserts report for File{num}\n")
-            for i in range(1, 36): # hard coded for our 36-node setup, will be updated in future to determine upper range by the number of entries in instanceNames.txt.
-                rel_dir = folder / f"Relayer{i}"
-                ins = rel_dir / "inserts.txt"
-                if ins.exists():
-                    vals = [l.strip() for l in read_and_split(ins) if l.strip()]
-                    f_ins.write(f"Relayer{i}: {' '.join(vals)}\n")
-
-        avg_timing = folder / "avgTimingReport.txt"
-        with avg_timing.open("w", encoding="utf-8") as f_avg:
-            f_avg.write(f"Average timing (intervals) for File{num}\n")
-            for i in range(1, 36): # hard coded for our 36-node setup, will be updated in future to determine upper range by the number of entries in instanceNames.txt.
-                rel_dir = folder / f"Relayer{i}"
-                avg_int = rel_dir / "avgIntervals.txt"
-                if avg_int.exists():
-                    vals = [l.strip() for l in read_and_split(avg_int) if l.strip()]
-                    f_avg.write(f"Relayer{i}: {' '.join(vals)}\n")
-
-        requests_txt = folder / "Requests.txt"
-        with requests_txt.open("w", encoding="utf-8") as f_req:
-            f_req.write(f"Relayers with pass runs for File{num}\n")
-            for i in range(1, 36): # hard coded for our 36-node setup, will be updated in future to determine upper range by the number of entries in instanceNames.txt.
-                rel_dir = folder / f"Relayer{i}"
-                pr = rel_dir / "probabilityReport.txt"
-                if not pr.exists():
+                hits = group['route'](line)
+                if not hits:
                     continue
-                for line in read_and_split(pr):
-                    if "Passes Levine: Yes" in line:
-                        f_req.write(f"Relayer{i}: {line}\n")
-                        break
+                try:
+                    rec = parse_request_line(line)
+                except ValueError:
+                    rec = None
+                for m in hits:
+                    group['followers'][m].feed(line, rec)
+            new = sum(1 for l in lines if l.strip())
+            for m, f in group['followers'].items():
+                if f.flush(final=final):
+                    touched.add(m[len("downloadKeys_File"):-4])
+            if new:
+                print(f"[FOLLOW] {group['instance']}: {new} new lines, offset {group['tail'].offset}")
+        if touched:
+            for num in file_nums:
+                if num in touched and (base / f"File{num}").exists():
+                    write_per_file_reports(base / f"File{num}", num, instances)
+            write_false_positive_index(base, file_nums, instances)
 
-        meta_txt = folder / "Metadata.txt"
-        with meta_txt.open("w", encoding="utf-8") as f_meta:
-            f_meta.write(f"File{num} Metadata\n")
-            if (folder / "downloader").exists():
-                pr = folder / "downloader" / "probabilityReport.txt"
-                if pr.exists():
-                    for line in read_and_split(pr):
-                        low = line.lower()
-                        if "total number of blocks for file" in low or "unique requests sent:" in low:
-                            f_meta.write(f"{line}\n")
-
-        csv_path = folder / f"File{num}_summary.csv"
-        headers = [
-            "ExcelDate", "Port", "Type", "HTL", "TotalBlocks", "DataBlocks",
-            "Peers", "LE_IP", "SplitKey", "SourceRelayer", "IPPortRun"
-        ]
-        with csv_path.open("w", encoding="utf-8") as f_csv:
-            f_csv.write(",".join(headers) + "\n")
-            for i in range(1, 36): # hard coded for our 36-node setup, will be updated in future to determine upper range by the number of entries in instanceNames.txt.
-                rel_dir = folder / f"Relayer{i}"
-                if not rel_dir.exists():
-                    continue
-                for fts in rel_dir.glob("FTS-*.txt"):
-                    ipport = fts.name[len("FTS-"):]
-                    with fts.open("r", encoding='utf-8', errors='ignore') as fin:
-                        lines = fin.read().splitlines()
-                        try:
-                            idx = lines.index("Date/Time\tPort\tType\tHTL\tTotal Blocks\tData Blocks\tPeers\tLE ID\tSplit Keys")
-                        except ValueError:
-                            continue
-                        for detail in lines[idx+1:]:
-                            parts = detail.split("\t")
-                            if len(parts) < 9:
-                                continue
-                            excel_date, port, req_type, htl, total_blocks, data_blocks, peers, le_ip, split_key = parts[:9]
-                            row = [
-                                excel_date, port, req_type, htl, total_blocks, data_blocks,
-                                peers, le_ip, split_key, f"Relayer{i}", ipport
-                            ]
-                            f_csv.write(",".join(row) + "\n")
+    # Ctrl+C only stops the loop: a refresh it lands in still feeds every line
+    # it read, since the tail offsets have already moved past them.
+    stop = threading.Event()
+    previous = None
+    if threading.current_thread() is threading.main_thread():
+        previous = signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    print(f"[START] following {len(groups)} logs, refresh every {interval:g}s (Ctrl+C to stop)")
+    try:
+        while not stop.is_set():
+            poll()
+            stop.wait(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if previous is not None:
+            signal.signal(signal.SIGINT, previous)
+
+    poll(final=True)
+    for group in groups:
+        tail = group['tail']
+        at_eof = tail.offset == tail.logpath.stat().st_size
+        for m, f in group['followers'].items():
+            write_follow_checkpoint(f.inst_dir, {'state': group['states'][m], 'offset': tail.offset,
+                                                 'head': tail.head_digest(), 'follower': f.checkpoint()})
+            if at_eof:
+                # Outputs now equal a batch run over this log, so batch resume may reuse them.
+                fingerprint = job_fingerprint(input_dir / m, f.inst_dir, group['instance'])
+                set_results_fingerprint(f.inst_dir, fingerprint)
+                write_job_record(f.inst_dir, fingerprint)
+    print("[DONE] follow stopped, state checkpointed")
 
 # Entry point with parallelization, resume, and progress summary 
 
-def main():
-    global FORCE_REPROCESS
-    parser = argparse.ArgumentParser(description="Parallelized, resumable Freenet Levine pipeline")
-    parser.add_argument("--files", nargs="*", help="File numbers to process (e.g., 1 2 3). If omitted, auto-discovers all downloadKeys_File*.txt.")
-    parser.add_argument("--no-parallel", action="store_true", help="Disable parallel execution (run serially).")
-    parser.add_argument("--force", action="store_true", help="Re-run even if output already exists (overrides resume checkpoint).")
-    args = parser.parse_args()
+def cli_settings():
+    return {
+        'FORCE_REPROCESS': FORCE_REPROCESS,
+        'KEY_MATCH_MODE': KEY_MATCH_MODE,
+        'USE_PARSE_CACHE': USE_PARSE_CACHE,
+        'SPLIT_LOG_BYTES': SPLIT_LOG_BYTES,
+        'SPLIT_WORKERS': SPLIT_WORKERS,
+        'LOG_READER': LOG_READER,
+        'USE_PEER_ARCHIVE': USE_PEER_ARCHIVE,
+        'PROFILE': PROFILE,
+        'STREAM_MEMORY_BYTES': STREAM_MEMORY_BYTES,
+        'COLUMNAR_FORMAT': COLUMNAR_FORMAT,
+        'FULL_LOG_HASH': FULL_LOG_HASH,
+    }
 
-    if args.force:
-        FORCE_REPROCESS = True
+def init_worker(settings, context=None):
+    # Pool initializer: spawned workers (Windows, macOS) do not inherit the CLI
+    # globals. context is the run's shared inputs (build_run_context).
+    globals().update(settings)
+    if context is not None:
+        set_run_context(context)
 
-    inst_file = Path("instancesNames.txt")
-    if not inst_file.exists():
-        print("[FATAL] missing instancesNames.txt")
+def refresh_parse_cache(logpath: Path):
+    cache = load_parse_cache(logpath)
+    if cache is not None:
+        cache.close()
+        return "fresh"
+    return "built" if build_parse_cache(logpath) is not None else "skipped"
+
+# Profiling 
+#
+# --profile records per job and per stage: wall and CPU time (CPU of the
+# calling thread, so byte-range helper processes are not included), bytes read
+# and written (the OS per-process I/O counters; under --backend thread they
+# include concurrently running jobs), lines scanned and matched, and the
+# process's peak RSS when the stage ends. Stages nest, and an outer stage's
+# figures include its inner stages. Jobs return their stages to the main
+# process, which writes them with run-wide totals to profile_summary.json.
+
+PROFILE_SUMMARY = "profile_summary.json"
+_PROFILE = threading.local()
+
+def io_counters():
+    # (bytes read, bytes written) through this process's read/write calls, or None.
+    try:
+        with open("/proc/self/io", "r") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["rchar"]), int(fields["wchar"])
+    except (OSError, KeyError, ValueError):
+        pass
+    if psutil is not None:
+        try:
+            counters = psutil.Process().io_counters()
+            return counters.read_bytes, counters.write_bytes
+        except (AttributeError, psutil.Error):
+            pass
+    return None
+
+def peak_rss():
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss)
+    return None
+
+def new_stage_stats():
+    return {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'bytes_read': 0, 'bytes_written': 0,
+            'lines_scanned': 0, 'lines_matched': 0, 'peak_rss': 0}
+
+def profile_begin():
+    _PROFILE.stages = {} if PROFILE else None
+
+def profile_end():
+    stages = getattr(_PROFILE, 'stages', None)
+    _PROFILE.stages = None
+    return stages
+
+@contextmanager
+def profile_stage(name):
+    stages = getattr(_PROFILE, 'stages', None)
+    if stages is None:
+        yield
         return
-    instances = [l.strip() for l in inst_file.read_text().splitlines() if l.strip()]
+    io_start = io_counters()
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield
+    finally:
+        stats = stages.setdefault(name, new_stage_stats())
+        stats['calls'] += 1
+        stats['wall_s'] += time.perf_counter() - wall_start
+        stats['cpu_s'] += time.thread_time() - cpu_start
+        io_end = io_counters()
+        if io_start is not None and io_end is not None:
+            stats['bytes_read'] += io_end[0] - io_start[0]
+            stats['bytes_written'] += io_end[1] - io_start[1]
+        stats['peak_rss'] = max(stats['peak_rss'], peak_rss() or 0)
 
-    if args.files and len(args.files) > 0:
-        file_nums = args.files
-    else:
+def profiling():
+    return getattr(_PROFILE, 'stages', None) is not None
+
+def profile_count(name, lines_scanned=0, lines_matched=0):
+    stages = getattr(_PROFILE, 'stages', None)
+    if stages is None:
+        return
+    stats = stages.setdefault(name, new_stage_stats())
+    stats['lines_scanned'] += lines_scanned
+    stats['lines_matched'] += lines_matched
+
+def count_log_lines(logpath: Path):
+    count = 0
+    last = b"\n"
+    with open_log_binary(logpath) as f:
+        for block in iter(lambda: f.read(SPLIT_READ_BLOCK), b""):
+            count += block.count(b"\n")
+            last = block[-1:]
+    return count + (last != b"\n")
+
+def merge_stage_stats(total, stages):
+    for name, stats in stages.items():
+        merged = total.setdefault(name, new_stage_stats())
+        for field, value in stats.items():
+            merged[field] = max(merged[field], value) if field == 'peak_rss' else merged[field] + value
+
+def write_profile_summary(out_dir: Path, run_info: dict, job_profiles, aggregate_stages):
+    stages = {}
+    for job in job_profiles:
+        merge_stage_stats(stages, job['stages'])
+    merge_stage_stats(stages, aggregate_stages)
+    summary = {'run': run_info, 'stages': stages, 'aggregate': aggregate_stages, 'jobs': job_profiles}
+    out_path = out_dir / PROFILE_SUMMARY
+    out_path.write_text(json.dumps(summary, indent=1), encoding='utf-8')
+    return out_path
+
+# Job scheduling 
+#
+# Jobs are dispatched largest first (cost = bytes of log and manifest to read)
+# so the long ones do not start last and stretch the tail of the run. Relayer
+# jobs derive the relayer IP from the downloader's outputs for the same file,
+# so they are held back until that downloader job has finished (downloader
+# jobs go first). Each worker times its own job, and the pool is sized by
+# available RAM as well as cores: a job holds the lines its manifest selects,
+# which for big logs is the dominant memory cost, so the largest jobs that
+# would run together must fit in the memory budget.
+
+JOB_RAM_BASE = 100 << 20  # interpreter, manifest key sets, per-peer state
+JOB_RAM_PER_LOG_BYTE = 3  # conservative: a filtered line and its interned record, a few times its text size
+MEMORY_BUDGET_FRACTION = 0.8
+
+def available_memory():
+    # Bytes of RAM available for new work, or None when it cannot be determined.
+    if psutil is not None:
+        return psutil.virtual_memory().available
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if sys.platform == "win32":
+        import ctypes
+
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                        ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                        ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                        ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                        ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullAvailPhys
+        return None
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def job_memory_estimate(cost):
+    if STREAM_MEMORY_BYTES:
+        # Streaming jobs stay near their record budget (twice it, for the merge and per-peer state).
+        return JOB_RAM_BASE + min(JOB_RAM_PER_LOG_BYTE * cost, 2 * STREAM_MEMORY_BYTES)
+    return JOB_RAM_BASE + JOB_RAM_PER_LOG_BYTE * cost
+
+def memory_capped_workers(job_costs, max_workers, budget):
+    # Largest number of workers such that the largest jobs, running together, fit the budget.
+    if budget is None:
+        return max_workers
+    used = 0
+    workers = 0
+    for cost in sorted(job_costs, reverse=True)[:max_workers]:
+        used += job_memory_estimate(cost)
+        if used > budget and workers:
+            break
+        workers += 1
+    return max(1, workers)
+
+def run_timed(fn, fn_args, cprofile_path=None, split=None):
+    # Runs one job and returns (seconds spent in it, error message or None,
+    # --profile stages or None); timed inside the worker so queueing time is
+    # not counted. cprofile_path dumps a cProfile of the job there. split is
+    # the number of byte-range processes the job may use (default --split-workers).
+    _SPLIT.workers = SPLIT_WORKERS if split is None else split
+    profile_begin()
+    profiler = cProfile.Profile() if cprofile_path is not None else None
+    start = time.perf_counter()
+    try:
+        if profiler is not None:
+            profiler.runcall(fn, *fn_args)
+        else:
+            fn(*fn_args)
+        error = None
+    except Exception as e:
+        error = str(e)
+    elapsed = time.perf_counter() - start
+    if profiler is not None:
+        profiler.dump_stats(cprofile_path)
+    return elapsed, error, profile_end()
+
+def format_duration(seconds):
+    if seconds < 0:
+        return "unknown"
+    m, s = divmod(int(seconds), 60)
+    h, m = divmod(m, 60)
+    if h:
+        return f"{h}h{m:02d}m{s:02d}s"
+    if m:
+        return f"{m}m{s:02d}s"
+    return f"{s}s"
+
+class LevineRunner:
+    # Library entry point. Reads manifests, instancesNames.txt and request logs
+    # from input_dir and writes the File<N>/ trees, reports and levine_results.db
+    # under output_dir (default: input_dir). Nothing changes the working
+    # directory, so a runner can be embedded in a long-running service and jobs
+    # can run on threads. Settings are the module globals of cli_settings() and
+    # apply to the whole process.
+
+    def __init__(self, input_dir, output_dir=None, settings=None):
+        self.input_dir = Path(input_dir).resolve()
+        self.output_dir = Path(output_dir).resolve() if output_dir is not None else self.input_dir
+        if settings:
+            init_worker(settings)
+        # Filled by run_jobs() and aggregate() when PROFILE is set.
+        self.job_profiles = []
+        self.aggregate_stages = {}
+
+    def instances(self):
+        inst_file = self.input_dir / "instancesNames.txt"
+        if not inst_file.exists():
+            return None
+        return [l.strip() for l in inst_file.read_text().splitlines() if l.strip()]
+
+    def file_numbers(self):
         file_nums = []
-        for path in sorted(Path(".").glob("downloadKeys_File*.txt")):
+        for path in sorted(self.input_dir.glob("downloadKeys_File*.txt")):
             name = path.name
             if name.startswith("downloadKeys_File") and name.endswith(".txt"):
-                num = name[len("downloadKeys_File"):-4]
-                file_nums.append(num)
-    if not file_nums:
-        print("[FATAL] no downloadKeys_File*.txt manifests found")
-        return
+                file_nums.append(name[len("downloadKeys_File"):-4])
+        return file_nums
 
-    jobs = []
-    for num in file_nums:
-        manifest = f"downloadKeys_File{num}.txt"
-        for inst in instances:
-            jobs.append((manifest, inst))
-
-    failed_jobs = []
-    total_jobs = len(jobs)
-
-    def format_duration(seconds):
-        if seconds < 0:
-            return "unknown"
-        m, s = divmod(int(seconds), 60)
-        h, m = divmod(m, 60)
-        if h:
-            return f"{h}h{m:02d}m{s:02d}s"
-        if m:
-            return f"{m}m{s:02d}s"
-        return f"{s}s"
-
-    completed = 0
-    start_time = time.time()
-    avg_duration = None
-    alpha = 0.2
-
-    if args.no_parallel:
-        for manifest, inst in jobs:
-            job_start = time.time()
-            try:
-                process_instance_pair(manifest, inst)
+    def jobs(self, file_nums, instances, single_pass=False):
+        # (label, instance, fn, fn_args) per job; fn_args pickle for process pools.
+        manifests = [f"downloadKeys_File{num}.txt" for num in file_nums]
+        dirs = (self.input_dir, self.output_dir)
+        jobs = []
+        if single_pass:
+            label = ",".join(manifests)
+            for inst in instances:
+                jobs.append((label, inst, process_instance_files, (manifests, inst, KEY_MATCH_MODE) + dirs))
+        else:
+            for manifest in manifests:
+                for inst in instances:
+                    jobs.append((manifest, inst, process_instance_pair, (manifest, inst, KEY_MATCH_MODE) + dirs))
+        return jobs
+
+    def refresh_parse_caches(self, instances, parallel=True):
+        # Build stale caches up front, one per log, so jobs sharing a log only load it.
+        logs = sorted({p for p in (locate_requests_log(inst, self.input_dir) for inst in instances) if p is not None})
+        if not parallel or len(logs) < 2:
+            results = [(p, refresh_parse_cache(p)) for p in logs]
+        else:
+            with ProcessPoolExecutor(max_workers=max(1, min(len(logs), (os.cpu_count() or 1) - 1))) as exe:
+                results = list(zip(logs, exe.map(refresh_parse_cache, logs)))
+        for p, state in results:
+            print(f"[CACHE] {p.name}: {state}")
+
+    def job_log(self, job):
+        label, inst, _, _ = job
+        manifest = label.split(",")[0]
+        inst_dir = self.output_dir / f"File{manifest[len('downloadKeys_File'):-4]}" / inst
+        return locate_requests_log(inst, inst_dir, self.input_dir)
+
+    def discard_job_results(self, label, inst):
+        # A failed job keeps neither its record nor its stored rows, so the
+        # aggregates of this run do not report its previous result.
+        for manifest in label.split(","):
+            inst_dir = self.output_dir / f"File{manifest[len('downloadKeys_File'):-4]}" / inst
+            if inst_dir.is_dir():
+                clear_job_record(inst_dir)
+                delete_instance_results(inst_dir)
+
+    def job_cost(self, job):
+        # Bytes a job reads: its request log (uncompressed) and its manifest(s).
+        cost = sum((self.input_dir / m).stat().st_size for m in job[0].split(",") if (self.input_dir / m).exists())
+        logpath = self.job_log(job)
+        if logpath is not None:
+            cost += log_size_estimate(logpath)
+        return cost
+
+    def job_splits(self, job):
+        # Whether the job would filter its log in byte ranges if granted helpers.
+        if STREAM_MEMORY_BYTES or (USE_PARSE_CACHE and KEY_MATCH_MODE == "column"):
+            return False
+        logpath = self.job_log(job)
+        return logpath is not None and log_can_split(logpath)
+
+    def run_context(self, jobs):
+        manifests = sorted({m for label, _, _, _ in jobs for m in label.split(",")})
+        instances = sorted({inst for _, inst, _, _ in jobs})
+        return build_run_context(self.input_dir, self.output_dir, manifests, instances)
+
+    def run_jobs(self, jobs, backend="process", workers=None, max_memory=None, profile_job=None):
+        # backend: "serial", "process" (ProcessPoolExecutor) or "thread"
+        # (ThreadPoolExecutor: no spawn or pickling cost, suits small and
+        # I/O-bound jobs). workers caps the pool (default cores - 1), which is
+        # further capped so the largest jobs fit in max_memory bytes (default
+        # MEMORY_BUDGET_FRACTION of available RAM). profile_job ("<label>/<instance>")
+        # names one job to run under cProfile. Returns the failed jobs as
+        # (label, instance, error).
+        context = self.run_context(jobs)
+        set_run_context(context)
+        try:
+            return self._run_jobs(jobs, context, backend, workers, max_memory, profile_job)
+        finally:
+            set_run_context(None)
+
+    def _run_jobs(self, jobs, context, backend, workers, max_memory, profile_job):
+        failed_jobs = []
+        total_jobs = len(jobs)
+        completed = 0
+        start_time = time.time()
+        avg_duration = None
+        alpha = 0.2
+        parallelism = 1
+
+        def job_done(manifest, inst, job_elapsed, error, stages=None):
+            nonlocal completed, avg_duration
+            if stages is not None:
+                self.job_profiles.append({'job': f"{manifest}/{inst}", 'wall_s': job_elapsed,
+                                          'failed': error is not None, 'stages': stages})
+            if error is None:
                 job_status = "OK"
-            except Exception as e:
-                failed_jobs.append((manifest, inst, str(e)))
-                print(f"[ERROR] {manifest}/{inst} failed: {e}")
+            else:
+                failed_jobs.append((manifest, inst, str(error)))
+                print(f"[ERROR] {manifest}/{inst} failed: {error}")
+                self.discard_job_results(manifest, inst)
                 job_status = "FAIL"
-            job_elapsed = time.time() - job_start
 
             if avg_duration is None:
                 avg_duration = job_elapsed
@@ -859,65 +3889,256 @@ def main():
             completed += 1
             total_elapsed = time.time() - start_time
             remaining = total_jobs - completed
-            rate = 1.0 / avg_duration if avg_duration > 0 else 0
-            eta = remaining * avg_duration
+            rate = parallelism / avg_duration if avg_duration > 0 else 0
+            eta = remaining * avg_duration / parallelism
 
             slow_marker = " (slow)" if job_elapsed > 2 * avg_duration else ""
             pct = (completed / total_jobs) * 100
             eta_str = format_duration(eta) if completed >= 5 else "estimating..."
             print(f"[JOB DONE] {manifest}/{inst} took {format_duration(job_elapsed)}{slow_marker} [{job_status}]")
             print(f"[PROGRESS] {completed}/{total_jobs} ({pct:.1f}%) done. Failures: {len(failed_jobs)}. Elapsed: {format_duration(total_elapsed)}, ETA: {eta_str}, rate: {rate:.2f} jobs/sec.")
-    else:
-        max_workers = max(1, (os.cpu_count() or 1) - 1)
-        print(f"[START] parallel execution using {max_workers} workers, force={'yes' if FORCE_REPROCESS else 'no'}")
-        with ProcessPoolExecutor(max_workers=max_workers) as exe:
-            future_to_job = {}
-            submit_times = {}
-            for m, i in jobs:
-                fut = exe.submit(process_instance_pair, m, i)
-                future_to_job[fut] = (m, i)
-                submit_times[fut] = time.time()
-
-            for fut in as_completed(future_to_job):
-                manifest, inst = future_to_job[fut]
-                real_start = submit_times.get(fut, time.time())
-                job_elapsed = time.time() - real_start
-                try:
-                    fut.result()
-                    job_status = "OK"
-                except Exception as e:
-                    failed_jobs.append((manifest, inst, str(e)))
-                    print(f"[ERROR] {manifest}/{inst} failed: {e}")
-                    job_status = "FAIL"
-
-                if avg_duration is None:
-                    avg_duration = job_elapsed
-                else:
-                    avg_duration = alpha * job_elapsed + (1 - alpha) * avg_duration
 
-                completed += 1
-                total_elapsed = time.time() - start_time
-                remaining = total_jobs - completed
-                rate = 1.0 / avg_duration if avg_duration > 0 else 0
-                eta = remaining * avg_duration
+        costs = {id(job): self.job_cost(job) for job in jobs}
+
+        def cprofile_path(manifest, inst):
+            if profile_job != f"{manifest}/{inst}":
+                return None
+            safe = re.sub(r'[^A-Za-z0-9_.-]+', '_', f"{manifest}_{inst}")
+            return str(self.output_dir / f"profile_{safe}.pstats")
+
+        def priority(job):
+            return (job[1] != "downloader", -costs[id(job)])
+
+        if backend == "serial":
+            # One job at a time, so each may split its log over all --split-workers.
+            for manifest, inst, fn, fn_args in sorted(jobs, key=priority):
+                job_elapsed, error, stages = run_timed(fn, fn_args, cprofile_path(manifest, inst))
+                job_done(manifest, inst, job_elapsed, error, stages)
+            return failed_jobs
+
+        downloader_labels = {job[0] for job in jobs if job[1] == "downloader"}
+        ready = []
+        blocked = defaultdict(list)  # label -> relayer jobs waiting for its downloader job
+        for job in jobs:
+            if job[1] != "downloader" and job[0] in downloader_labels:
+                blocked[job[0]].append(job)
+            else:
+                ready.append(job)
+        ready.sort(key=priority)
+
+        cpu_workers = workers or max(1, (os.cpu_count() or 1) - 1)
+        if max_memory is None:
+            available = available_memory()
+            max_memory = int(available * MEMORY_BUDGET_FRACTION) if available is not None else None
+        parallelism = memory_capped_workers(costs.values(), cpu_workers, max_memory)
+        if parallelism < cpu_workers:
+            print(f"[START] memory budget {max_memory / (1 << 30):.1f} GiB allows {parallelism} of {cpu_workers} workers")
+        pool = ThreadPoolExecutor if backend == "thread" else ProcessPoolExecutor
+        print(f"[START] parallel execution using {parallelism} {backend} workers, largest jobs first, force={'yes' if FORCE_REPROCESS else 'no'}")
+        # Byte-range helpers share one core budget with the jobs: a job with a
+        # large log gets the cores that neither running jobs nor queued jobs
+        # able to start on a free worker need (a lone downloader, the tail of
+        # the run, a single worker), and holds them until it finishes.
+        splits = {id(job): self.job_splits(job) for job in jobs} if SPLIT_WORKERS > 1 else {}
+        cores = max(cpu_workers, SPLIT_WORKERS)
+        cores_used = 0
+        with pool(max_workers=parallelism, initializer=init_worker, initargs=(cli_settings(), context)) as exe:
+            in_flight = {}
+            while ready or in_flight:
+                # Dispatch only as many jobs as there are workers, so the
+                # order is decided when a worker frees up.
+                while ready and len(in_flight) < parallelism and cores_used < cores:
+                    job = ready.pop(0)
+                    m, i, fn, fn_args = job
+                    split = 1
+                    if splits.get(id(job)):
+                        queued = min(len(ready), parallelism - len(in_flight) - 1)
+                        split = max(1, min(SPLIT_WORKERS, cores - cores_used - queued))
+                    cores_used += split
+                    in_flight[exe.submit(run_timed, fn, fn_args, cprofile_path(m, i), split)] = (m, i, time.time(), split)
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    manifest, inst, submitted, split = in_flight.pop(fut)
+                    cores_used -= split
+                    try:
+                        job_elapsed, error, stages = fut.result()
+                    except Exception as e:  # the worker itself died (e.g. killed for memory)
+                        job_elapsed, error, stages = time.time() - submitted, e, None
+                    job_done(manifest, inst, job_elapsed, error, stages)
+                    if inst == "downloader" and manifest in blocked:
+                        ready.extend(blocked.pop(manifest))
+                        ready.sort(key=priority)
+        return failed_jobs
+
+    def aggregate(self, file_nums, instances=None, backend="serial", workers=None):
+        # Per-file reports first: the false positive index embeds fullDownloadReport.txt.
+        # instances (default: instancesNames.txt) sets which relayers the reports list.
+        instances = instances if instances is not None else self.instances()
+        profile_begin()
+        with profile_stage("per_file_reports"):
+            generate_per_file_reports(file_nums, self.output_dir, instances, backend, workers)
+        with profile_stage("false_positive_index"):
+            generate_false_positive_index(file_nums, self.output_dir, instances)
+        stages = profile_end()
+        if stages is not None:
+            merge_stage_stats(self.aggregate_stages, stages)
+
+    def write_profile(self, run_info):
+        return write_profile_summary(self.output_dir, run_info, self.job_profiles, self.aggregate_stages)
+
+    def run(self, file_nums=None, instances=None, single_pass=False, backend="process", workers=None,
+            max_memory=None, profile_job=None):
+        # Processes every (manifest, instance) job and rebuilds the aggregate
+        # reports; with PROFILE set, also writes profile_summary.json.
+        # Returns (failed jobs, total jobs).
+        run_start = time.perf_counter()
+        instances = instances if instances is not None else (self.instances() or [])
+        file_nums = file_nums if file_nums is not None else self.file_numbers()
+        ensure_dir(self.output_dir)
+        with results_db(self.output_dir):
+            pass  # create the store (and switch it to WAL) before workers open it concurrently
+        if USE_PARSE_CACHE and KEY_MATCH_MODE == "column":
+            self.refresh_parse_caches(instances, parallel=(backend != "serial"))
+        jobs = self.jobs(file_nums, instances, single_pass)
+        failed_jobs = self.run_jobs(jobs, backend, workers, max_memory, profile_job)
+        self.aggregate(file_nums, instances, backend, workers)
+        if PROFILE:
+            out_path = self.write_profile({
+                'backend': backend, 'single_pass': single_pass, 'files': list(file_nums),
+                'instances': list(instances), 'jobs': len(jobs), 'failed': len(failed_jobs),
+                'wall_s': time.perf_counter() - run_start, 'settings': cli_settings(),
+            })
+            print(f"[PROFILE] wrote {out_path}")
+        return failed_jobs, len(jobs)
+
+    def export_peer_files(self, file_nums, instances):
+        for num in file_nums:
+            for inst in instances:
+                inst_dir = self.output_dir / f"File{num}" / inst
+                count = export_peer_files(inst_dir)
+                if count is None:
+                    print(f"[WARN] File{num}/{inst}: {PEER_ARCHIVE} is not from this instance's last run, not exported")
+                elif count:
+                    print(f"[EXPORT] File{num}/{inst}: {count} per-peer files")
+
+    def follow(self, file_nums, instances, interval=30.0):
+        manifests = [f"downloadKeys_File{num}.txt" for num in file_nums]
+        follow_logs(manifests, instances, file_nums, interval, KEY_MATCH_MODE, self.input_dir, self.output_dir)
+
+def main():
+    global FORCE_REPROCESS, KEY_MATCH_MODE, USE_PARSE_CACHE, SPLIT_LOG_BYTES, SPLIT_WORKERS, LOG_READER, USE_PEER_ARCHIVE, PROFILE, STREAM_MEMORY_BYTES, COLUMNAR_FORMAT, FULL_LOG_HASH
+    parser = argparse.ArgumentParser(description="Parallelized, resumable Freenet Levine pipeline")
+    parser.add_argument("--files", nargs="*", help="File numbers to process (e.g., 1 2 3). If omitted, auto-discovers all downloadKeys_File*.txt.")
+    parser.add_argument("--no-parallel", action="store_true", help="Disable parallel execution (run serially).")
+    parser.add_argument("--backend", choices=["process", "thread"], default="process",
+                        help="Parallel job backend: worker processes (default) or threads (no spawn/pickling cost, for small or I/O-bound jobs).")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Maximum parallel jobs (default cores - 1; lowered further to fit the memory budget).")
+    parser.add_argument("--max-memory-gb", type=float, default=None,
+                        help="Memory budget for concurrent jobs in GiB (default 80%% of available RAM).")
+    parser.add_argument("--force", action="store_true", help="Re-run even if output already exists (overrides resume checkpoint).")
+    parser.add_argument("--full-hash", action="store_true",
+                        help="Fingerprint request logs by a SHA-256 of their whole content for resume checks, instead of size, mtime and their first and last MiB.")
+    parser.add_argument("--key-match", choices=["index", "column", "substring", "automaton"], default="index",
+                        help="Manifest key filter: any key occurring in the line, found through a per-field index (default), the stricter hash lookup on the key column only, or the legacy per-key substring scan. automaton is a deprecated name for index.")
+    parser.add_argument("--single-pass", action="store_true",
+                        help="Read each requests_<instance>.log once and route lines to all manifests, instead of one read per (manifest, instance) job.")
+    parser.add_argument("--parse-cache", action="store_true",
+                        help="Build/use a columnar parse cache (requests_<instance>.log.lmcache) so reruns skip text parsing. Requires --key-match column.")
+    parser.add_argument("--follow", action="store_true",
+                        help="Tail the request logs and refresh results incrementally until interrupted (Ctrl+C).")
+    parser.add_argument("--follow-interval", type=float, default=30.0,
+                        help="Seconds between refreshes in --follow mode (default 30).")
+    parser.add_argument("--sweep", action="store_true",
+                        help="After processing, evaluate a grid of RUN_MIN_REQUESTS/PROB_THRESHOLD values and write File<N>_sweep.csv.")
+    parser.add_argument("--sweep-min-requests", nargs="+", type=int, default=SWEEP_MIN_REQUESTS,
+                        help="RUN_MIN_REQUESTS values for --sweep.")
+    parser.add_argument("--sweep-thresholds", nargs="+", type=float, default=SWEEP_THRESHOLDS,
+                        help="PROB_THRESHOLD values for --sweep.")
+    parser.add_argument("--split-mb", type=float, default=SPLIT_LOG_BYTES >> 20,
+                        help="Filter logs of at least this many MiB in parallel byte ranges (default 256, 0 disables).")
+    parser.add_argument("--split-workers", type=int, default=SPLIT_WORKERS,
+                        help="Max processes used for byte-range filtering of one large log (default cores - 1); pooled jobs only use cores no other job needs.")
+    parser.add_argument("--log-reader", choices=["text", "mmap"], default="text",
+                        help="Log reader: decoded text (default) or memory-mapped bytes that decode only matching lines (--key-match column, UTF-8 logs).")
+    parser.add_argument("--peer-archive", action="store_true",
+                        help="Store the five per-peer files of each instance in one indexed peerFiles.zip instead of individual files.")
+    parser.add_argument("--export-peer-files", action="store_true",
+                        help="Write the legacy per-peer files back out from every peerFiles.zip for the selected files, then exit.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Bounded-memory jobs: write filtered lines as they arrive and spill per-peer records to disk beyond --stream-memory-mb.")
+    parser.add_argument("--stream-memory-mb", type=float, default=256,
+                        help="Per-job memory budget for buffered records with --stream (default 256).")
+    parser.add_argument("--columnar", choices=list(SUMMARY_FORMATS), default=None,
+                        help="Also write each File<N>_summary as a zstd-compressed Parquet or Arrow IPC file with typed columns (requires pyarrow).")
+    parser.add_argument("--profile", action="store_true",
+                        help="Record per-job, per-stage time, I/O, line counts and peak RSS in profile_summary.json.")
+    parser.add_argument("--profile-job", default=None, metavar="LABEL/INSTANCE",
+                        help="Run one job under cProfile and dump profile_<job>.pstats, e.g. downloadKeys_File1.txt/Relayer3.")
+    args = parser.parse_args()
+    if args.key_match == "automaton":
+        print("[WARN] --key-match automaton is deprecated, use --key-match index (the same filter)")
+        args.key_match = "index"
+    if args.key_match != "column":
+        # Both index the key column; silently ignoring them would hide that.
+        if args.parse_cache:
+            parser.error("--parse-cache requires --key-match column")
+        if args.log_reader == "mmap":
+            parser.error("--log-reader mmap requires --key-match column")
+    if args.stream and int(args.stream_memory_mb * (1 << 20)) <= 0:
+        parser.error("--stream-memory-mb must be greater than 0")
+
+    if args.force:
+        FORCE_REPROCESS = True
+    FULL_LOG_HASH = args.full_hash
+    KEY_MATCH_MODE = args.key_match
+    USE_PARSE_CACHE = args.parse_cache
+    SPLIT_LOG_BYTES = int(max(0.0, args.split_mb) * (1 << 20))
+    SPLIT_WORKERS = max(1, args.split_workers)
+    LOG_READER = args.log_reader
+    USE_PEER_ARCHIVE = args.peer_archive
+    PROFILE = args.profile
+    STREAM_MEMORY_BYTES = int(args.stream_memory_mb * (1 << 20)) if args.stream else None
+    COLUMNAR_FORMAT = args.columnar
+    if COLUMNAR_FORMAT and pyarrow is None:
+        print("[FATAL] --columnar requires the pyarrow package")
+        return
+    runner = LevineRunner(Path.cwd())
+
+    instances = runner.instances()
+    if instances is None:
+        print("[FATAL] missing instancesNames.txt")
+        return
+    file_nums = args.files if args.files else runner.file_numbers()
+    if not file_nums:
+        print("[FATAL] no downloadKeys_File*.txt manifests found")
+        return
+
+    if args.export_peer_files:
+        runner.export_peer_files(file_nums, instances)
+        return
+    if args.follow:
+        runner.follow(file_nums, instances, args.follow_interval)
+        return
 
-                slow_marker = " (slow)" if job_elapsed > 2 * avg_duration else ""
-                pct = (completed / total_jobs) * 100
-                eta_str = format_duration(eta) if completed >= 5 else "estimating..."
-                print(f"[JOB DONE] {manifest}/{inst} took {format_duration(job_elapsed)}{slow_marker} [{job_status}]")
-                print(f"[PROGRESS] {completed}/{total_jobs} ({pct:.1f}%) done. Failures: {len(failed_jobs)}. Elapsed: {format_duration(total_elapsed)}, ETA: {eta_str}, rate: {rate:.2f} jobs/sec.")
+    backend = "serial" if args.no_parallel else args.backend
+    max_memory = int(args.max_memory_gb * (1 << 30)) if args.max_memory_gb else None
+    failed_jobs, total_jobs = runner.run(file_nums, instances, single_pass=args.single_pass, backend=backend,
+                                         workers=args.workers, max_memory=max_memory,
+                                         profile_job=args.profile_job)
 
-    generate_false_positive_index(file_nums)
-    generate_per_file_reports(file_nums)
+    if args.sweep:
+        run_sweep(file_nums, instances, args.sweep_min_requests, args.sweep_thresholds,
+                  parallel=not args.no_parallel, base=runner.output_dir)
 
     if failed_jobs:
-        summary_path = Path("failed_jobs_summary.txt")
+        summary_path = runner.output_dir / "failed_jobs_summary.txt"
         with summary_path.open("w", encoding="utf-8") as sf:
             sf.write(f"Total jobs: {total_jobs}\n")
             sf.write(f"Failed jobs: {len(failed_jobs)}\n\n")
             for manifest, inst, err in failed_jobs:
                 sf.write(f"{manifest}/{inst}: {err}\n")
-        print(f"[DONE] pipeline complete with failures. See false_positives_report.txt and {summary_path} for details.")
+        print(f"[DONE] pipeline complete with failures. See false_positives_report.txt and {summary_path.name} for details.")
     else:
         print("[DONE] pipeline complete. No failed jobs. See false_positives_report.txt for summary.")
 
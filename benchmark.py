@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import platform
+import argparse
+import subprocess
+from pathlib import Path
+
+import synthetic_logs
+
+# Benchmark harness
+#
+# Generates a synthetic capture per scale (cached under the work directory,
+# keyed by its generator parameters), runs LevineMethod.py on it end to end
+# with --force --profile and reads the per-stage figures from
+# profile_summary.json. Only whole runs are measured: stage figures are the
+# --profile breakdown of a run, not separate invocations of each stage. Every run appends one record to the results file
+# (JSON lines) with the script's hash and git revision, and is compared with
+# the latest earlier record of the same scale and pipeline arguments from a
+# different script version, so regressions show up between versions.
+
+SCALES = {
+    'small': {'nodes': 5, 'peers': 20, 'files': 2, 'blocks': 1000, 'log_mb': 2, 'passing_relayers': 1},
+    'medium': {'nodes': 10, 'peers': 40, 'files': 4, 'blocks': 5000, 'log_mb': 20, 'passing_relayers': 2},
+    'large': {'nodes': 35, 'peers': 60, 'files': 8, 'blocks': 20000, 'log_mb': 100, 'passing_relayers': 4},
+}
+RESULTS_FILE = "benchmark_results.jsonl"  # both ignored by git
+WORK_DIR = "bench_work"
+REGRESSION_TOLERANCE = 0.10  # relative slowdown or memory growth reported as a regression
+MIN_STAGE_SECONDS = 0.1  # shorter stages are too noisy to flag
+
+# Outputs of a previous run, removed so every measured run starts cold (the
+# --parse-cache files beside the logs included).
+PIPELINE_OUTPUTS = [
+    "levine_results.db", "levine_results.db-wal", "levine_results.db-shm", "false_positives_report.txt",
+    "failed_jobs_summary.txt", "profile_summary.json", ".levine_aggregate.json",
+]
+
+def sha256_file(path: Path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def git_revision(path: Path):
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=path, capture_output=True,
+                             text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if out.returncode != 0:
+        return None
+    dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=path,
+                           capture_output=True, text=True, timeout=10).stdout.strip()
+    return out.stdout.strip() + ("-dirty" if dirty else "")
+
+def dataset(work_dir: Path, scale: str, params: dict, seed: int):
+    # Generates the capture for a scale once; reuses it while the parameters match.
+    key = hashlib.sha256(json.dumps([params, seed], sort_keys=True).encode()).hexdigest()[:12]
+    data_dir = work_dir / f"{scale}-{key}"
+    params_path = data_dir / synthetic_logs.PARAMS_FILE
+    if params_path.exists():
+        return data_dir, json.loads(params_path.read_text(encoding="utf-8"))
+    if data_dir.exists():
+        shutil.rmtree(data_dir)  # an interrupted generation
+    print(f"[GEN] {scale}: {params}")
+    started = time.perf_counter()
+    generated = synthetic_logs.generate(data_dir, seed=seed, **params)
+    print(f"[GEN] {scale}: {generated['total_lines']} lines, {generated['total_bytes'] / (1 << 20):.1f} MiB "
+          f"in {time.perf_counter() - started:.1f}s")
+    return data_dir, generated
+
+def clean_outputs(data_dir: Path):
+    for path in data_dir.glob("File*"):
+        if path.is_dir():
+            shutil.rmtree(path)
+    for name in PIPELINE_OUTPUTS:
+        (data_dir / name).unlink(missing_ok=True)
+    for path in data_dir.glob("*.pstats"):
+        path.unlink()
+    for path in data_dir.glob("*.lmcache"):
+        path.unlink(missing_ok=True)
+
+def run_pipeline(script: Path, data_dir: Path, pipeline_args):
+    # Runs LevineMethod.py in data_dir; returns (wall seconds, peak RSS bytes or
+    # None, exit code). Peak RSS is the largest single process of the run.
+    cmd = [sys.executable, str(script), "--force", "--profile"] + list(pipeline_args)
+    log_path = data_dir / "benchmark_run.log"
+    with open(log_path, "w", encoding="utf-8") as log:
+        started = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=data_dir, stdout=log, stderr=subprocess.STDOUT)
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(proc.pid, 0)
+            wall = time.perf_counter() - started
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            peak = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+        else:
+            proc.wait()
+            wall = time.perf_counter() - started
+            peak = None
+    return wall, peak, proc.returncode
+
+def stage_rates(stages: dict):
+    rates = {}
+    for name, stats in stages.items():
+        entry = {'wall_s': round(stats['wall_s'], 4), 'cpu_s': round(stats['cpu_s'], 4),
+                 'peak_rss': stats['peak_rss']}
+        if stats['lines_scanned'] and stats['wall_s'] > 0:
+            entry['lines_per_s'] = round(stats['lines_scanned'] / stats['wall_s'], 1)
+        rates[name] = entry
+    return rates
+
+def benchmark(script: Path, data_dir: Path, generated: dict, scale: str, pipeline_args, repeat: int):
+    runs = []
+    for attempt in range(repeat):
+        clean_outputs(data_dir)
+        wall, peak, code = run_pipeline(script, data_dir, pipeline_args)
+        if code != 0:
+            raise RuntimeError(f"LevineMethod.py exited with {code}; see {data_dir / 'benchmark_run.log'}")
+        summary = json.loads((data_dir / "profile_summary.json").read_text(encoding="utf-8"))
+        if peak is None:
+            peak = max((s['peak_rss'] for s in summary['stages'].values()), default=0) or None
+        runs.append((wall, peak, summary))
+        print(f"[RUN] {scale} {' '.join(pipeline_args) or '(defaults)'} #{attempt + 1}: {wall:.2f}s")
+
+    # Report the median run by wall time.
+    walls = [run[0] for run in runs]
+    wall, peak, summary = sorted(runs, key=lambda run: run[0])[len(runs) // 2]
+    jobs = summary['run']['jobs']
+    return {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'scale': scale,
+        'pipeline_args': list(pipeline_args),
+        'code_version': sha256_file(script),
+        'git_revision': git_revision(script.parent),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': {k: generated[k] for k in ('nodes', 'peers', 'files', 'blocks', 'log_mb', 'passing_relayers', 'seed')},
+        'log_lines': generated['total_lines'],
+        'log_bytes': generated['total_bytes'],
+        'jobs': jobs,
+        'repeat': repeat,
+        'wall_s': round(wall, 3),
+        'wall_s_all': [round(w, 3) for w in walls],
+        'lines_per_s': round(generated['total_lines'] / wall, 1),
+        'mib_per_s': round(generated['total_bytes'] / (1 << 20) / wall, 2),
+        'jobs_per_s': round(jobs / wall, 3),
+        'peak_rss': peak,
+        'stages': stage_rates(summary['stages']),
+    }
+
+def load_results(path: Path):
+    if not path.exists():
+        return []
+    records = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records
+
+def previous_record(records, record):
+    for old in reversed(records):
+        if (old.get('scale') == record['scale'] and old.get('pipeline_args') == record['pipeline_args']
+                and old.get('params') == record['params'] and old.get('code_version') != record['code_version']):
+            return old
+    return None
+
+def compare(record, old, tolerance):
+    # Prints the change against old; returns the regressed metric names.
+    regressions = []
+    label = f"{record['scale']} {' '.join(record['pipeline_args']) or '(defaults)'}"
+    if old is None:
+        print(f"[BENCH] {label}: {record['wall_s']:.2f}s, {record['lines_per_s']:.0f} lines/s, "
+              f"{record['jobs_per_s']:.2f} jobs/s, peak {fmt_bytes(record['peak_rss'])} (no earlier version)")
+        return regressions
+    ref = old.get('git_revision') or old['code_version'][:12]
+    print(f"[BENCH] {label} vs {ref} ({old['timestamp']}):")
+    for metric, higher_is_better in (('lines_per_s', True), ('jobs_per_s', True), ('wall_s', False), ('peak_rss', False)):
+        new_val, old_val = record.get(metric), old.get(metric)
+        if not new_val or not old_val:
+            continue
+        change = (new_val - old_val) / old_val
+        worse = -change if higher_is_better else change
+        marker = " REGRESSION" if worse > tolerance else ""
+        if marker:
+            regressions.append(metric)
+        shown = fmt_bytes if metric == 'peak_rss' else (lambda v: f"{v:.2f}")
+        print(f"  {metric:12} {shown(old_val):>12} -> {shown(new_val):>12} ({change:+.1%}){marker}")
+    for name, stats in record['stages'].items():
+        old_stats = old.get('stages', {}).get(name)
+        if not old_stats or not old_stats['wall_s']:
+            continue
+        change = (stats['wall_s'] - old_stats['wall_s']) / old_stats['wall_s']
+        noisy = max(stats['wall_s'], old_stats['wall_s']) < MIN_STAGE_SECONDS
+        marker = " REGRESSION" if change > tolerance and not noisy else ""
+        if marker:
+            regressions.append(f"stage {name}")
+        print(f"  stage {name:22} {old_stats['wall_s']:9.3f}s -> {stats['wall_s']:9.3f}s ({change:+.1%}){marker}")
+    return regressions
+
+def fmt_bytes(n):
+    return "n/a" if not n else f"{n / (1 << 20):.1f} MiB"
+
+def main():
+    here = Path(__file__).resolve().parent
+    parser = argparse.ArgumentParser(description="Benchmark LevineMethod.py on synthetic captures")
+    parser.add_argument("--scales", nargs="+", default=["small"], choices=sorted(SCALES),
+                        help="Scales to run (default small).")
+    parser.add_argument("--variant", action="append", default=None, metavar="ARGS",
+                        help="LevineMethod.py arguments for one configuration, e.g. --variant=\"--single-pass --backend thread\". "
+                             "Repeat for several; default is one run with default arguments.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per configuration; the median is recorded (default 3).")
+    parser.add_argument("--script", default=str(here / "LevineMethod.py"),
+                        help="LevineMethod.py to measure (default: the one next to this script).")
+    parser.add_argument("--work-dir", default=str(here / WORK_DIR), help="Where synthetic captures are generated and kept.")
+    parser.add_argument("--results", default=str(here / RESULTS_FILE), help="JSON lines file results are appended to.")
+    parser.add_argument("--seed", type=int, default=1, help="Generator seed (default 1).")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE,
+                        help="Relative change reported as a regression (default 0.10).")
+    args = parser.parse_args()
+
+    script = Path(args.script).resolve()
+    work_dir = Path(args.work_dir).resolve()
+    results_path = Path(args.results).resolve()
+    variants = [v.split() for v in args.variant] if args.variant else [[]]
+    records = load_results(results_path)
+    regressions = []
+    for scale in args.scales:
+        data_dir, generated = dataset(work_dir, scale, SCALES[scale], args.seed)
+        for pipeline_args in variants:
+            record = benchmark(script, data_dir, generated, scale, pipeline_args, max(1, args.repeat))
+            regressions += compare(record, previous_record(records, record), args.tolerance)
+            records.append(record)
+            with results_path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+    print(f"[DONE] results appended to {results_path}")
+    if regressions:
+        print(f"[DONE] {len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import random
+import calendar
+import argparse
+from pathlib import Path
+
+# Synthetic capture generator
+#
+# Writes a working directory LevineMethod.py can run on: instancesNames.txt,
+# downloadKeys_File<N>.txt manifests and one requests_<instance>.log per node
+# in the 9-column outgoing-request format parse_request_line() reads:
+#
+#   timestamp,type,key,location,htl,peer ip:port,-,-,connected peers
+#
+# (columns 7 and 8 are not used by the pipeline). Each file is downloaded once
+# by the downloader, which sends every block to one of its peers, so each of
+# its peers receives a run of about blocks / peers requests. Some of those
+# peers are the generated relayers; they forward what they receive to their
+# own peers, which gives relayer IP derivation its key overlap. The first
+# passing_relayers of them forward everything to one fixed peer instead, so
+# that peer receives a run of its own and the relayer reports a false
+# positive, as a relayer on a busy route does. Every log is
+# then padded with unrelated requests up to the requested size. Generation is
+# deterministic for a given seed, and synthetic_params.json records the
+# parameters and the planted ground truth.
+
+PARAMS_FILE = "synthetic_params.json"
+DEFAULT_HTL_MIX = "18:0.4,17:0.3,16:0.2,15:0.1"
+START_TIME = "2024-05-01T00:00:00"
+AVG_LINE_BYTES = 140  # typical generated line, used to size the padding
+
+def parse_htl_mix(spec):
+    # "18:0.4,17:0.3,..." -> (["18", "17", ...], [0.4, 0.3, ...])
+    values, weights = [], []
+    for item in spec.split(","):
+        htl, _, weight = item.partition(":")
+        if not htl.strip():
+            continue
+        values.append(htl.strip())
+        weights.append(float(weight) if weight else 1.0)
+    if not values or sum(weights) <= 0:
+        raise ValueError(f"invalid HTL mix: {spec!r}")
+    return values, weights
+
+def node_address(idx):
+    return f"10.{idx // 250}.{idx % 250}.1:{20000 + idx}"
+
+def external_address(idx):
+    return f"172.{16 + idx // 65536}.{idx // 256 % 256}.{idx % 256}:{30000 + idx % 30000}"
+
+class LineFormatter:
+    # Formats request lines; caches the second-resolution timestamp prefix.
+    def __init__(self, start_epoch):
+        self.start_epoch = start_epoch
+        self.last_sec = None
+        self.prefix = ""
+
+    def line(self, t, req_type, key, loc, htl, ip, num_peers):
+        sec = int(t)
+        if sec != self.last_sec:
+            self.last_sec = sec
+            self.prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(self.start_epoch + sec))
+        millis = int((t - sec) * 1000)
+        return f"{self.prefix}.{millis:03d},{req_type},{key},{loc:.6f},{htl},{ip},-,-,{num_peers}\n"
+
+def generate(out_dir, nodes=5, peers=20, files=3, blocks=2000, log_mb=1.0, duplicate_rate=0.05,
+             insert_rate=0.02, htl_mix=DEFAULT_HTL_MIX, forward_rate=0.8, requests_per_sec=20.0,
+             start=START_TIME, seed=1, passing_relayers=0):
+    # Writes the capture into out_dir and returns the contents of synthetic_params.json.
+    params = {
+        'nodes': nodes, 'peers': peers, 'files': files, 'blocks': blocks, 'log_mb': log_mb,
+        'duplicate_rate': duplicate_rate, 'insert_rate': insert_rate, 'htl_mix': htl_mix,
+        'forward_rate': forward_rate, 'requests_per_sec': requests_per_sec, 'start': start, 'seed': seed,
+        'passing_relayers': passing_relayers,
+    }
+    if nodes < 1 or peers < 2 or files < 1 or blocks < 1:
+        raise ValueError("need at least 1 relayer, 2 peers per node, 1 file and 1 block per file")
+    if not 0 <= passing_relayers <= min(nodes, peers // 2):
+        raise ValueError(f"passing relayers must be between 0 and {min(nodes, peers // 2)} "
+                         "(the relayers that are the downloader's peers)")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    htl_values, htl_weights = parse_htl_mix(htl_mix)
+    start_epoch = calendar.timegm(time.strptime(start, "%Y-%m-%dT%H:%M:%S"))
+
+    def new_key():
+        return format(rng.getrandbits(256), "064x")
+
+    def request_type():
+        return "FNPInsertRequest" if rng.random() < insert_rate else "FNPCHKDataRequest"
+
+    instances = ["downloader"] + [f"Relayer{i}" for i in range(1, nodes + 1)]
+    address = {inst: node_address(idx) for idx, inst in enumerate(instances)}
+    (out_dir / "instancesNames.txt").write_text("\n".join(instances) + "\n")
+
+    # Half of the downloader's peers (at most every relayer) are relayers we log.
+    adjacent = instances[1:1 + min(nodes, peers // 2)]
+    next_external = 0
+    neighbours = {}
+    for inst in instances:
+        count = peers - len(adjacent) if inst == "downloader" else peers
+        neighbours[inst] = [external_address(next_external + i) for i in range(count)]
+        next_external += count
+    neighbours["downloader"] = [address[r] for r in adjacent] + neighbours["downloader"]
+    relayer_at = {address[r]: r for r in adjacent}
+    # Passing relayers send all they forward to their first peer.
+    sink = {r: neighbours[r][0] for r in adjacent[:passing_relayers]}
+
+    # Planted traffic: (seconds from start, line fields) per instance.
+    planted = {inst: [] for inst in instances}
+    truth = {'downloader': address["downloader"], 'adjacent_relayers': {r: address[r] for r in adjacent},
+             'passing_relayers': sink, 'files': {}}
+    t = 0.0
+    for num in range(1, files + 1):
+        keys = [new_key() for _ in range(blocks)]
+        (out_dir / f"downloadKeys_File{num}.txt").write_text("\n".join(keys) + "\n")
+        file_start = t
+        sent_to = {}
+        order = keys[:]
+        rng.shuffle(order)
+        for key in order:
+            t += rng.expovariate(requests_per_sec)
+            sends = 2 if rng.random() < duplicate_rate else 1
+            for _ in range(sends):
+                dest = rng.choice(neighbours["downloader"])
+                sent_to[dest] = sent_to.get(dest, 0) + 1
+                htl = rng.choices(htl_values, htl_weights)[0]
+                planted["downloader"].append((t, (request_type(), key, htl, dest)))
+                relayer = relayer_at.get(dest)
+                if relayer is not None and rng.random() < forward_rate:
+                    fwd_htl = str(max(0, int(htl) - 1)) if htl.isdigit() else htl
+                    fwd_dest = sink.get(relayer) or rng.choice(neighbours[relayer])
+                    planted[relayer].append((t + rng.random() * 0.5, (request_type(), key, fwd_htl, fwd_dest)))
+        truth['files'][str(num)] = {
+            'start': file_start, 'end': t,
+            'runs': dict(sorted(sent_to.items(), key=lambda item: -item[1])),
+        }
+        t += 60.0  # idle gap between downloads
+    duration = max(t, 1.0)
+
+    log_stats = {}
+    for inst in instances:
+        events = sorted(planted[inst], key=lambda event: event[0])
+        target = int(log_mb * (1 << 20))
+        padding = max(0, target // AVG_LINE_BYTES - len(events))
+        noise_rate = padding / duration
+        fmt = LineFormatter(start_epoch)
+        peer_list = neighbours[inst]
+        lines = 0
+        written = 0
+        with open(out_dir / f"requests_{inst}.log", "w", encoding="utf-8", newline="\n") as f:
+            buf = []
+            pending = iter(events)
+            event = next(pending, None)
+            noise_t = rng.expovariate(noise_rate) if padding else None
+            noise_left = padding
+            while event is not None or noise_left:
+                if event is not None and (not noise_left or event[0] <= noise_t):
+                    event_t, (req_type, key, htl, ip) = event
+                    event = next(pending, None)
+                else:
+                    event_t = noise_t
+                    req_type, key, ip = request_type(), new_key(), rng.choice(peer_list)
+                    htl = rng.choices(htl_values, htl_weights)[0]
+                    noise_left -= 1
+                    noise_t += rng.expovariate(noise_rate)
+                line = fmt.line(event_t, req_type, key, rng.random(), htl, ip, max(1, peers + rng.randint(-2, 2)))
+                buf.append(line)
+                written += len(line)
+                lines += 1
+                if len(buf) >= 10000:
+                    f.write("".join(buf))
+                    buf.clear()
+            f.write("".join(buf))
+        log_stats[inst] = {'lines': lines, 'bytes': written, 'planted': len(events)}
+
+    params.update({
+        'instances': instances,
+        'logs': log_stats,
+        'total_lines': sum(s['lines'] for s in log_stats.values()),
+        'total_bytes': sum(s['bytes'] for s in log_stats.values()),
+        'truth': truth,
+    })
+    (out_dir / PARAMS_FILE).write_text(json.dumps(params, indent=1), encoding="utf-8")
+    return params
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Freenet capture for LevineMethod.py")
+    parser.add_argument("out_dir", help="Directory to write instancesNames.txt, manifests and request logs into.")
+    parser.add_argument("--nodes", type=int, default=5, help="Relayer nodes besides the downloader (default 5).")
+    parser.add_argument("--peers", type=int, default=20, help="Peers per node (default 20).")
+    parser.add_argument("--files", type=int, default=3, help="Files downloaded, one manifest each (default 3).")
+    parser.add_argument("--blocks", type=int, default=2000, help="Blocks (manifest keys) per file (default 2000).")
+    parser.add_argument("--log-mb", type=float, default=1.0,
+                        help="Pad every request log with unrelated requests to about this many MiB (default 1).")
+    parser.add_argument("--duplicate-rate", type=float, default=0.05,
+                        help="Fraction of blocks the downloader requests twice (default 0.05).")
+    parser.add_argument("--insert-rate", type=float, default=0.02,
+                        help="Fraction of requests logged as FNPInsertRequest (default 0.02).")
+    parser.add_argument("--htl-mix", default=DEFAULT_HTL_MIX,
+                        help=f"HTL values and weights, e.g. {DEFAULT_HTL_MIX} (the default).")
+    parser.add_argument("--forward-rate", type=float, default=0.8,
+                        help="Fraction of the downloader's requests to a relayer that it forwards (default 0.8).")
+    parser.add_argument("--passing-relayers", type=int, default=0,
+                        help="Relayers (among the downloader's peers) that forward everything to one peer and so "
+                             "report a false positive (default 0).")
+    parser.add_argument("--requests-per-sec", type=float, default=20.0,
+                        help="Downloader request rate, which sets the capture's time span (default 20).")
+    parser.add_argument("--start", default=START_TIME, help=f"Capture start, UTC (default {START_TIME}).")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (default 1).")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        params = generate(args.out_dir, args.nodes, args.peers, args.files, args.blocks, args.log_mb,
+                          args.duplicate_rate, args.insert_rate, args.htl_mix, args.forward_rate,
+                          args.requests_per_sec, args.start, args.seed, args.passing_relayers)
+    except ValueError as e:
+        print(f"[FATAL] {e}")
+        sys.exit(2)
+    print(f"[DONE] {len(params['instances'])} logs, {params['total_lines']} lines, "
+          f"{params['total_bytes'] / (1 << 20):.1f} MiB in {time.perf_counter() - started:.1f}s -> {os.path.abspath(args.out_dir)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import os
+import sys
+import time
+import shutil
+import signal
+import sqlite3
+import subprocess
+from pathlib import Path
+
+import pytest
+
+# End-to-end checks on a small synthetic capture
+#
+# Each test copies one capture generated by synthetic_logs.py into its own
+# directory, runs LevineMethod.py there as a user would and compares every
+# output (text files under File<N>/, false_positives_report.txt and the rows
+# of levine_results.db) with a plain batch run on the same capture.
+
+REPO = Path(__file__).resolve().parent.parent
+SCRIPT = REPO / "LevineMethod.py"
+CAPTURE_ARGS = ["--nodes", "3", "--peers", "12", "--files", "2", "--blocks", "300", "--log-mb", "0.3",
+                "--passing-relayers", "1", "--seed", "7"]
+RUN_STATE = (".levine",)  # job records, aggregate records and follow checkpoints differ by design
+
+def run_script(script, args, cwd):
+    proc = subprocess.run([sys.executable, str(script)] + list(args), cwd=cwd, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+    return proc.stdout
+
+def run_pipeline(work_dir, *args):
+    return run_script(SCRIPT, args, work_dir)
+
+def copy_capture(capture, dest):
+    shutil.copytree(capture, dest)
+    return dest
+
+def outputs(work_dir: Path):
+    # Relative path -> bytes of every output file, plus each results table as
+    # sorted rows (the fingerprint names the run's options, so it is left out).
+    found = {}
+    paths = [work_dir / "false_positives_report.txt"]
+    for folder in sorted(work_dir.glob("File*")):
+        paths.extend(p for p in sorted(folder.rglob("*")) if p.is_file())
+    for path in paths:
+        if not path.name.startswith(RUN_STATE):
+            found[path.relative_to(work_dir).as_posix()] = path.read_bytes()
+    db = sqlite3.connect(work_dir / "levine_results.db")
+    try:
+        for (table,) in db.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name"):
+            cols = [row[1] for row in db.execute(f"PRAGMA table_info({table})") if row[1] != "fingerprint"]
+            found[f"levine_results.db:{table}"] = sorted(db.execute(f"SELECT {', '.join(cols)} FROM {table}"))
+    finally:
+        db.close()
+    return found
+
+def assert_same_outputs(actual: dict, expected: dict):
+    assert sorted(actual) == sorted(expected)
+    different = [name for name in expected if actual[name] != expected[name]]
+    assert not different, f"outputs differ: {different[:10]}"
+
+@pytest.fixture(scope="session")
+def capture(tmp_path_factory):
+    out_dir = tmp_path_factory.mktemp("capture") / "logs"
+    run_script(REPO / "synthetic_logs.py", [str(out_dir)] + CAPTURE_ARGS, REPO)
+    return out_dir
+
+@pytest.fixture(scope="session")
+def batch(capture, tmp_path_factory):
+    work_dir = copy_capture(capture, tmp_path_factory.mktemp("batch") / "run")
+    run_pipeline(work_dir)
+    found = outputs(work_dir)
+    assert any(Path(name).name.startswith("FTS-") for name in found), "capture plants no passing peer"
+    return found
+
+@pytest.mark.parametrize("args", [
+    ["--key-match", "column"],
+    ["--key-match", "substring"],
+    ["--single-pass"],
+    ["--stream"],
+    ["--stream", "--stream-memory-mb", "0.01"],  # spills several sorted runs per downloader job
+    ["--backend", "thread", "--log-reader", "mmap", "--key-match", "column"],
+], ids=lambda args: " ".join(args))
+def test_modes_match_batch(capture, batch, tmp_path, args):
+    work_dir = copy_capture(capture, tmp_path / "run")
+    run_pipeline(work_dir, *args)
+    assert_same_outputs(outputs(work_dir), batch)
+
+def test_parse_cache_matches_batch(capture, batch, tmp_path):
+    work_dir = copy_capture(capture, tmp_path / "run")
+    first = run_pipeline(work_dir, "--key-match", "column", "--parse-cache")
+    assert ": built" in first
+    assert_same_outputs(outputs(work_dir), batch)
+    # A second run decodes the selected lines from the cache instead of the logs.
+    second = run_pipeline(work_dir, "--key-match", "column", "--parse-cache", "--force")
+    assert ": fresh" in second
+    assert_same_outputs(outputs(work_dir), batch)
+
+def reports_rewritten(work_dir: Path, since_ns):
+    return sorted(p.relative_to(work_dir).parent.as_posix() for p in work_dir.glob("File*/*/probabilityReport.txt")
+                  if p.stat().st_mtime_ns > since_ns)
+
+def age_reports(work_dir: Path):
+    # Backdates every job's report, so a job that runs again is told apart by its mtime.
+    old_ns = 1_000_000_000 * 10**9
+    for path in work_dir.glob("File*/*/probabilityReport.txt"):
+        os.utime(path, ns=(old_ns, old_ns))
+    return old_ns
+
+def test_resume_skips_unchanged_and_recomputes_appended_log(capture, batch, tmp_path):
+    work_dir = copy_capture(capture, tmp_path / "run")
+    run_pipeline(work_dir)
+    since = age_reports(work_dir)
+    run_pipeline(work_dir)
+    assert reports_rewritten(work_dir, since) == []
+    assert_same_outputs(outputs(work_dir), batch)
+
+    # Relayer2 receives more of the files' blocks; only its jobs read its log.
+    downloader_lines = (capture / "requests_downloader.log").read_text(encoding="utf-8").splitlines(True)
+    fresh = copy_capture(capture, tmp_path / "fresh")
+    for target in (work_dir, fresh):
+        with open(target / "requests_Relayer2.log", "a", encoding="utf-8") as f:
+            f.writelines(downloader_lines[:500])
+    run_pipeline(work_dir)
+    assert reports_rewritten(work_dir, since) == ["File1/Relayer2", "File2/Relayer2"]
+
+    run_pipeline(fresh)
+    expected = outputs(fresh)
+    assert expected["File1/Relayer2/probabilityReport.txt"] != batch["File1/Relayer2/probabilityReport.txt"]
+    assert_same_outputs(outputs(work_dir), expected)
+
+def wait_for_output(path: Path, text, proc, timeout=60):
+    deadline = time.monotonic() + timeout
+    while text not in path.read_text(encoding="utf-8", errors="replace"):
+        assert proc.poll() is None, path.read_text(encoding="utf-8", errors="replace")
+        assert time.monotonic() < deadline, f"no {text!r} after {timeout}s"
+        time.sleep(0.05)
+
+@pytest.mark.skipif(os.name == "nt", reason="stops --follow with SIGINT")
+def test_follow_then_batch_matches_batch(capture, batch, tmp_path):
+    work_dir = copy_capture(capture, tmp_path / "run")
+    # Follow starts on the first half of every log; the rest arrives in two chunks.
+    chunks = {}
+    for log in sorted(work_dir.glob("requests_*.log")):
+        lines = log.read_bytes().splitlines(True)
+        half, three_quarters = len(lines) // 2, len(lines) * 3 // 4
+        log.write_bytes(b"".join(lines[:half]))
+        chunks[log] = [b"".join(lines[half:three_quarters]), b"".join(lines[three_quarters:])]
+
+    out_path = tmp_path / "follow.log"
+    with open(out_path, "w", encoding="utf-8") as out:
+        proc = subprocess.Popen([sys.executable, str(SCRIPT), "--follow", "--follow-interval", "0.2"],
+                                cwd=work_dir, stdout=out, stderr=subprocess.STDOUT)
+        try:
+            wait_for_output(out_path, "[START]", proc)
+            for part in range(2):
+                for log, parts in chunks.items():
+                    with open(log, "ab") as f:
+                        f.write(parts[part])
+                time.sleep(0.5)
+            proc.send_signal(signal.SIGINT)
+            assert proc.wait(timeout=120) == 0, out_path.read_text(encoding="utf-8")
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+    assert "[DONE] follow stopped" in out_path.read_text(encoding="utf-8")
+    assert_same_outputs(outputs(work_dir), batch)
+
+    # Follow stopped at the end of every log, so a batch run reuses its results.
+    since = age_reports(work_dir)
+    run_pipeline(work_dir)
+    assert reports_rewritten(work_dir, since) == []
+    assert_same_outputs(outputs(work_dir), batch)